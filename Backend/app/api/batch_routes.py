@@ -11,25 +11,68 @@ POST /api/biowel/audio/process
     - filled_fields: dict {data_testid: value}
     - stats: {mapped_count, skipped_already_filled_count, total_fields}
 
+Modo trabajo (sin mantener el request abierto durante la transcripción):
+- POST /api/biowel/audio/jobs (mismo form) → 202 {job_id, status, status_url, events_url}
+- GET  /api/biowel/audio/jobs/{job_id} → {status, result?, error?}
+- GET  /api/biowel/audio/jobs/{job_id}/events → server-sent events de progreso
+  (uploaded → transcribing → mapping → done | error)
+
+Uploads reanudables (enlaces inestables):
+- POST   /api/biowel/uploads {filename, mimetype?, size?} → {upload_id, offset, upload_url}
+- PUT    /api/biowel/uploads/{id}?offset=N (bytes crudos) → {offset}; 409 si el offset no continúa
+- GET    /api/biowel/uploads/{id} → {offset} para retomar tras un corte
+- POST   /api/biowel/uploads/{id}/finalize (fields, already_filled) → 202 como /audio/jobs
+
 CORS: ya configurado en main.py (allow_origins=["*"]).
 DEEPGRAM_API_KEY: configurar en .env (se lee desde app.config).
 """
 
+import asyncio
 import json
 import logging
-from typing import Dict, List
+import os
+import tempfile
+from typing import AsyncIterator, BinaryIO, Dict, List, NamedTuple, Optional, Tuple
 
 from starlette.formparsers import MultiPartParser
-# Aumentar límite de upload de 1MB (default) a 200MB para audios largos (5+ min)
-MultiPartParser.max_file_size = 200 * 1024 * 1024  # 200 MB
+# max_file_size es el umbral del SpooledTemporaryFile: por encima de 1 MB el
+# upload pasa a disco en vez de quedar entero en memoria. El límite de tamaño
+# real (MAX_UPLOAD_BYTES) se aplica mientras se transmite el audio.
+MultiPartParser.max_file_size = 1024 * 1024  # 1 MB
 
 from fastapi import APIRouter, File, Form, UploadFile, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from app.services.deepgram_batch import transcribe_audio
-from app.services.biowel_batch_mapper import map_transcript_to_fields
+from app.config import get_settings
+from app.stt_providers import BatchSTTProvider, get_batch_stt
+from app.services.deepgram_batch import UploadTooLargeError
+from app.services.mapping_pool import MappingPoolSaturatedError, get_mapping_pool, map_fields
+from app.services.audio_preprocess import aiter_preprocessed_wav, needs_preprocessing
+from app.services.chunked_transcription import (
+    WavLayout,
+    probe_wav,
+    should_chunk,
+    transcribe_wav_chunked,
+)
+from app.services.resumable_uploads import (
+    UploadNotFoundError,
+    UploadOffsetError,
+    UploadSession,
+    UploadStore,
+    default_upload_dir,
+)
+from app.services.transcript_cache import get_transcript_cache, hash_audio, transcript_cache_key
+from app.services.batch_jobs import (
+    JOB_MAPPING,
+    JOB_TRANSCRIBING,
+    BatchJob,
+    JobQueueFullError,
+    get_job_queue,
+)
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 router = APIRouter(prefix="/api/biowel", tags=["biowel-batch"])
 
@@ -48,30 +91,42 @@ class BatchProcessResponse(BaseModel):
 
 # Límite de 200 MB para audios largos (5+ min en WAV pueden ser >50MB)
 MAX_UPLOAD_BYTES = 200 * 1024 * 1024  # 200 MB
+# Bloque leído del upload y enviado a Deepgram por iteración
+UPLOAD_CHUNK_BYTES = 256 * 1024
+# WAV/PCM: elegibles para transcripción por chunks en paralelo
+WAV_MIMETYPES = {"audio/wav", "audio/wave", "audio/x-wav"}
+# Intervalo de comentarios keepalive en el stream de eventos de un trabajo
+SSE_KEEPALIVE_SECONDS = 15.0
 
 
-@router.post("/audio/process", response_model=BatchProcessResponse)
-async def process_audio_batch(
-    request: Request,
-    audio_file: UploadFile = File(..., description="Archivo de audio (WAV recomendado)"),
-    fields: str = Form(..., description="JSON array de campos Biowel"),
-    already_filled: str = Form(default="{}", description="JSON dict de campos ya llenos"),
-):
+async def iter_upload(
+    upload: UploadFile,
+    first_chunk: bytes,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_BYTES,
+) -> AsyncIterator[bytes]:
     """
-    Procesa un archivo de audio completo en modo batch:
-    1. Transcribe con Deepgram (pre-recorded)
-    2. Mapea el transcript a campos Biowel por data-testid
-    3. Retorna transcript + filled_fields + stats
+    Bloques del upload (ya spooleado a disco) con el límite de tamaño
+    aplicado al vuelo: la memoria usada no depende de la duración del audio.
     """
-    # --- Validar audio ---
-    if not audio_file.filename:
-        raise HTTPException(status_code=400, detail="No se proporcionó archivo de audio")
+    total = len(first_chunk)
+    chunk = first_chunk
+    while chunk:
+        if total > max_bytes:
+            raise UploadTooLargeError(
+                f"El audio supera el límite de {max_bytes // (1024 * 1024)} MB"
+            )
+        yield chunk
+        chunk = await upload.read(chunk_size)
+        total += len(chunk)
+
 
-    content_type = audio_file.content_type or "application/octet-stream"
+def _resolve_mimetype(filename: Optional[str], content_type: Optional[str]) -> str:
+    content_type = content_type or "application/octet-stream"
     # Inferir mimetype por extensión si el content_type es genérico o video/*
     # (browsers/OS reportan .m4a como video/mp4)
     if content_type == "application/octet-stream" or content_type.startswith("video/"):
-        ext = (audio_file.filename or "").rsplit(".", 1)[-1].lower()
+        ext = (filename or "").rsplit(".", 1)[-1].lower()
         ext_to_mime = {
             "wav": "audio/wav",
             "mp3": "audio/mpeg",
@@ -81,16 +136,35 @@ async def process_audio_batch(
             "webm": "audio/webm",
         }
         content_type = ext_to_mime.get(ext, content_type)
+    return content_type
+
+
+async def _open_upload(audio_file: UploadFile) -> Tuple[str, bytes]:
+    """Valida el upload y lee su primer bloque. Retorna (mimetype, primer bloque)."""
+    if not audio_file.filename:
+        raise HTTPException(status_code=400, detail="No se proporcionó archivo de audio")
+
+    content_type = _resolve_mimetype(audio_file.filename, audio_file.content_type)
 
-    audio_bytes = await audio_file.read()
-    if not audio_bytes:
+    # Tamaño conocido tras el parseo multipart: rechazo temprano sin leer el archivo
+    if audio_file.size is not None and audio_file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"El audio supera el límite de {MAX_UPLOAD_BYTES // (1024 * 1024)} MB",
+        )
+
+    first_chunk = await audio_file.read(UPLOAD_CHUNK_BYTES)
+    if not first_chunk:
         raise HTTPException(status_code=400, detail="El archivo de audio está vacío")
 
     logger.info(
         f"[Batch] Audio recibido: '{audio_file.filename}', "
-        f"{len(audio_bytes)} bytes, mime={content_type}"
+        f"{audio_file.size if audio_file.size is not None else '?'} bytes, mime={content_type}"
     )
+    return content_type, first_chunk
+
 
+def _parse_form(fields: str, already_filled: str) -> Tuple[List[Dict], Dict[str, str]]:
     # --- Parsear fields ---
     try:
         fields_list: List[Dict] = json.loads(fields)
@@ -125,19 +199,118 @@ async def process_audio_batch(
         f"[Batch] Fields: {len(fields_list)}, "
         f"Already filled: {len(already_filled_dict)}"
     )
+    return fields_list, already_filled_dict
 
-    # --- 1. Transcribir ---
-    try:
-        transcript = await transcribe_audio(
-            file_bytes=audio_bytes,
-            mimetype=content_type,
+
+class TranscriptionPlan(NamedTuple):
+    layout: Optional[WavLayout]  # None si no es un WAV PCM analizable
+    chunked: bool
+    preprocess: bool
+    cache_key: Optional[str]
+
+
+def plan_transcription(
+    fileobj: BinaryIO, content_type: str, provider: BatchSTTProvider, with_cache_key: bool = True
+) -> TranscriptionPlan:
+    """
+    Decide cómo se transcribe el archivo (chunks, preprocesado) y su clave en
+    la caché de transcripciones. Síncrono: lee el archivo desde el inicio.
+    También lo usa scripts/batch_remap.py para encontrar transcripts cacheados.
+    """
+    layout = None
+    chunked = False
+    preprocess = False
+    if content_type.lower().split(";")[0].strip() in WAV_MIMETYPES:
+        layout = probe_wav(fileobj)
+    if layout is not None:
+        chunked = provider.supports_word_timestamps and should_chunk(layout)
+        preprocess = (
+            settings.batch_preprocess_enabled
+            and provider.uploads_audio
+            and needs_preprocessing(layout.channels, layout.sample_width, layout.frame_rate)
+        )
+    cache_key = None
+    if with_cache_key:
+        cache_key = transcript_cache_key(
+            hash_audio(fileobj),
+            provider=provider.name,
             language="es",
+            options={
+                "model": settings.deepgram_model,
+                "mimetype": content_type,
+                "chunk_seconds": settings.batch_chunk_seconds if chunked else None,
+                "preprocess": preprocess,
+            },
         )
+    return TranscriptionPlan(layout, chunked, preprocess, cache_key)
+
+
+async def _transcribe(
+    chunks: AsyncIterator[bytes],
+    content_type: str,
+    fileobj: Optional[BinaryIO] = None,
+) -> str:
+    """
+    Transcribe el audio. Con acceso aleatorio al archivo (fileobj) se consulta
+    primero la caché de transcripciones, los WAV de alta resolución se reducen
+    a PCM16 mono 16 kHz y un WAV largo se transcribe por chunks en paralelo;
+    si no, el audio va tal cual en un solo request a partir de `chunks`.
+    """
+    provider = get_batch_stt()
+    cache = get_transcript_cache() if settings.transcript_cache_enabled else None
+    cache_key = None
+    layout = None
+    chunked = False
+    preprocess = False
+    try:
+        if fileobj is not None:
+            # El análisis lee desde el inicio: `chunks` sigue desde esta posición
+            resume_at = fileobj.tell()
+            layout, chunked, preprocess, cache_key = await asyncio.to_thread(
+                plan_transcription, fileobj, content_type, provider, cache is not None
+            )
+            if cache_key is not None:
+                cached = await asyncio.to_thread(cache.get, cache_key)
+                if cached is not None:
+                    logger.info(f"[Batch] Transcript desde caché ({len(cached)} chars)")
+                    return cached
+            fileobj.seek(resume_at)
+
+        if preprocess:
+            logger.info(
+                f"[Batch] WAV {layout.frame_rate} Hz, {layout.channels} canal(es), "
+                f"{layout.sample_width * 8} bits → PCM16 mono 16 kHz antes de subir"
+            )
+        if chunked:
+            transcript = await transcribe_wav_chunked(
+                fileobj, layout, provider.transcribe_words, language="es", preprocess=preprocess
+            )
+        else:
+            if preprocess:
+                chunks = aiter_preprocessed_wav(fileobj)
+            transcript = await provider.transcribe_stream(
+                chunks,
+                mimetype=content_type,
+                language="es",
+            )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except RuntimeError as e:
         raise HTTPException(status_code=502, detail=str(e))
 
+    # Un transcript vacío puede ser un fallo transitorio: no se cachea
+    if cache_key is not None and transcript:
+        await asyncio.to_thread(cache.put, cache_key, transcript)
+    return transcript
+
+
+async def _build_response(
+    transcript: str,
+    fields_list: List[Dict],
+    already_filled_dict: Dict[str, str],
+) -> BatchProcessResponse:
     if not transcript:
         return BatchProcessResponse(
             transcript="",
@@ -149,12 +322,14 @@ async def process_audio_batch(
             ),
         )
 
-    # --- 2. Mapear ---
-    filled_fields = map_transcript_to_fields(
-        transcript=transcript,
-        fields=fields_list,
-        already_filled=already_filled_dict,
-    )
+    # --- 2. Mapear (CPU: en el pool de procesos, fuera del event loop) ---
+    try:
+        filled_fields = await get_mapping_pool().run(
+            map_fields, transcript, fields_list, already_filled_dict
+        )
+    except MappingPoolSaturatedError as e:
+        logger.warning(f"[Batch] {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
 
     # --- 3. Stats ---
     stats = BatchProcessStats(
@@ -173,3 +348,316 @@ async def process_audio_batch(
         filled_fields=filled_fields,
         stats=stats,
     )
+
+
+@router.post("/audio/process", response_model=BatchProcessResponse)
+async def process_audio_batch(
+    request: Request,
+    audio_file: UploadFile = File(..., description="Archivo de audio (WAV recomendado)"),
+    fields: str = Form(..., description="JSON array de campos Biowel"),
+    already_filled: str = Form(default="{}", description="JSON dict de campos ya llenos"),
+):
+    """
+    Procesa un archivo de audio completo en modo batch:
+    1. Transcribe con Deepgram (pre-recorded)
+    2. Mapea el transcript a campos Biowel por data-testid
+    3. Retorna transcript + filled_fields + stats
+    """
+    content_type, first_chunk = await _open_upload(audio_file)
+    fields_list, already_filled_dict = _parse_form(fields, already_filled)
+
+    # --- 1. Transcribir ---
+    transcript = await _transcribe(
+        iter_upload(audio_file, first_chunk), content_type, fileobj=audio_file.file
+    )
+
+    return await _build_response(transcript, fields_list, already_filled_dict)
+
+
+# ============================================
+# Modo trabajo: submit inmediato + polling / SSE
+# ============================================
+
+class BatchJobResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    events_url: str
+
+
+async def _spool_to_tempfile(audio_file: UploadFile, first_chunk: bytes) -> str:
+    """Copia el upload a un archivo propio: el UploadFile se cierra con el request."""
+    fd, path = tempfile.mkstemp(prefix="biowel-batch-", suffix=".audio")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            async for chunk in iter_upload(audio_file, first_chunk):
+                out.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+async def _iter_file(path: str, chunk_size: int = UPLOAD_CHUNK_BYTES) -> AsyncIterator[bytes]:
+    with open(path, "rb") as fh:
+        while True:
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+@router.post("/audio/jobs", response_model=BatchJobResponse, status_code=202)
+async def submit_audio_job(
+    audio_file: UploadFile = File(..., description="Archivo de audio (WAV recomendado)"),
+    fields: str = Form(..., description="JSON array de campos Biowel"),
+    already_filled: str = Form(default="{}", description="JSON dict de campos ya llenos"),
+):
+    """
+    Igual que /audio/process pero sin esperar el resultado: retorna un job_id
+    al terminar el upload. El progreso se consulta en /audio/jobs/{job_id}
+    o en /audio/jobs/{job_id}/events (server-sent events).
+    """
+    content_type, first_chunk = await _open_upload(audio_file)
+    fields_list, already_filled_dict = _parse_form(fields, already_filled)
+
+    try:
+        audio_path = await _spool_to_tempfile(audio_file, first_chunk)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    return _enqueue_job(audio_path, content_type, fields_list, already_filled_dict)
+
+
+def _enqueue_job(
+    audio_path: str,
+    content_type: str,
+    fields_list: List[Dict],
+    already_filled_dict: Dict[str, str],
+    transcription: Optional["asyncio.Task[str]"] = None,
+) -> BatchJobResponse:
+    """
+    Encola transcripción + mapeo del archivo (el job lo borra al terminar).
+    `transcription`: transcripción ya en curso (upload reanudable en streaming).
+    """
+
+    async def run(job: BatchJob) -> Dict:
+        job.set_status(JOB_TRANSCRIBING)
+        transcript = None
+        if transcription is not None:
+            try:
+                transcript = await transcription
+            except (Exception, asyncio.CancelledError) as e:
+                # Se reintenta con el archivo completo por el camino normal
+                logger.warning(f"[Batch] Transcripción en streaming falló ({e}), reintentando completa")
+        if transcript is None:
+            with open(audio_path, "rb") as fileobj:
+                transcript = await _transcribe(_iter_file(audio_path), content_type, fileobj=fileobj)
+        job.set_status(JOB_MAPPING)
+        response = await _build_response(transcript, fields_list, already_filled_dict)
+        return response.model_dump()
+
+    try:
+        job = get_job_queue().submit(run, audio_path=audio_path)
+    except JobQueueFullError as e:
+        if transcription is not None:
+            transcription.cancel()
+        os.unlink(audio_path)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+
+    return BatchJobResponse(
+        job_id=job.job_id,
+        status=job.status,
+        status_url=f"{router.prefix}/audio/jobs/{job.job_id}",
+        events_url=f"{router.prefix}/audio/jobs/{job.job_id}/events",
+    )
+
+
+def _get_job_or_404(job_id: str) -> BatchJob:
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o expirado")
+    return job
+
+
+@router.get("/audio/jobs/{job_id}")
+async def get_audio_job(job_id: str):
+    """Estado del trabajo; incluye `result` (BatchProcessResponse) al terminar."""
+    return _get_job_or_404(job_id).snapshot()
+
+
+@router.get("/audio/jobs/{job_id}/events")
+async def audio_job_events(job_id: str):
+    """Server-sent events: un evento `status` por cambio de estado hasta done/error."""
+    job = _get_job_or_404(job_id)
+    queue = get_job_queue()
+
+    async def event_stream():
+        events = queue.subscribe(job).__aiter__()
+        next_event = asyncio.ensure_future(events.__anext__())
+        try:
+            while True:
+                done, _ = await asyncio.wait({next_event}, timeout=SSE_KEEPALIVE_SECONDS)
+                if not done:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield ": keepalive\n\n"
+                    continue
+                try:
+                    event = next_event.result()
+                except StopAsyncIteration:
+                    break
+                yield f"event: status\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                next_event = asyncio.ensure_future(events.__anext__())
+        finally:
+            # Cliente desconectado: el __anext__ cancelado sigue dentro del
+            # generador hasta que termina; cerrarlo antes da "already running"
+            next_event.cancel()
+            await asyncio.gather(next_event, return_exceptions=True)
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ============================================
+# Uploads reanudables
+# ============================================
+
+class CreateUploadRequest(BaseModel):
+    filename: str
+    mimetype: Optional[str] = None
+    size: Optional[int] = None  # Tamaño total en bytes, si se conoce
+
+
+class UploadStatusResponse(BaseModel):
+    upload_id: str
+    offset: int
+    size: Optional[int]
+    upload_url: str
+    streaming: bool
+
+
+_upload_store: Optional[UploadStore] = None
+
+
+def _get_upload_store() -> UploadStore:
+    global _upload_store
+    if _upload_store is None:
+        _upload_store = UploadStore(
+            directory=default_upload_dir(),
+            max_bytes=MAX_UPLOAD_BYTES,
+            ttl_seconds=settings.upload_ttl_seconds,
+        )
+    return _upload_store
+
+
+def _upload_status(session: UploadSession) -> UploadStatusResponse:
+    return UploadStatusResponse(
+        upload_id=session.upload_id,
+        offset=session.offset,
+        size=session.total_size,
+        upload_url=f"{router.prefix}/uploads/{session.upload_id}",
+        streaming=session.transcription is not None,
+    )
+
+
+def _get_upload_or_404(upload_id: str) -> UploadSession:
+    try:
+        return _get_upload_store().get(upload_id)
+    except UploadNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload no encontrado, expirado o ya finalizado")
+
+
+def _offset_conflict(e: UploadOffsetError) -> HTTPException:
+    # El cliente retoma desde current_offset
+    return HTTPException(
+        status_code=409,
+        detail={"message": str(e), "offset": e.current_offset},
+        headers={"Upload-Offset": str(e.current_offset)},
+    )
+
+
+@router.post("/uploads", response_model=UploadStatusResponse, status_code=201)
+async def create_upload(body: CreateUploadRequest):
+    """
+    Crea un upload reanudable. Luego:
+    PUT /uploads/{id}?offset=N (bytes crudos) → GET /uploads/{id} tras un
+    corte para conocer el offset → POST /uploads/{id}/finalize.
+    """
+    content_type = _resolve_mimetype(body.filename, body.mimetype)
+    try:
+        session = _get_upload_store().create(body.filename, content_type, body.size)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    if settings.upload_stream_transcription:
+        # El STT lee el prefijo recibido mientras siguen llegando bloques
+        session.transcription = asyncio.create_task(
+            _transcribe(_get_upload_store().tail(session), content_type)
+        )
+    return _upload_status(session)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadStatusResponse)
+async def get_upload(upload_id: str):
+    """Offset actual: desde dónde continuar tras un corte."""
+    return _upload_status(_get_upload_or_404(upload_id))
+
+
+@router.put("/uploads/{upload_id}", response_model=UploadStatusResponse)
+async def put_upload_chunk(upload_id: str, offset: int, request: Request):
+    """Agrega el body (bytes crudos) en `offset`. Un reenvío parcial o total es idempotente."""
+    session = _get_upload_or_404(upload_id)
+    max_chunk = int(settings.upload_max_chunk_mb * 1024 * 1024)
+
+    async def body_chunks() -> AsyncIterator[bytes]:
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_chunk:
+                raise UploadTooLargeError(
+                    f"Bloque mayor a {settings.upload_max_chunk_mb:g} MB: envía bloques más pequeños"
+                )
+            yield chunk
+
+    try:
+        await _get_upload_store().write_chunk(upload_id, offset, body_chunks())
+    except UploadNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload no encontrado, expirado o ya finalizado")
+    except UploadOffsetError as e:
+        raise _offset_conflict(e)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return _upload_status(session)
+
+
+@router.post("/uploads/{upload_id}/finalize", response_model=BatchJobResponse, status_code=202)
+async def finalize_upload(
+    upload_id: str,
+    fields: str = Form(..., description="JSON array de campos Biowel"),
+    already_filled: str = Form(default="{}", description="JSON dict de campos ya llenos"),
+):
+    """Cierra el upload y lo encola como trabajo batch (ver /audio/jobs/{job_id})."""
+    fields_list, already_filled_dict = _parse_form(fields, already_filled)
+    _get_upload_or_404(upload_id)
+    try:
+        session = await _get_upload_store().finalize(upload_id)
+    except UploadOffsetError as e:
+        raise _offset_conflict(e)
+
+    return _enqueue_job(
+        session.path,
+        session.mimetype,
+        fields_list,
+        already_filled_dict,
+        transcription=session.transcription,
+    )
+
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def delete_upload(upload_id: str):
+    """Descarta un upload en curso."""
+    _get_upload_store().discard(_get_upload_or_404(upload_id))
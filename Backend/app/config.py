@@ -18,6 +18,13 @@ class Settings(BaseSettings):
     deepgram_model: str = "nova-3"
     deepgram_language: str = "es"
 
+    # Proveedor STT (app/stt_providers.py): "deepgram" o "replay"
+    # (transcripciones grabadas, para pruebas de carga y CI sin Deepgram)
+    stt_provider: str = "deepgram"
+    stt_replay_file: str = ""  # JSONL de eventos; vacío = app/data/replay/sample_session.jsonl
+    stt_replay_speed: float = 1.0  # >1 reproduce más rápido que el dictado original
+    stt_replay_pace: str = "wall"  # "wall" (reloj) o "audio" (según audio recibido)
+
     # Server
     host: str = "0.0.0.0"
     port: int = 8000
@@ -26,6 +33,92 @@ class Settings(BaseSettings):
     whisper_model: str = "whisper-large-v3"
     llm_model: str = "llama-3.1-70b-versatile"
 
+    # Backend LLM (app/llm_backends.py): "groq", "openai" (endpoint compatible,
+    # p.ej. llama.cpp / vLLM on-prem) o "fake" (determinista, pruebas/benchmarks)
+    llm_backend: str = "groq"
+    llm_base_url: str = ""  # p.ej. http://10.0.0.5:8080/v1 (solo backend "openai")
+    llm_api_key: str = ""  # Bearer opcional del endpoint compatible
+    llm_pool_size: int = 20  # Conexiones HTTP máximas hacia el endpoint
+    llm_fake_latency_ms: float = 0.0  # Latencia simulada del backend "fake"
+
+    # Modo especulativo: mini-prompt de sección y prompt genérico en paralelo
+    # cuando la confianza del clasificador es baja
+    llm_speculative_enabled: bool = False
+    llm_speculative_confidence: float = 0.6  # Bajo este umbral se corre la carrera
+    llm_speculative_token_budget: int = 8000  # Tokens extra máximos por sesión
+
+    # Cliente LLM resiliente (app/llm_client.py)
+    llm_timeout_segment: float = 4.0  # Deadline (seg) para prompts de sección/segmento
+    llm_timeout_full: float = 25.0  # Deadline (seg) para el mapeo de fin de stream
+    llm_max_retries: int = 1
+    llm_retry_backoff_seconds: float = 0.2
+    llm_hedge_enabled: bool = True  # Duplicar la petición si supera el p95
+    llm_hedge_min_samples: int = 20  # Muestras mínimas antes de confiar en el p95
+    llm_breaker_failure_threshold: int = 5  # Fallos consecutivos para abrir el breaker
+    llm_breaker_cooldown_seconds: float = 30.0  # Tiempo en modo solo reglas
+
+    # Recuperación de campos candidatos antes del prompt genérico
+    llm_retrieval_enabled: bool = True
+    llm_retrieval_top_k: int = 12
+    llm_retrieval_min_score: float = 0.3  # Bajo este score se envía la lista completa
+    llm_retrieval_min_fields: int = 25  # Formularios más pequeños van completos
+
+    # Ejemplos resueltos (app/data/fewshot_examples.jsonl) con reglas cortas
+    llm_fewshot_enabled: bool = True
+    llm_fewshot_k: int = 3
+    llm_fewshot_min_score: float = 0.35  # Bajo este score se usan las reglas completas
+
+    # Clasificador local de relevancia (app/relevance_model.py) para segmentos
+    # ambiguos. Apagado: el modelo semilla no llega a recall 0.95 en held-out;
+    # activar solo con un modelo reentrenado que sí lo cumpla
+    relevance_model_enabled: bool = False
+
+    # Alias cortos (f1, f2...) en vez de unique_key en los prompts
+    llm_field_aliases: bool = True
+
+    # Salida estructurada del LLM: "text" (parseo libre), "json_object" o "json_schema"
+    # (schema con los field_name/opciones permitidos; requiere modelo compatible)
+    llm_output_mode: str = "json_object"
+
+    # Mapeo de fin de stream por secciones en paralelo (transcripciones largas)
+    llm_sharded_mapping: bool = True
+    llm_shard_min_chars: int = 1500  # Transcripciones más cortas van en un solo prompt
+    llm_shard_concurrency: int = 4
+    llm_shard_timeout: float = 12.0  # Deadline por shard (segundos)
+
+    # Trabajos batch asíncronos (app/services/batch_jobs.py)
+    batch_job_workers: int = 2  # Transcripciones + mapeos simultáneos
+    batch_job_queue_size: int = 32  # Trabajos en espera antes de responder 503
+    batch_job_ttl_seconds: float = 3600.0  # Tiempo que se conserva un resultado
+
+    # Pool de procesos para el mapeo batch (app/services/mapping_pool.py)
+    mapping_pool_workers: int = 2  # Procesos de mapeo; 0 = mapear en un hilo
+    mapping_pool_queue_size: int = 8  # Mapeos en espera antes de responder 503
+
+    # Uploads reanudables (app/services/resumable_uploads.py)
+    upload_dir: str = ""  # Vacío = <tmp>/biowel-uploads
+    upload_ttl_seconds: float = 3600.0  # Uploads sin actividad se descartan
+    upload_max_chunk_mb: float = 16.0  # Tamaño máximo de un PUT
+    upload_stream_transcription: bool = False  # Transcribir el prefijo mientras llega el resto
+
+    # Transcripción batch por chunks en paralelo (WAV largos)
+    batch_chunked_enabled: bool = True
+    batch_chunk_seconds: float = 60.0  # Duración objetivo de cada chunk
+    batch_chunk_overlap_seconds: float = 1.5  # Audio extra a cada lado del corte
+    batch_chunk_search_seconds: float = 8.0  # Margen para buscar una pausa donde cortar
+    batch_chunk_concurrency: int = 4
+    batch_chunk_retries: int = 2  # Reintentos por chunk
+    batch_chunk_retry_backoff_seconds: float = 1.0
+
+    # WAV PCM a mono 16 kHz PCM16 antes de subirlo (app/services/audio_preprocess.py)
+    batch_preprocess_enabled: bool = True
+
+    # Caché de transcripciones batch por contenido (app/services/transcript_cache.py)
+    transcript_cache_enabled: bool = True
+    transcript_cache_entries: int = 64  # LRU en memoria
+    transcript_cache_dir: str = ""  # Vacío = solo memoria; p.ej. /var/cache/biowel/transcripts
+    transcript_cache_disk_max_mb: float = 500.0  # Tope del nivel en disco
+
     # TTS
     tts_enabled: bool = False
 
@@ -38,9 +131,9 @@ class Settings(BaseSettings):
 def get_settings():
     settings = Settings()
     missing = []
-    if not settings.groq_api_key:
+    if settings.llm_backend == "groq" and not settings.groq_api_key:
         missing.append("GROQ_API_KEY")
-    if not settings.deepgram_api_key:
+    if settings.stt_provider == "deepgram" and not settings.deepgram_api_key:
         missing.append("DEEPGRAM_API_KEY")
     if missing:
         logger.critical(
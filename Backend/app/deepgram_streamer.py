@@ -16,26 +16,26 @@ from deepgram import (
 )
 
 from app.config import get_settings
+from app.stt_providers import StreamingSTTProvider
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
-class DeepgramStreamer:
+class DeepgramStreamer(StreamingSTTProvider):
     """
     Gestiona una conexión de streaming con Deepgram para transcripción
     en tiempo real. Recibe chunks de audio y emite transcripciones
     parciales y finales a través de un callback async.
     """
 
+    name = "deepgram"
+
     def __init__(self, on_partial: Callable[[str, bool], Awaitable[None]]):
+        super().__init__(on_partial)
         self.client = DeepgramClient(settings.deepgram_api_key)
         self.connection = None
-        self.on_partial = on_partial
-        self.final_transcript_parts: list[str] = []
-        self.is_open = False
         self._loop: Optional[asyncio.AbstractEventLoop] = None
-        self._transcript_queue: asyncio.Queue = asyncio.Queue()
         self._keepalive_task: Optional[asyncio.Task] = None
 
     async def start(self) -> None:
@@ -178,31 +178,6 @@ class DeepgramStreamer:
             logger.error(f"[Deepgram.send_audio] Error enviando audio: {e}")
             self.is_open = False
 
-    async def consume_transcripts(self) -> None:
-        """
-        Tarea async que consume transcripciones del queue interno
-        y las envía al frontend a través del callback on_partial.
-        """
-        try:
-            while self.is_open:
-                try:
-                    text, is_final = await asyncio.wait_for(
-                        self._transcript_queue.get(),
-                        timeout=1.0
-                    )
-                    await self.on_partial(text, is_final)
-                except asyncio.TimeoutError:
-                    continue
-        except asyncio.CancelledError:
-            # Procesar transcripciones restantes
-            while not self._transcript_queue.empty():
-                try:
-                    text, is_final = self._transcript_queue.get_nowait()
-                    await self.on_partial(text, is_final)
-                except asyncio.QueueEmpty:
-                    break
-            raise
-
     async def finish(self) -> str:
         """Cierra Deepgram y retorna la transcripción final completa."""
         # Cancelar keep-alive task primero
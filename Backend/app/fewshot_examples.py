@@ -0,0 +1,138 @@
+"""
+Biblioteca local de ejemplos resueltos (frase → mappings) para los prompts.
+
+Los prompts genéricos (segmento y fin de stream) intentaban cubrir cada caso
+borde con listas largas de reglas estáticas. En su lugar, por cada segmento
+se buscan los 2-3 ejemplos corregidos más parecidos y se inyectan como
+few-shot junto a un bloque de reglas corto.
+
+- Los ejemplos viven en app/data/fewshot_examples.jsonl, sembrados desde
+  sesiones revisadas: {"segment": "...", "mappings": [...] | null}.
+- field_name va como unique_key de Biowel; el llamador lo pasa a alias.
+- Vecinos más cercanos con el mismo índice TF-IDF de n-gramas de
+  caracteres que la recuperación de campos (app/field_retrieval.py).
+- Solo se usan ejemplos cuyos campos existen en el formulario actual; los
+  ejemplos con mappings null (conversación casual) siempre aplican.
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+
+import numpy as np
+from pydantic import ValidationError
+
+from app.field_retrieval import NgramTfidfIndex
+from app.models import FieldMapping
+
+logger = logging.getLogger(__name__)
+
+EXAMPLES_PATH = Path(__file__).parent / "data" / "fewshot_examples.jsonl"
+
+
+class FewShotExample:
+    """Frase dictada y sus mappings corregidos (None = sin dato clínico)."""
+
+    def __init__(self, segment: str, mappings: Optional[List[FieldMapping]]):
+        self.segment = segment
+        self.mappings = mappings or None
+        self.field_keys = {m.field_name for m in self.mappings or []}
+
+    def render(self, alias: Callable[[str], str]) -> str:
+        """Línea de ejemplo para el prompt, con field_name ya traducido."""
+        if not self.mappings:
+            output = {"mappings": None}
+        else:
+            output = {
+                "mappings": [
+                    {"field_name": alias(m.field_name), "value": m.value, "confidence": m.confidence}
+                    for m in self.mappings
+                ]
+            }
+        return f'"{self.segment}" → {json.dumps(output, ensure_ascii=False)}'
+
+
+class FewShotLibrary:
+    """Ejemplos indexados por n-gramas de caracteres de la frase."""
+
+    def __init__(self, examples: List[FewShotExample]):
+        self.examples = examples
+        self._index = NgramTfidfIndex([e.segment for e in examples])
+
+    def __len__(self) -> int:
+        return len(self.examples)
+
+    @classmethod
+    def load(cls, path: Path = EXAMPLES_PATH) -> "FewShotLibrary":
+        examples = []
+        with open(path, "r", encoding="utf-8") as fh:
+            for line_no, line in enumerate(fh, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                    mappings = [FieldMapping(**m) for m in row.get("mappings") or []]
+                except (json.JSONDecodeError, ValidationError, TypeError) as e:
+                    logger.warning(f"[FewShot] Línea {line_no} inválida, ignorada: {e}")
+                    continue
+                segment = (row.get("segment") or "").strip()
+                if segment:
+                    examples.append(FewShotExample(segment, mappings))
+        return cls(examples)
+
+    def nearest(
+        self,
+        phrases: List[str],
+        k: int,
+        min_score: float,
+        available_keys: Iterable[str],
+    ) -> List[FewShotExample]:
+        """
+        Los k ejemplos más parecidos a alguna de las frases (score >= min_score)
+        cuyos campos están todos en `available_keys`, del más al menos parecido.
+        Una transcripción larga se pasa partida en frases: contra el texto
+        completo el coseno se diluye y ningún ejemplo superaría el umbral.
+        """
+        if not self.examples or not phrases or k <= 0:
+            return []
+        available = set(available_keys)
+        scores = self._index.score(phrases[0])
+        for phrase in phrases[1:]:
+            np.maximum(scores, self._index.score(phrase), out=scores)
+        selected = []
+        for i in np.argsort(-scores):
+            if float(scores[i]) < min_score:
+                break
+            example = self.examples[i]
+            if example.field_keys <= available:
+                selected.append(example)
+                if len(selected) >= k:
+                    break
+        return selected
+
+
+_library: Optional[FewShotLibrary] = None
+_load_attempted = False
+
+
+def get_fewshot_library() -> Optional[FewShotLibrary]:
+    """Biblioteca cargada una vez por proceso; None si no hay archivo."""
+    global _library, _load_attempted
+    if not _load_attempted:
+        _load_attempted = True
+        if EXAMPLES_PATH.exists():
+            try:
+                _library = FewShotLibrary.load(EXAMPLES_PATH)
+                logger.info(f"[FewShot] {len(_library)} ejemplos cargados")
+            except Exception:
+                logger.exception("[FewShot] No se pudo cargar la biblioteca de ejemplos")
+        else:
+            logger.info("[FewShot] Sin biblioteca de ejemplos, prompts con reglas completas")
+    return _library
+
+
+def format_examples(examples: List[FewShotExample], alias: Callable[[str], str]) -> str:
+    """Bloque EJEMPLOS para el prompt."""
+    return "\n".join(f"- {e.render(alias)}" for e in examples)
@@ -0,0 +1,175 @@
+"""
+Recuperación local de campos candidatos antes del LLM (CAPA 3b).
+
+El prompt genérico de segmento lista TODOS los campos Biowel sin llenar,
+aunque el segmento solo toque uno o dos. Este módulo construye, una vez por
+estructura de formulario, un índice TF-IDF de n-gramas de caracteres
+(3-4) sobre label + sección + ojo + opciones + palabras del unique_key, y
+puntúa los campos contra el segmento con NumPy (similitud coseno).
+
+Solo los top-K candidatos van al prompt. Si el mejor score es bajo (el
+segmento no se parece a ningún campo) el llamador usa la lista completa.
+Los n-gramas de caracteres toleran errores fonéticos de Deepgram
+("cornia" ~ "córnea") mejor que las palabras completas.
+"""
+
+import logging
+import math
+import re
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.section_registry import fold_text, form_signature
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZES = (3, 4)
+INDEX_CACHE_SIZE = 16
+
+_EYE_WORDS = {
+    "OD": "ojo derecho od",
+    "OI": "ojo izquierdo oi",
+    "AO": "ambos ojos ao",
+}
+_NON_WORD_RE = re.compile(r"[^a-z0-9ñ]+")
+_STOPWORDS = {
+    "a", "al", "de", "del", "el", "la", "las", "los", "lo", "en", "y", "o",
+    "con", "por", "para", "un", "una", "que", "se", "es", "su", "le", "me",
+}
+
+
+def char_ngrams(text: str, sizes: Tuple[int, ...] = NGRAM_SIZES) -> Counter:
+    """
+    N-gramas de caracteres por palabra (con borde " palabra ") del texto
+    plegado, sin stopwords: "la córnea" → {" co", "cor", "orn", ..., "ea "}.
+    """
+    grams: Counter = Counter()
+    for word in _NON_WORD_RE.sub(" ", fold_text(text)).split():
+        if word in _STOPWORDS:
+            continue
+        padded = f" {word} "
+        for n in sizes:
+            for i in range(len(padded) - n + 1):
+                grams[padded[i:i + n]] += 1
+    return grams
+
+
+def field_document(field: Dict) -> str:
+    """Texto indexado para un campo Biowel."""
+    key_words = _NON_WORD_RE.sub(" ", (field.get("unique_key") or "").lower())
+    label = field.get("label") or ""
+    parts = [
+        # El label pesa doble: es lo que el médico suele decir
+        label,
+        label,
+        (field.get("section") or "").replace("-", " ").replace("_", " "),
+        _EYE_WORDS.get(field.get("eye") or "", ""),
+        " ".join(field.get("options") or []),
+        key_words,
+    ]
+    return " ".join(p for p in parts if p)
+
+
+class NgramTfidfIndex:
+    """
+    Índice TF-IDF de n-gramas de caracteres sobre un conjunto de documentos.
+
+    Se guarda como listas invertidas (n-grama → índices de documento + pesos)
+    en arrays NumPy; puntuar un texto cuesta una suma vectorizada por n-grama
+    del texto, independiente del tamaño del vocabulario.
+    """
+
+    def __init__(self, documents: List[str]):
+        self.size = len(documents)
+        doc_grams = [char_ngrams(d) for d in documents]
+
+        df: Counter = Counter()
+        for grams in doc_grams:
+            df.update(grams.keys())
+        self._idf = {
+            g: math.log((1 + self.size) / (1 + count)) + 1.0 for g, count in df.items()
+        }
+
+        postings: Dict[str, Tuple[List[int], List[float]]] = {}
+        for doc_idx, grams in enumerate(doc_grams):
+            weights = {g: (1.0 + math.log(tf)) * self._idf[g] for g, tf in grams.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for g, w in weights.items():
+                entry = postings.setdefault(g, ([], []))
+                entry[0].append(doc_idx)
+                entry[1].append(w / norm)
+
+        self._postings = {
+            g: (np.asarray(idx, dtype=np.int32), np.asarray(w, dtype=np.float32))
+            for g, (idx, w) in postings.items()
+        }
+
+    def score(self, text: str) -> np.ndarray:
+        """Similitud coseno de `text` contra cada documento."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        grams = {g: tf for g, tf in char_ngrams(text).items() if g in self._postings}
+        if not grams:
+            return scores
+
+        query = {g: (1.0 + math.log(tf)) * self._idf[g] for g, tf in grams.items()}
+        norm = math.sqrt(sum(w * w for w in query.values())) or 1.0
+        for g, qw in query.items():
+            idx, weights = self._postings[g]
+            scores[idx] += weights * (qw / norm)
+        return scores
+
+
+class FieldRetrievalIndex:
+    """Índice de campos Biowel para seleccionar candidatos por segmento."""
+
+    def __init__(self, fields: List[Dict]):
+        self.keys = [f.get("unique_key", "") for f in fields]
+        self._index = NgramTfidfIndex([field_document(f) for f in fields])
+
+    def top_k(
+        self,
+        segment: str,
+        k: int,
+        min_score: float,
+        exclude: Optional[Iterable[str]] = None,
+    ) -> Optional[List[str]]:
+        """
+        Retorna los unique_key de los k campos más parecidos al segmento,
+        o None si la confianza es baja (mejor score < min_score) y conviene
+        usar la lista completa.
+        """
+        scores = self._index.score(segment)
+        if exclude:
+            excluded = set(exclude)
+            for i, key in enumerate(self.keys):
+                if key in excluded:
+                    scores[i] = -1.0
+
+        if not scores.size or float(scores.max()) < min_score:
+            return None
+
+        k = min(k, scores.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.keys[i] for i in top if scores[i] > 0]
+
+
+_CACHE: "OrderedDict[str, FieldRetrievalIndex]" = OrderedDict()
+
+
+def get_field_index(fields: List[Dict]) -> FieldRetrievalIndex:
+    """Índice de recuperación cacheado por firma del formulario."""
+    signature = form_signature(fields)
+    cached = _CACHE.get(signature)
+    if cached is not None:
+        _CACHE.move_to_end(signature)
+        return cached
+
+    index = FieldRetrievalIndex(fields)
+    _CACHE[signature] = index
+    if len(_CACHE) > INDEX_CACHE_SIZE:
+        _CACHE.popitem(last=False)
+    logger.info(f"[FieldRetrieval] Índice construido: {len(fields)} campos")
+    return index
@@ -0,0 +1,197 @@
+"""
+Backends de chat-completion intercambiables para ResilientLLMClient.
+
+Se elige con settings.llm_backend:
+- "groq": SDK oficial de Groq (default).
+- "openai": cualquier endpoint HTTP compatible con OpenAI
+  (`POST {llm_base_url}/chat/completions`), p.ej. un servidor llama.cpp o
+  vLLM en el rack propio: sin el round trip WAN para clínicas con mala
+  conectividad.
+- "fake": respuestas deterministas en proceso, sin red, para pruebas y
+  benchmarks del pipeline offline.
+
+Todos exponen `complete(request) -> respuesta` con la forma de la SDK
+(`.choices[0].message.content`, `.usage.prompt_tokens`, ...), así que
+VoiceProcessor y la contabilidad de uso no distinguen el backend.
+Un cliente (y su pool HTTP) por backend y proceso: get_llm_backend().
+"""
+
+import asyncio
+import json
+import logging
+import re
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.config import get_settings
+from app.section_registry import fold_text
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class LLMBackend:
+    """Interfaz mínima: una chat completion por llamada, sin reintentos."""
+
+    name = "base"
+
+    async def complete(self, request: Dict[str, Any]) -> Any:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+# ============================================
+# Groq
+# ============================================
+
+class GroqBackend(LLMBackend):
+    name = "groq"
+
+    def __init__(self):
+        from groq import AsyncGroq
+
+        # El SDK trae reintentos y timeout de 600s por defecto: los controla
+        # ResilientLLMClient (deadline, reintentos, hedging)
+        self._client = AsyncGroq(
+            api_key=settings.groq_api_key,
+            max_retries=0,
+            timeout=max(settings.llm_timeout_segment, settings.llm_timeout_full),
+        )
+
+    async def complete(self, request: Dict[str, Any]) -> Any:
+        return await self._client.chat.completions.create(**request)
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+# ============================================
+# Endpoint compatible con OpenAI (llama.cpp, vLLM, ...)
+# ============================================
+
+def _to_namespace(value: Any) -> Any:
+    """JSON → objetos con acceso por atributo, como las respuestas de la SDK."""
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: _to_namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_to_namespace(v) for v in value]
+    return value
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    name = "openai"
+
+    def __init__(self, base_url: str, api_key: str = ""):
+        if not base_url:
+            raise ValueError("LLM_BASE_URL es obligatorio con LLM_BACKEND=openai")
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers=headers,
+            timeout=max(settings.llm_timeout_segment, settings.llm_timeout_full),
+            limits=httpx.Limits(
+                max_connections=settings.llm_pool_size,
+                max_keepalive_connections=settings.llm_pool_size,
+            ),
+        )
+
+    async def complete(self, request: Dict[str, Any]) -> Any:
+        response = await self._client.post("/chat/completions", json=request)
+        response.raise_for_status()
+        return _to_namespace(response.json())
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+# ============================================
+# Fake determinista (pruebas / benchmarks)
+# ============================================
+
+# Texto a mapear: FRASE / FRASE DICTADA (segmento y sección) o TRANSCRIPCIÓN (completo)
+_FAKE_TEXT_RE = re.compile(r'(?:FRASE(?: DICTADA)?|TRANSCRIPCIÓN DEL DOCTOR):\s*"(.*?)"', re.DOTALL)
+# Líneas de catálogo: "f3 (Córnea) [OD]" o "- attention-origin-select (Origen...) [select]"
+_FAKE_FIELD_RE = re.compile(r"^-?\s*([\w-]+) \(([^)\n]+)\)", re.MULTILINE)
+_FAKE_VALUE_MAX_CHARS = 80
+
+
+class FakeBackend(LLMBackend):
+    """
+    Responde sin red y de forma determinista: un campo del catálogo del
+    prompt se llena si su label aparece en el texto, con lo que sigue al
+    label como value. Latencia fija configurable (llm_fake_latency_ms).
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    async def complete(self, request: Dict[str, Any]) -> Any:
+        self.calls += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        prompt = request["messages"][-1]["content"]
+        content = json.dumps({"mappings": self._mappings(prompt) or None}, ensure_ascii=False)
+        usage = {
+            # ~4 caracteres por token, suficiente para la contabilidad de uso
+            "prompt_tokens": sum(len(m["content"]) for m in request["messages"]) // 4,
+            "completion_tokens": len(content) // 4,
+        }
+        return _to_namespace({
+            "model": request.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+        })
+
+    @staticmethod
+    def _mappings(prompt: str) -> List[Dict[str, Any]]:
+        match = _FAKE_TEXT_RE.search(prompt)
+        if not match:
+            return []
+        text = fold_text(match.group(1))
+
+        # Posición de cada label en el texto; el value llega hasta el siguiente
+        # label mencionado o el siguiente separador de spans (" ... ")
+        found = []
+        for field_name, label in _FAKE_FIELD_RE.findall(prompt):
+            folded_label = fold_text(label).strip()
+            pos = text.find(folded_label) if folded_label else -1
+            if pos >= 0:
+                found.append((pos, pos + len(folded_label), field_name))
+        found.sort()
+
+        mappings = []
+        for i, (_, start, field_name) in enumerate(found):
+            end = found[i + 1][0] if i + 1 < len(found) else len(text)
+            value = text[start:end].split("...")[0].strip(" :,.")[:_FAKE_VALUE_MAX_CHARS]
+            if value:
+                mappings.append({"field_name": field_name, "value": value, "confidence": 0.8})
+        return mappings
+
+
+_BACKENDS: Dict[str, LLMBackend] = {}
+
+
+def get_llm_backend(name: Optional[str] = None) -> LLMBackend:
+    """Backend por nombre (default: settings.llm_backend), uno por proceso."""
+    name = (name or settings.llm_backend).lower()
+    backend = _BACKENDS.get(name)
+    if backend is None:
+        if name == "groq":
+            backend = GroqBackend()
+        elif name == "openai":
+            backend = OpenAICompatibleBackend(settings.llm_base_url, settings.llm_api_key)
+        elif name == "fake":
+            backend = FakeBackend(latency_ms=settings.llm_fake_latency_ms)
+        else:
+            raise ValueError(f"LLM_BACKEND desconocido: '{name}' (groq | openai | fake)")
+        _BACKENDS[name] = backend
+        logger.info(f"[LLM] Backend '{name}' inicializado (modelo {settings.llm_model})")
+    return backend
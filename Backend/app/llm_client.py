@@ -0,0 +1,332 @@
+"""
+Cliente LLM resiliente compartido por todas las sesiones.
+
+Envuelve las llamadas al backend LLM (Groq, endpoint compatible con OpenAI
+o fake; ver app/llm_backends.py) con:
+- Deadline por llamada (distinto para segmento/sección y para mapeo completo)
+- Reintentos acotados ante errores transitorios dentro del deadline
+- Hedging opcional: si la respuesta tarda más que el p95 observado para esa
+  capa, se lanza un duplicado y gana la primera respuesta
+- Circuit breaker: tras N fallos consecutivos el proveedor se marca como no
+  disponible y las sesiones pasan a extracción solo por reglas
+  (keywords, patrones anclados, process_segment) hasta que un probe tenga éxito
+
+El estado del breaker, los percentiles de latencia y el uso acumulado
+(tokens, cache hits; ver app/llm_usage.py) se exponen vía metrics().
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.config import get_settings
+from app.llm_backends import LLMBackend, get_llm_backend
+from app.llm_usage import SessionUsage, process_usage, record_call, record_error
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Muestras de latencia guardadas por capa para calcular percentiles
+LATENCY_WINDOW = 256
+
+
+class LLMUnavailableError(RuntimeError):
+    """El proveedor LLM está marcado como no disponible (breaker abierto)."""
+
+
+def is_request_rejection(error: BaseException) -> bool:
+    """
+    True si el proveedor respondió y rechazó el request (4xx salvo 408/429:
+    parámetros, response_format, JSON inválido). Es un error del request, no
+    de la salud del proveedor: no cuenta para el breaker ni se reintenta.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status not in (408, 429)
+
+
+class LatencyTracker:
+    """Ventana deslizante de latencias (segundos) con percentiles."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[idx]
+
+
+class CircuitBreaker:
+    """
+    Breaker clásico closed → open → half_open.
+
+    - closed: todas las llamadas pasan
+    - open: ninguna llamada pasa hasta que vence el cooldown
+    - half_open: se permite UNA llamada de prueba; si tiene éxito se cierra,
+      si falla se vuelve a abrir
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.consecutive_failures = 0
+        self.opens = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def is_available(self) -> bool:
+        """True si una sesión debería intentar usar el LLM."""
+        return self.state != self.OPEN
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self._state != self.CLOSED:
+            logger.info("[LLM-Breaker] Proveedor recuperado, breaker cerrado")
+        self._state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """La llamada terminó sin decir nada de la salud del proveedor (cancelada o rechazada)."""
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self._state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self.opens += 1
+                logger.warning(
+                    f"[LLM-Breaker] Breaker ABIERTO tras {self.consecutive_failures} fallos; "
+                    f"modo solo reglas por {self.cooldown_seconds}s"
+                )
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+
+
+class ResilientLLMClient:
+    """Capa compartida de llamadas chat-completion con deadlines, hedging y breaker."""
+
+    def __init__(self, backend: Optional[LLMBackend] = None):
+        self._backend = backend or get_llm_backend()
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.llm_breaker_failure_threshold,
+            cooldown_seconds=settings.llm_breaker_cooldown_seconds,
+        )
+        self._latency: Dict[str, LatencyTracker] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+
+    # ------------------------------------------
+    # API pública
+    # ------------------------------------------
+
+    def is_available(self) -> bool:
+        return self.breaker.is_available()
+
+    async def chat(
+        self,
+        *,
+        layer: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float = 0.1,
+        timeout: Optional[float] = None,
+        usage: Optional[SessionUsage] = None,
+        **kwargs: Any,
+    ):
+        """
+        Ejecuta una chat completion con deadline, reintentos y hedging.
+
+        Args:
+            layer: Capa que llama ("section", "segment", "full"); separa
+                percentiles y deadlines por tipo de prompt.
+            timeout: Deadline total en segundos (default según capa).
+            usage: Uso de la sesión que llama; la llamada se suma ahí además
+                de a los contadores del proceso.
+
+        Raises:
+            LLMUnavailableError: Si el breaker está abierto.
+            asyncio.TimeoutError: Si se vence el deadline.
+        """
+        counters = self._counters.setdefault(
+            layer, {"calls": 0, "errors": 0, "timeouts": 0, "rejected": 0}
+        )
+        if not self.breaker.allow_request():
+            counters["rejected"] += 1
+            raise LLMUnavailableError(f"Proveedor LLM no disponible (breaker {self.breaker.state})")
+
+        counters["calls"] += 1
+        deadline = timeout or (
+            settings.llm_timeout_full if layer == "full" else settings.llm_timeout_segment
+        )
+        request = {
+            "model": settings.llm_model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            **kwargs,
+        }
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            response = await asyncio.wait_for(
+                self._call_with_retries(layer, request, started + deadline),
+                timeout=deadline,
+            )
+        except asyncio.TimeoutError:
+            counters["timeouts"] += 1
+            self.breaker.record_failure()
+            record_error(layer, loop.time() - started, usage)
+            logger.warning(f"[LLM] Deadline de {deadline}s vencido (capa '{layer}')")
+            raise
+        except asyncio.CancelledError:
+            # Perdedor de una carrera, shard descartado o WebSocket cerrado: si
+            # era el probe del half_open, liberarlo para que otra llamada pruebe
+            self.breaker.release_probe()
+            raise
+        except Exception as e:
+            counters["errors"] += 1
+            if is_request_rejection(e):
+                self.breaker.release_probe()
+            else:
+                self.breaker.record_failure()
+            record_error(layer, loop.time() - started, usage)
+            raise
+
+        self.breaker.record_success()
+        elapsed = loop.time() - started
+        self._latency.setdefault(layer, LatencyTracker()).add(elapsed)
+        record_call(layer, response, elapsed, usage)
+        return response
+
+    def metrics(self) -> Dict[str, Any]:
+        """Estado del breaker + percentiles de latencia (ms) y uso por capa."""
+        layers = {}
+        for layer, counters in self._counters.items():
+            tracker = self._latency.get(layer, LatencyTracker())
+            layer_metrics = {**counters, "samples": len(tracker)}
+            for p in (50, 95, 99):
+                value = tracker.percentile(p)
+                layer_metrics[f"p{p}_ms"] = round(value * 1000, 1) if value is not None else None
+            layers[layer] = layer_metrics
+        return {
+            "backend": self._backend.name,
+            "breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "opens": self.breaker.opens,
+            },
+            "hedging": {
+                "enabled": settings.llm_hedge_enabled,
+                "hedges_sent": self.hedges_sent,
+                "hedge_wins": self.hedge_wins,
+            },
+            "layers": layers,
+            "usage": process_usage.to_dict(),
+        }
+
+    # ------------------------------------------
+    # Internos
+    # ------------------------------------------
+
+    async def _call_with_retries(self, layer: str, request: Dict[str, Any], deadline_at: float):
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            try:
+                return await self._hedged_call(layer, request)
+            except Exception as e:
+                backoff = settings.llm_retry_backoff_seconds * (2 ** attempt)
+                if (
+                    is_request_rejection(e)
+                    or attempt >= settings.llm_max_retries
+                    or loop.time() + backoff >= deadline_at
+                ):
+                    raise
+                attempt += 1
+                logger.warning(f"[LLM] Error en capa '{layer}' ({e}), reintento {attempt}")
+                await asyncio.sleep(backoff)
+
+    def _hedge_delay(self, layer: str) -> Optional[float]:
+        """p95 observado de la capa, o None si no hay muestras suficientes."""
+        if not settings.llm_hedge_enabled:
+            return None
+        tracker = self._latency.get(layer)
+        if not tracker or len(tracker) < settings.llm_hedge_min_samples:
+            return None
+        return tracker.percentile(95)
+
+    async def _hedged_call(self, layer: str, request: Dict[str, Any]):
+        primary = asyncio.create_task(self._backend.complete(request))
+        hedge_delay = self._hedge_delay(layer)
+        if hedge_delay is None:
+            return await primary
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                self.hedges_sent += 1
+                logger.info(f"[LLM] Hedge lanzado en capa '{layer}' tras {hedge_delay * 1000:.0f}ms")
+                tasks.add(asyncio.create_task(self._backend.complete(request)))
+
+            last_error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+_client: Optional[ResilientLLMClient] = None
+
+
+def get_llm_client() -> ResilientLLMClient:
+    """Cliente compartido por proceso (pool HTTP + breaker + métricas comunes)."""
+    global _client
+    if _client is None:
+        _client = ResilientLLMClient()
+    return _client
@@ -0,0 +1,167 @@
+"""
+Contabilidad de uso del LLM: llamadas, tokens, latencia y cache por capa.
+
+Cada llamada de ResilientLLMClient.chat() se registra en dos niveles:
+- Sesión (SessionUsage): una por VoiceProcessor / sesión WebSocket. Al
+  end_stream se envía el resumen al cliente y se reinicia.
+- Proceso: contadores acumulados de todas las sesiones, expuestos en
+  /metrics/llm junto al breaker y los percentiles.
+
+Capas: "section" (mini-prompt), "segment" (prompt genérico), "full"
+(mapeo de fin de stream). Los tokens salen de `response.usage`; los
+cache hits de `usage.prompt_tokens_details.cached_tokens` cuando el
+proveedor lo reporta (prompt caching). La respuesta perdedora de un
+hedge no se cuenta: el proveedor no la devuelve.
+"""
+
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def extract_usage(response: Any) -> Tuple[int, int, int]:
+    """(prompt_tokens, completion_tokens, cached_tokens) de una respuesta."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0, 0, 0
+    prompt = getattr(usage, "prompt_tokens", None) or 0
+    completion = getattr(usage, "completion_tokens", None) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        cached = details.get("cached_tokens") or 0
+    else:
+        cached = getattr(details, "cached_tokens", None) or 0
+    return int(prompt), int(completion), int(cached)
+
+
+class UsageTotals:
+    """Acumulado de llamadas de una capa."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cache_hits = 0
+        self.latency_ms = 0.0
+
+    def add(self, prompt: int, completion: int, cached: int, latency_ms: float) -> None:
+        self.calls += 1
+        self.prompt_tokens += prompt
+        self.completion_tokens += completion
+        self.cached_tokens += cached
+        if cached:
+            self.cache_hits += 1
+        self.latency_ms += latency_ms
+
+    def add_error(self, latency_ms: float) -> None:
+        self.errors += 1
+        self.latency_ms += latency_ms
+
+    def merge(self, other: "UsageTotals") -> None:
+        for name, value in vars(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        attempts = self.calls + self.errors
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_hits": self.cache_hits,
+            "latency_ms_total": round(self.latency_ms, 1),
+            "latency_ms_avg": round(self.latency_ms / attempts, 1) if attempts else None,
+        }
+
+
+class SessionUsage:
+    """Uso del LLM de una sesión de dictado, por capa."""
+
+    def __init__(self):
+        self.layers: Dict[str, UsageTotals] = {}
+        self.started_at = time.monotonic()
+
+    def record(self, layer: str, prompt: int, completion: int, cached: int, latency_ms: float) -> None:
+        self.layers.setdefault(layer, UsageTotals()).add(prompt, completion, cached, latency_ms)
+
+    def record_error(self, layer: str, latency_ms: float) -> None:
+        self.layers.setdefault(layer, UsageTotals()).add_error(latency_ms)
+
+    def summary(self) -> Dict[str, Any]:
+        total = UsageTotals()
+        for totals in self.layers.values():
+            total.merge(totals)
+        return {
+            **total.to_dict(),
+            "session_seconds": round(time.monotonic() - self.started_at, 1),
+            "layers": {layer: totals.to_dict() for layer, totals in self.layers.items()},
+        }
+
+    def reset(self) -> None:
+        self.layers.clear()
+        self.started_at = time.monotonic()
+
+
+class ProcessUsage:
+    """Contadores de uso acumulados por proceso (todas las sesiones)."""
+
+    def __init__(self):
+        self.layers: Dict[str, UsageTotals] = {}
+        self.sessions = 0
+
+    def record(self, layer: str, prompt: int, completion: int, cached: int, latency_ms: float) -> None:
+        self.layers.setdefault(layer, UsageTotals()).add(prompt, completion, cached, latency_ms)
+
+    def record_error(self, layer: str, latency_ms: float) -> None:
+        self.layers.setdefault(layer, UsageTotals()).add_error(latency_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sessions": self.sessions,
+            "layers": {layer: totals.to_dict() for layer, totals in self.layers.items()},
+        }
+
+
+process_usage = ProcessUsage()
+
+
+def record_call(
+    layer: str,
+    response: Any,
+    latency_s: float,
+    session: Optional[SessionUsage] = None,
+) -> None:
+    """Registra una llamada exitosa en el proceso y, si se indica, en la sesión."""
+    prompt, completion, cached = extract_usage(response)
+    latency_ms = latency_s * 1000
+    process_usage.record(layer, prompt, completion, cached, latency_ms)
+    if session is not None:
+        session.record(layer, prompt, completion, cached, latency_ms)
+
+
+def record_error(layer: str, latency_s: float, session: Optional[SessionUsage] = None) -> None:
+    """Registra una llamada fallida (error o deadline vencido)."""
+    latency_ms = latency_s * 1000
+    process_usage.record_error(layer, latency_ms)
+    if session is not None:
+        session.record_error(layer, latency_ms)
+
+
+def finish_session(session: SessionUsage) -> Dict[str, Any]:
+    """Resumen de la sesión para el cliente; la reinicia para el siguiente dictado."""
+    summary = session.summary()
+    process_usage.sessions += 1
+    per_layer = ", ".join(f"{layer}={totals['calls']}" for layer, totals in summary["layers"].items())
+    logger.info(
+        f"[LLM-Usage] Sesión: {summary['calls']} llamadas ({per_layer or 'ninguna'}), "
+        f"{summary['prompt_tokens']}+{summary['completion_tokens']} tokens, "
+        f"{summary['cache_hits']} cache hits, {summary['latency_ms_total']}ms"
+    )
+    session.reset()
+    return summary
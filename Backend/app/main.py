@@ -10,9 +10,17 @@ import asyncio
 import base64
 import json
 import logging
+import os
 import re
+import sys
+import time
 from pathlib import Path
 
+try:
+    import resource  # Solo Unix; en Windows /metrics/process reporta None
+except ImportError:
+    resource = None
+
 # Constantes
 RECONNECT_LOG_INTERVAL = 50   # Log de reconexión cada N chunks
 AUDIO_DEBUG_LOG_INTERVAL = 20  # Log debug de audio cada N chunks
@@ -24,11 +32,18 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.config import get_settings
 from app.models import FormStructure
 from app.voice_processor import VoiceProcessor
-from app.deepgram_streamer import DeepgramStreamer
+from app.llm_client import get_llm_client
+from app.llm_usage import finish_session
+from app.stt_providers import StreamingSTTProvider, create_streaming_stt
 from app.api.batch_routes import router as batch_router
+from app.services.biowel_batch_mapper import split_transcript_sections
+from app.services.batch_jobs import get_job_queue
+from app.services.mapping_pool import get_mapping_pool
+from app.services.transcript_cache import get_transcript_cache
 from app.realtime_extractor import (
     RealtimeExtractor,
     ActiveFieldTracker,
+    TranscriptSpanTracker,
     normalize_value,
     clean_captured_value,
     strip_keywords_and_commands,
@@ -63,16 +78,24 @@ app.add_middleware(
 app.include_router(batch_router)
 
 
+# Sesiones WebSocket abiertas en este proceso (para /metrics/process)
+active_sessions = 0
+PROCESS_STARTED_AT = time.monotonic()
+
+
 @app.websocket("/ws/voice-stream")
 async def voice_stream_endpoint(websocket: WebSocket):
+    global active_sessions
     await websocket.accept()
+    active_sessions += 1
     logger.info("Cliente conectado al WebSocket")
 
     # Inicializar servicios
     voice_processor = VoiceProcessor()
     realtime_extractor = RealtimeExtractor()
     active_field_tracker = ActiveFieldTracker()  # Sistema de activación por palabra clave
-    deepgram_streamer: DeepgramStreamer | None = None
+    transcript_spans = TranscriptSpanTracker()  # Spans finales consumidos por reglas/keywords
+    stt_streamer: StreamingSTTProvider | None = None
     consumer_task: asyncio.Task | None = None
     is_biowel_mode = False
     validator = None
@@ -88,22 +111,45 @@ async def voice_stream_endpoint(websocket: WebSocket):
                 logger.info(f"[RT-LLM] Segmento casual ignorado: '{text[:50]}'")
                 return
 
+            # Proveedor LLM caído (breaker abierto): las reglas deterministas
+            # (keywords, patrones anclados, process_segment) ya corrieron para
+            # este segmento antes de llegar aquí; sin LLM queda sin mapear
+            if not get_llm_client().is_available():
+                logger.info(f"[RT-LLM] LLM no disponible, segmento sin mapear: '{text[:50]}'")
+                return
+
             already = dict(realtime_extractor.already_filled)
 
             # CAPA 2: Clasificar sección (<5ms, regex)
-            section = realtime_extractor.classify_section(text)
+            scored = realtime_extractor.classify_section_scored(text)
+            section, section_confidence = scored if scored else (None, 0.0)
+
+            speculative = bool(
+                section and settings.llm_speculative_enabled
+                and section_confidence < settings.llm_speculative_confidence
+            )
 
             llm_mappings = []
-            if section:
+            if speculative:
+                # CAPA 3a + 3b en paralelo: clasificación dudosa, gana el primero válido
+                logger.info(
+                    f"[RT-LLM] Sección dudosa '{section}' (conf={section_confidence}), "
+                    f"modo especulativo para '{text[:50]}'"
+                )
+                llm_mappings = await voice_processor.map_segment_speculative(
+                    section, text, already_filled=already
+                )
+            elif section:
                 # CAPA 3a: Mini-prompt para sección específica (~100ms)
                 logger.info(f"[RT-LLM] Sección detectada: '{section}' para '{text[:50]}'")
                 llm_mappings = await voice_processor.map_section_fields(
                     section, text, already_filled=already
                 )
 
-            if not llm_mappings:
+            if not llm_mappings and not speculative:
                 # CAPA 3b: Fallback al prompt genérico (~200ms)
                 # Solo si el mini-prompt no retornó nada o no se detectó sección
+                # (en modo especulativo el genérico ya corrió en paralelo)
                 llm_mappings = await voice_processor.map_segment_to_fields(
                     text, already_filled=already
                 )
@@ -193,6 +239,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
             logger.info(f"[KeywordDetect] text='{text[:60]}' match={keyword_match}")
             
             if is_final:
+                span_id = transcript_spans.add_final(text)
                 # =============================================
                 # PRIORIDAD 1: COMANDOS DE CONTROL (siempre primero)
                 # Detectar cmd_stop y cmd_clear INCLUSO si hay campo activo
@@ -211,6 +258,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                         realtime_extractor.already_filled.pop(target_testid, None)
                         logger.info(f"[Uncheck] '{target_testid}' desmarcado por '{keyword}'")
                         session_keyword_buffer = ""
+                        transcript_spans.consume(span_id, "command")
                         return
 
                     if testid == "cmd_stop":
@@ -237,6 +285,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                             realtime_extractor.already_filled[prev_testid] = normalized
                             logger.info(f"[cmd_stop FINAL] Campo '{prev_testid}' cerrado con: '{prev_text[:60]}'")
                         session_keyword_buffer = ""
+                        transcript_spans.consume(span_id, "command")
                         return
 
                     if testid == "cmd_clear":
@@ -250,6 +299,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                                 "source_text": f"[Borrado por comando: {keyword}]"
                             })
                         session_keyword_buffer = ""
+                        transcript_spans.consume(span_id, "command")
                         return
                 
                 # =============================================
@@ -278,6 +328,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                         "items": anchored_items,
                         "source_text": text
                     })
+                    transcript_spans.consume(span_id, "anchored")
                     return
                 
                 # =============================================
@@ -336,6 +387,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                             active_field_tracker.accumulated_text = ""
                             logger.info(f"[Checkbox] '{testid}' activado inmediatamente por keyword '{keyword}'")
                         session_keyword_buffer = ""
+                        transcript_spans.consume(span_id, "keyword")
                         return
                     
                     elif ftype_candidate == "select" and keyword_match[1].lower() not in ["tiempo", "unidad", "cantidad", "valor"]:
@@ -365,6 +417,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                         active_field_tracker.accumulated_text = ""
                         logger.info(f"[Select] '{testid}' = '{normalized_select}' por keyword '{keyword}'")
                         session_keyword_buffer = ""
+                        transcript_spans.consume(span_id, "keyword")
                         return
 
                     elif ftype_candidate == "radio":
@@ -393,6 +446,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                         active_field_tracker.accumulated_text = ""
                         logger.info(f"[Radio] '{testid}' activado por keyword '{keyword}'")
                         session_keyword_buffer = ""
+                        transcript_spans.consume(span_id, "keyword")
                         return
 
                     elif ftype_candidate == "button":
@@ -421,6 +475,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                         active_field_tracker.accumulated_text = ""
                         session_keyword_buffer = ""
                         logger.info(f"[Button] '{testid}' clickeado por keyword '{keyword}' (flujo limpio)")
+                        transcript_spans.consume(span_id, "keyword")
                         return
 
                     elif ftype_candidate in ("textarea", "text"):
@@ -447,6 +502,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                                 active_field_tracker.append_text(clean_after)
                         session_keyword_buffer = ""
                         logger.info(f"[Textarea PRIO3] Campo '{testid}' activado por '{keyword}' (rápido)")
+                        transcript_spans.consume(span_id, "keyword")
                         return
 
                 # =============================================
@@ -460,6 +516,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                             "items": [item.model_dump() for item in items],
                             "source_text": text
                         })
+                        # Sin consume(): las reglas pueden extraer solo parte del segmento
                         return
 
                 # =============================================
@@ -511,6 +568,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                         session_keyword_buffer = ""
                         # FIX BUG 3: Retornar después de activar campo por keyword
                         # para evitar que el LLM se ejecute innecesariamente
+                        transcript_spans.consume(span_id, "keyword")
                         return
 
                 # =============================================
@@ -553,6 +611,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                             # No hay contenido suficiente, solo desactivar
                             active_field_tracker.activate_field(None, None)
                             session_keyword_buffer = ""
+                            transcript_spans.consume(span_id, "active_field")
                             return
                         current_testid, accumulated_text = current_data
                         ftype = realtime_extractor.get_field_type(current_testid)
@@ -572,6 +631,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                         active_field_tracker.activate_field(None, None)  # Desactivar campo
                         logger.info(f"[Finalización] Campo '{current_testid}' finalizado por palabra: {text}")
                         session_keyword_buffer = ""
+                        transcript_spans.consume(span_id, "active_field")
                         return
                     
                     # SEGUNDO: Eliminar keywords y comandos del texto antes de acumular
@@ -590,6 +650,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                     # Limpiar buffer — el texto ya fue procesado/acumulado al campo activo
                     session_keyword_buffer = ""
                     # No lanzar LLM si ya hay campo activo por keyword
+                    transcript_spans.consume(span_id, "active_field")
                     return
 
                 # FIX BUG 6: Limpiar buffer antes de lanzar LLM
@@ -946,15 +1007,13 @@ async def voice_stream_endpoint(websocket: WebSocket):
                     voice_processor.set_form_structure(form_structure)
                     validator = FormValidator(form_structure)
 
-                    # Iniciar conexión de streaming con Deepgram
-                    deepgram_streamer = DeepgramStreamer(
-                        on_partial=on_partial_transcript
-                    )
-                    await deepgram_streamer.start()
+                    # Iniciar streaming STT (Deepgram o replay según STT_PROVIDER)
+                    stt_streamer = create_streaming_stt(on_partial=on_partial_transcript)
+                    await stt_streamer.start()
 
                     # Lanzar tarea consumidora de transcripciones
                     consumer_task = asyncio.create_task(
-                        deepgram_streamer.consume_transcripts()
+                        stt_streamer.consume_transcripts()
                     )
 
                     await websocket.send_json({
@@ -984,6 +1043,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
                     # Resetear estado del extractor para nueva sesión
                     realtime_extractor.reset()
                     active_field_tracker.reset()
+                    transcript_spans.reset()
                     realtime_extractor.set_biowel_fields(biowel_fields)
                     realtime_extractor.set_already_filled(already_filled)
 
@@ -995,14 +1055,12 @@ async def voice_stream_endpoint(websocket: WebSocket):
                     voice_processor.set_form_structure(form_structure)
                     voice_processor.set_biowel_context(biowel_fields)
 
-                    # Iniciar conexión de streaming con Deepgram
-                    deepgram_streamer = DeepgramStreamer(
-                        on_partial=on_partial_transcript
-                    )
-                    await deepgram_streamer.start()
+                    # Iniciar streaming STT (Deepgram o replay según STT_PROVIDER)
+                    stt_streamer = create_streaming_stt(on_partial=on_partial_transcript)
+                    await stt_streamer.start()
 
                     consumer_task = asyncio.create_task(
-                        deepgram_streamer.consume_transcripts()
+                        stt_streamer.consume_transcripts()
                     )
 
                     await websocket.send_json({
@@ -1027,10 +1085,10 @@ async def voice_stream_endpoint(websocket: WebSocket):
             elif msg_type == "audio_chunk":
                 audio_base64 = message.get("data")
 
-                if not audio_base64 or not deepgram_streamer:
+                if not audio_base64 or not stt_streamer:
                     if not audio_base64:
                         logger.warning("[Audio] Chunk recibido sin data")
-                    if not deepgram_streamer:
+                    if not stt_streamer:
                         logger.warning("[Audio] Chunk recibido sin streamer activo")
                     continue
 
@@ -1043,19 +1101,17 @@ async def voice_stream_endpoint(websocket: WebSocket):
                     voice_stream_endpoint._chunk_count += 1
 
                     # Si Deepgram se desconectó, reconectar
-                    if not deepgram_streamer.is_open:
+                    if not stt_streamer.is_open:
                         if voice_stream_endpoint._chunk_count % RECONNECT_LOG_INTERVAL == 1:
                             logger.warning("[Audio] Deepgram cerrado, intentando reconectar...")
                         try:
                             # Crear nuevo streamer
-                            deepgram_streamer = DeepgramStreamer(
-                                on_partial=on_partial_transcript
-                            )
-                            await deepgram_streamer.start()
+                            stt_streamer = create_streaming_stt(on_partial=on_partial_transcript)
+                            await stt_streamer.start()
                             if consumer_task and not consumer_task.done():
                                 consumer_task.cancel()
                             consumer_task = asyncio.create_task(
-                                deepgram_streamer.consume_transcripts()
+                                stt_streamer.consume_transcripts()
                             )
                             logger.info("[Audio] Deepgram reconectado exitosamente")
                             await websocket.send_json({
@@ -1071,10 +1127,10 @@ async def voice_stream_endpoint(websocket: WebSocket):
                             f"[Audio] Chunk #{voice_stream_endpoint._chunk_count}: "
                             f"{len(audio_bytes)} bytes, "
                             f"primeros 10: {audio_bytes[:10].hex()}, "
-                            f"deepgram_open: {deepgram_streamer.is_open}"
+                            f"deepgram_open: {stt_streamer.is_open}"
                         )
 
-                    await deepgram_streamer.send_audio(audio_bytes)
+                    await stt_streamer.send_audio(audio_bytes)
                 except Exception as e:
                     logger.error(f"Error enviando audio a Deepgram: {e}")
 
@@ -1084,7 +1140,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
             elif msg_type == "end_stream":
                 logger.info("Stream finalizado, procesando transcripción...")
 
-                if not deepgram_streamer:
+                if not stt_streamer:
                     await websocket.send_json({
                         "type": "error",
                         "message": "No hay sesión de streaming activa"
@@ -1123,9 +1179,12 @@ async def voice_stream_endpoint(websocket: WebSocket):
                         except (asyncio.CancelledError, asyncio.TimeoutError):
                             pass
 
-                    # Cerrar Deepgram y obtener transcripción final
-                    full_transcription = await deepgram_streamer.finish()
-                    deepgram_streamer = None
+                    # Cerrar el STT y obtener transcripción final
+                    full_transcription = await stt_streamer.finish()
+                    stt_streamer = None
+                    if is_biowel_mode and full_transcription:
+                        # Finales entregados durante finish() no pasaron por on_partial
+                        transcript_spans.add_missing_tail(full_transcription)
 
                     if full_transcription:
                         logger.info(f"Transcripción final: '{full_transcription[:100]}...'")
@@ -1151,6 +1210,11 @@ async def voice_stream_endpoint(websocket: WebSocket):
                             # Resetear y continuar
                             if is_biowel_mode:
                                 realtime_extractor.reset()
+                                transcript_spans.reset()
+                            await websocket.send_json({
+                                "type": "llm_usage",
+                                "summary": finish_session(voice_processor.usage)
+                            })
                             await websocket.send_json({
                                 "type": "info",
                                 "message": "Stream procesado completamente"
@@ -1158,20 +1222,51 @@ async def voice_stream_endpoint(websocket: WebSocket):
                             continue
 
                         # Mapear a campos del formulario con LLM
-                        # SKIP LLM si ya se llenaron campos por keywords (ahorra tokens
-                        # y evita que el LLM sobreescriba campos correctos)
+                        # En modo Biowel solo van los spans NO consumidos por keywords,
+                        # patrones anclados o dictado al campo activo, y solo los campos
+                        # aún vacíos (el LLM no puede sobreescribir campos correctos)
                         already_filled = realtime_extractor.already_filled if is_biowel_mode else {}
-                        if already_filled:
+                        llm_text = full_transcription
+                        if is_biowel_mode:
+                            llm_text = transcript_spans.unconsumed_text()
                             logger.info(
-                                f"[LLM-SKIP] {len(already_filled)} campos ya llenados por keywords, "
-                                f"saltando LLM: {list(already_filled.keys())}"
+                                f"[LLM-GAP] Spans sin consumir: {len(llm_text)} chars "
+                                f"({transcript_spans.stats()})"
                             )
-                        else:
-                            logger.info("Iniciando mapeo de campos con LLM...")
-                            mappings = await voice_processor.map_voice_to_fields(
-                                full_transcription,
-                                already_filled=already_filled
+
+                        if not get_llm_client().is_available():
+                            logger.warning("[LLM-SKIP] Proveedor LLM no disponible, solo reglas")
+                            await websocket.send_json({
+                                "type": "info",
+                                "message": "LLM no disponible: campos llenados solo por reglas"
+                            })
+                        elif not llm_text or not realtime_extractor.is_relevant(llm_text):
+                            logger.info(
+                                f"[LLM-SKIP] Sin texto clínico fuera de keywords; "
+                                f"{len(already_filled)} campos ya llenados: {list(already_filled.keys())}"
                             )
+                        else:
+                            if (
+                                is_biowel_mode
+                                and settings.llm_sharded_mapping
+                                and len(llm_text) >= settings.llm_shard_min_chars
+                            ):
+                                # Transcripción larga: un prompt por sección en paralelo
+                                shards = [
+                                    (anchor_testid, transcript_spans.unconsumed_text(start, end))
+                                    for start, end, anchor_testid
+                                    in split_transcript_sections(transcript_spans.text)
+                                ]
+                                logger.info(f"Iniciando mapeo LLM por secciones ({len(shards)} shards)...")
+                                mappings = await voice_processor.map_voice_to_fields_sharded(
+                                    shards, already_filled=already_filled
+                                )
+                            else:
+                                logger.info("Iniciando mapeo de campos con LLM...")
+                                mappings = await voice_processor.map_voice_to_fields(
+                                    llm_text,
+                                    already_filled=already_filled
+                                )
 
                             if mappings:
                                 # Preparar y enviar datos para auto-fill
@@ -1231,6 +1326,13 @@ async def voice_stream_endpoint(websocket: WebSocket):
                     # Resetear extractor para siguiente sesión
                     if is_biowel_mode:
                         realtime_extractor.reset()
+                        transcript_spans.reset()
+
+                    # Resumen de uso LLM del dictado (capacidad / qué prompts optimizar)
+                    await websocket.send_json({
+                        "type": "llm_usage",
+                        "summary": finish_session(voice_processor.usage)
+                    })
 
                     await websocket.send_json({
                         "type": "info",
@@ -1240,7 +1342,7 @@ async def voice_stream_endpoint(websocket: WebSocket):
 
                 except Exception as e:
                     logger.error(f"Error procesando stream: {e}", exc_info=True)
-                    deepgram_streamer = None
+                    stt_streamer = None
 
                     await websocket.send_json({
                         "type": "error",
@@ -1266,11 +1368,12 @@ async def voice_stream_endpoint(websocket: WebSocket):
                 await asyncio.wait_for(consumer_task, timeout=CONSUMER_CANCEL_TIMEOUT)
             except (asyncio.CancelledError, asyncio.TimeoutError):
                 pass
-        if deepgram_streamer:
+        if stt_streamer:
             try:
-                await deepgram_streamer.finish()
+                await stt_streamer.finish()
             except Exception:
                 pass
+        active_sessions -= 1
         logger.info("Sesión WebSocket finalizada")
 
 
@@ -1279,6 +1382,59 @@ async def health_check():
     return {"status": "healthy", "service": "voice-to-form-api"}
 
 
+@app.get("/metrics/llm")
+async def llm_metrics():
+    """Estado del circuit breaker, percentiles de latencia y uso acumulado del LLM."""
+    return get_llm_client().metrics()
+
+
+def _current_rss_bytes():
+    """RSS actual desde /proc (Linux); None si no está disponible."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+@app.on_event("startup")
+async def warm_mapping_pool():
+    await get_mapping_pool().warm()
+
+
+@app.on_event("shutdown")
+async def shutdown_batch_jobs():
+    await get_job_queue().shutdown()
+    get_mapping_pool().shutdown()
+
+
+@app.get("/metrics/process")
+async def process_metrics():
+    """CPU y memoria del proceso, para dimensionar sesiones por nodo."""
+    rss = _current_rss_bytes()
+    metrics = {
+        "active_sessions": active_sessions,
+        "uptime_s": round(time.monotonic() - PROCESS_STARTED_AT, 1),
+        "cpu_user_s": None,
+        "cpu_system_s": None,
+        "rss_mb": round(rss / 2**20, 1) if rss is not None else None,
+        "max_rss_mb": None,
+        "batch_jobs": get_job_queue().stats(),
+        "mapping_pool": get_mapping_pool().stats(),
+        "transcript_cache": get_transcript_cache().stats(),
+    }
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # ru_maxrss: KB en Linux, bytes en macOS
+        max_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+        metrics.update(
+            cpu_user_s=round(usage.ru_utime, 3),
+            cpu_system_s=round(usage.ru_stime, 3),
+            max_rss_mb=round(max_rss / 2**20, 1),
+        )
+    return metrics
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -27,6 +27,10 @@ class FieldMapping(BaseModel):
     value: Any
     confidence: float = 1.0
 
+class MappingsResponse(BaseModel):
+    """Respuesta del LLM de mapeo: lista de mappings o null (sin datos clínicos)."""
+    mappings: Optional[List[FieldMapping]] = None
+
 class ValidationResult(BaseModel):
     is_valid: bool
     missing_fields: List[str] = []
@@ -0,0 +1,184 @@
+"""
+Índice de opciones de select por formulario.
+
+KEYWORD_TO_SELECT_VALUE solo cubre un puñado de selects escritos a mano.
+Este módulo indexa las `options` que envía el scanner en cada
+BiowelFieldIdentifier (sin acentos, minúsculas) para:
+
+- Resolver texto dictado → valor de select de forma determinista, sin LLM:
+  un trie de palabras encuentra la opción más larga mencionada en el
+  segmento ("método goldmann" → oftalmology-pio-method-select = "Goldmann").
+- Ajustar (snap) el value de select que devuelve el LLM a la opción válida
+  más cercana (n-gramas de caracteres), o rechazarlo si no se parece a
+  ninguna.
+
+Se cachea por firma del formulario, igual que el registro de secciones.
+"""
+
+import logging
+import re
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.field_retrieval import NgramTfidfIndex
+from app.section_registry import fold_text, form_signature, label_keywords
+
+logger = logging.getLogger(__name__)
+
+OPTION_INDEX_CACHE_SIZE = 16
+
+# Similitud mínima (coseno de n-gramas) para ajustar un value del LLM a una opción
+SNAP_MIN_SCORE = 0.5
+# Opciones con menos letras que esto no se resuelven desde el dictado ("1", "Sí")
+MIN_SPOKEN_OPTION_CHARS = 4
+
+# Opciones que no identifican nada por sí solas
+_GENERIC_OPTIONS = {
+    "seleccionar", "seleccione", "seleccionar opcion", "si", "no", "otro", "otra",
+    "otros", "ninguno", "ninguna", "n/a", "na", "no aplica",
+}
+
+_WORD_RE = re.compile(r"[a-z0-9ñ]+")
+_TERMINAL = "$"
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(fold_text(text))
+
+
+class OptionIndex:
+    """Opciones de todos los selects escaneados de un formulario."""
+
+    def __init__(self, fields: Iterable[Dict]):
+        self._options: Dict[str, List[str]] = {}
+        self._folded: Dict[str, Dict[str, str]] = {}  # key → opción plegada → original
+        self._eye: Dict[str, Optional[str]] = {}
+        self._label_words: Dict[str, Set[str]] = {}
+        self._snap_index: Dict[str, NgramTfidfIndex] = {}
+        # Trie de palabras: {"accidente": {"de": {"trabajo": {"$": [(key, opción)]}}}}
+        self._trie: Dict = {}
+
+        for f in fields:
+            options = [o for o in (f.get("options") or []) if o and o.strip()]
+            key = f.get("unique_key") or ""
+            if not key or not options or f.get("field_type") != "select":
+                continue
+
+            self._options[key] = options
+            self._folded[key] = {" ".join(_words(o)): o for o in options}
+            self._eye[key] = f.get("eye")
+            self._label_words[key] = set(label_keywords(f.get("label", "") or ""))
+
+            for option in options:
+                words = _words(option)
+                folded = " ".join(words)
+                if folded in _GENERIC_OPTIONS or sum(len(w) for w in words) < MIN_SPOKEN_OPTION_CHARS:
+                    continue
+                node = self._trie
+                for w in words:
+                    node = node.setdefault(w, {})
+                node.setdefault(_TERMINAL, []).append((key, option))
+
+    def __len__(self) -> int:
+        return len(self._options)
+
+    def options(self, key: str) -> Optional[List[str]]:
+        return self._options.get(key)
+
+    def snap(self, key: str, value: str) -> Optional[str]:
+        """
+        Ajusta `value` a una opción válida del select `key`.
+        Retorna el value tal cual si el campo no tiene opciones escaneadas,
+        la opción más cercana si supera SNAP_MIN_SCORE, o None (rechazar).
+        """
+        options = self._options.get(key)
+        if not options:
+            return value
+
+        folded_value = " ".join(_words(str(value)))
+        exact = self._folded[key].get(folded_value)
+        if exact is not None:
+            return exact
+
+        index = self._snap_index.get(key)
+        if index is None:
+            index = NgramTfidfIndex(options)
+            self._snap_index[key] = index
+        scores = index.score(str(value))
+        best = int(scores.argmax()) if scores.size else 0
+        if scores.size and float(scores[best]) >= SNAP_MIN_SCORE:
+            logger.info(f"[OptionIndex] '{value}' ajustado a '{options[best]}' ({key})")
+            return options[best]
+
+        logger.warning(f"[OptionIndex] '{value}' no es opción de '{key}', rechazado")
+        return None
+
+    def resolve(
+        self,
+        text: str,
+        exclude: Iterable[str] = (),
+        eye: Optional[str] = None,
+    ) -> List[Tuple[str, str]]:
+        """
+        Opciones mencionadas en el texto → [(unique_key, opción)].
+
+        Recorre el trie buscando la opción más larga en cada posición. Si la
+        opción pertenece a varios selects se desambigua por ojo actual y por
+        palabras del label presentes en el texto; si sigue ambigua, no se llena.
+        """
+        excluded = set(exclude)
+        words = _words(text)
+        text_words = set(words)
+        resolved: Dict[str, str] = {}
+
+        i = 0
+        while i < len(words):
+            node = self._trie
+            match: Optional[List[Tuple[str, str]]] = None
+            match_end = i
+            j = i
+            while j < len(words) and words[j] in node:
+                node = node[words[j]]
+                j += 1
+                if _TERMINAL in node:
+                    match, match_end = node[_TERMINAL], j
+
+            if not match:
+                i += 1
+                continue
+            i = match_end
+
+            candidates = [
+                (key, option) for key, option in match
+                if key not in excluded and key not in resolved
+            ]
+            if len(candidates) > 1 and eye:
+                same_eye = [c for c in candidates if self._eye.get(c[0]) in (eye, None)]
+                candidates = same_eye or candidates
+            if len(candidates) > 1:
+                by_label = [c for c in candidates if self._label_words[c[0]] & text_words]
+                candidates = by_label
+            if len(candidates) == 1:
+                key, option = candidates[0]
+                resolved[key] = option
+
+        return list(resolved.items())
+
+
+_CACHE: "OrderedDict[str, OptionIndex]" = OrderedDict()
+
+
+def get_option_index(fields: List[Dict]) -> OptionIndex:
+    """Índice de opciones cacheado por firma del formulario."""
+    signature = form_signature(fields)
+    cached = _CACHE.get(signature)
+    if cached is not None:
+        _CACHE.move_to_end(signature)
+        return cached
+
+    index = OptionIndex(fields)
+    _CACHE[signature] = index
+    if len(_CACHE) > OPTION_INDEX_CACHE_SIZE:
+        _CACHE.popitem(last=False)
+    logger.info(f"[OptionIndex] Índice construido: {len(index)} selects con opciones")
+    return index
@@ -14,6 +14,9 @@ from datetime import datetime
 from typing import List, Optional, Dict, Tuple
 
 from app.models import BiowelFieldIdentifier, PartialAutofillItem
+from app.section_registry import GeneratedSections, get_generated_sections
+from app.option_index import OptionIndex, get_option_index
+from app.relevance_model import get_relevance_classifier
 
 logger = logging.getLogger(__name__)
 
@@ -1556,6 +1559,103 @@ class ActiveFieldTracker:
         logger.debug("[ActiveField] Estado reiniciado")
 
 
+class TranscriptSpanTracker:
+    """
+    Registra los segmentos finales de la sesión como spans de caracteres
+    sobre la transcripción completa y cuáles ya fueron consumidos por las
+    capas deterministas (comandos, keywords, patrones anclados, reglas o
+    dictado al campo activo).
+
+    En end_stream solo los spans NO consumidos van al LLM: el texto que ya
+    llenó un campo por keyword no se vuelve a mandar, y la información
+    clínica dicha fuera de un campo activo no se pierde.
+    """
+
+    def __init__(self):
+        self.text: str = ""
+        self._spans: List[Tuple[int, int]] = []
+        self._consumed_by: List[Optional[str]] = []
+
+    def add_final(self, text: str) -> int:
+        """Agrega un segmento final y retorna su id de span."""
+        clean = text.strip()
+        start = len(self.text) + (1 if self.text else 0)
+        self.text = f"{self.text} {clean}" if self.text else clean
+        self._spans.append((start, len(self.text)))
+        self._consumed_by.append(None)
+        return len(self._spans) - 1
+
+    def add_missing_tail(self, full_text: str) -> Optional[int]:
+        """
+        Agrega como un span sin consumir la parte final de `full_text` que
+        nunca pasó por add_final.
+
+        Los finales que el STT entrega durante finish() (drenaje de Deepgram,
+        eventos pendientes del replay) llegan a la transcripción completa pero
+        no al callback, porque el consumidor ya fue cancelado.
+
+        Returns:
+            Id del span agregado, o None si no faltaba texto.
+        """
+        full = " ".join(full_text.split())
+        seen = " ".join(self.text.split())
+        if full.startswith(seen) and full[len(seen):len(seen) + 1] in ("", " "):
+            tail = full[len(seen):]
+        elif self._spans:
+            # Transcripciones que no coinciden carácter a carácter: anclar en el último span
+            last_start, last_end = self._spans[-1]
+            last = " ".join(self.text[last_start:last_end].split())
+            idx = full.rfind(last)
+            if idx < 0:
+                logger.warning("[Spans] Transcripción final no coincide con los spans registrados")
+                return None
+            tail = full[idx + len(last):]
+        else:
+            tail = full
+        if not tail.strip():
+            return None
+        logger.info(f"[Spans] Finales recibidos en finish(): '{tail.strip()[:80]}'")
+        return self.add_final(tail)
+
+    def consume(self, span_id: int, reason: str) -> None:
+        """Marca un span como consumido (reason: "command", "keyword", "anchored"...)."""
+        if 0 <= span_id < len(self._spans) and self._consumed_by[span_id] is None:
+            self._consumed_by[span_id] = reason
+
+    def unconsumed_spans(
+        self, lo: int = 0, hi: Optional[int] = None
+    ) -> List[Tuple[int, int]]:
+        """Spans no consumidos dentro de [lo, hi), recortados y fusionando los contiguos."""
+        hi = len(self.text) if hi is None else hi
+        merged: List[Tuple[int, int]] = []
+        for (start, end), reason in zip(self._spans, self._consumed_by):
+            if reason is not None:
+                continue
+            start, end = max(start, lo), min(end, hi)
+            if start >= end or not self.text[start:end].strip():
+                continue
+            if merged and start - merged[-1][1] <= 1:
+                merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+    def unconsumed_text(self, lo: int = 0, hi: Optional[int] = None) -> str:
+        """Texto de los spans no consumidos; huecos separados por ' ... '."""
+        return " ... ".join(self.text[s:e].strip() for s, e in self.unconsumed_spans(lo, hi))
+
+    def stats(self) -> Dict[str, int]:
+        consumed = sum(
+            e - s for (s, e), r in zip(self._spans, self._consumed_by) if r is not None
+        )
+        return {"spans": len(self._spans), "chars": len(self.text), "consumed_chars": consumed}
+
+    def reset(self) -> None:
+        self.text = ""
+        self._spans = []
+        self._consumed_by = []
+
+
 # ============================================
 # Patrones médicos oftalmológicos
 # ============================================
@@ -2012,10 +2112,14 @@ def is_clinically_relevant(text: str) -> bool:
     if re.search(r"\b\d{1,2}\s*(?:mmHg|mm)\b", text_stripped, re.IGNORECASE):
         return True
 
-    # Si tiene más de 5 palabras pero no matchea nada → ambiguo, dejar pasar
+    # Si tiene más de 5 palabras pero no matchea nada → ambiguo: lo decide el
+    # clasificador local (app/relevance_model.py). Sin modelo, dejar pasar
     # para que el LLM decida (el LLM tiene su propio filtro)
     if word_count >= 5:
-        return True
+        classifier = get_relevance_classifier()
+        if classifier is None:
+            return True
+        return classifier.is_relevant(text_stripped)
 
     # Por defecto, segmentos cortos sin keywords → no relevante
     return False
@@ -2155,6 +2259,10 @@ class RealtimeExtractor:
         self.current_section: Optional[str] = None
         self.biowel_fields: List[BiowelFieldIdentifier] = []
         self.already_filled: Dict[str, str] = {}
+        # Secciones generadas desde el escaneo (clasificador CAPA 2 dinámico)
+        self.generated_sections: Optional[GeneratedSections] = None
+        # Opciones de selects escaneados (resolución directa texto → opción)
+        self.option_index: Optional[OptionIndex] = None
         # Mapa dinámico generado a partir del escaneo del frontend
         # key: keyword variante (lowercase) -> value: data_testid
         self.dynamic_keyword_map: Dict[str, str] = {}
@@ -2192,6 +2300,18 @@ class RealtimeExtractor:
             self.sync_with_biowel_fields(fields)
         except Exception:
             logger.exception("Error generando dynamic keyword map desde Biowel fields")
+        try:
+            self.generated_sections = get_generated_sections(
+                fields, exclude_sections=SECTION_CLASSIFIERS.keys()
+            )
+        except Exception:
+            self.generated_sections = None
+            logger.exception("Error generando secciones desde Biowel fields")
+        try:
+            self.option_index = get_option_index(fields)
+        except Exception:
+            self.option_index = None
+            logger.exception("Error construyendo índice de opciones desde Biowel fields")
 
     def set_already_filled(self, filled: Dict[str, str]) -> None:
         """Recibe campos ya llenos para no repetirlos."""
@@ -2433,6 +2553,19 @@ class RealtimeExtractor:
                     confidence=0.85
                 ))
 
+        # 4. Opciones de select mencionadas literalmente (índice de opciones escaneadas)
+        if self.option_index:
+            taken = set(self.already_filled) | {item.unique_key for item in items}
+            for unique_key, option in self.option_index.resolve(
+                text_original, exclude=taken, eye=self.current_eye
+            ):
+                items.append(PartialAutofillItem(
+                    unique_key=unique_key,
+                    value=option,
+                    confidence=0.9
+                ))
+                logger.info(f"[Extractor-OPCIÓN] '{unique_key}' = '{option}'")
+
         if items:
             logger.info(
                 f"[Extractor] Segmento: '{text[:50]}...' → "
@@ -2550,6 +2683,16 @@ class RealtimeExtractor:
         Retorna el nombre de la sección si hay match, None si no.
         Ejecuta en <5ms (pure regex, sin LLM).
         """
+        match = self.classify_section_scored(text)
+        return match[0] if match else None
+
+    def classify_section_scored(self, text: str) -> Optional[Tuple[str, float]]:
+        """
+        Como classify_section pero retorna (sección, confianza).
+        Primero las secciones escritas a mano (SECTION_CLASSIFIERS, confianza
+        1.0), luego las generadas desde los labels del escaneo de Biowel
+        (confianza según score y margen frente a la segunda sección).
+        """
         text_stripped = text.strip()
         if not text_stripped:
             return None
@@ -2561,7 +2704,18 @@ class RealtimeExtractor:
                         f"[Classifier] Sección '{section_name}' "
                         f"detectada para '{text_stripped[:50]}'"
                     )
-                    return section_name
+                    return section_name, 1.0
+
+        # Secciones generadas desde los labels del escaneo
+        if self.generated_sections:
+            match = self.generated_sections.classifier.classify(text_stripped)
+            if match:
+                section_name, confidence = match
+                logger.debug(
+                    f"[Classifier] Sección generada '{section_name}' "
+                    f"(conf={confidence}) para '{text_stripped[:50]}'"
+                )
+                return match
 
         return None
 
@@ -0,0 +1,161 @@
+"""
+Clasificador local de relevancia clínica (sin LLM).
+
+is_clinically_relevant() resuelve con regex los casos claros (saludos,
+keywords clínicas, mediciones). Lo que queda ambiguo (≥5 palabras sin
+ningún patrón) antes pasaba siempre al LLM; ahora lo decide este modelo:
+
+- Features: n-gramas de caracteres (2-4) por palabra del texto plegado,
+  hasheados a un vector de tamaño fijo (crc32 mod n_features), L2.
+- Modelo: regresión logística entrenada con scripts/train_relevance_model.py
+  a partir de segmentos etiquetados exportados de logs de sesión.
+- Inferencia: una suma de pesos con NumPy (decenas de microsegundos).
+
+El modelo vive en app/data/relevance_model.json y se usa solo con
+settings.relevance_model_enabled. Apagado o sin archivo, el filtro se
+comporta como antes (deja pasar el caso ambiguo).
+"""
+
+import json
+import logging
+import math
+import re
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from app.config import get_settings
+from app.section_registry import fold_text
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = Path(__file__).parent / "data" / "relevance_model.json"
+
+DEFAULT_N_FEATURES = 1 << 14
+DEFAULT_NGRAM_SIZES = (2, 3, 4)
+
+_WORD_RE = re.compile(r"[a-z0-9ñ]+")
+
+
+@lru_cache(maxsize=65536)
+def _word_buckets(word: str, n_features: int, ngram_sizes: Sequence[int]) -> tuple:
+    """Buckets de los n-gramas de una palabra (el vocabulario dictado se repite mucho)."""
+    padded = f" {word} "
+    return tuple(
+        zlib.crc32(padded[i:i + n].encode("utf-8")) % n_features
+        for n in ngram_sizes
+        for i in range(len(padded) - n + 1)
+    )
+
+
+def hashed_features(
+    text: str,
+    n_features: int = DEFAULT_N_FEATURES,
+    ngram_sizes: Sequence[int] = DEFAULT_NGRAM_SIZES,
+) -> Dict[int, float]:
+    """
+    Vector disperso {índice: peso} de n-gramas de caracteres hasheados.
+    Compartido por el entrenamiento y la inferencia.
+    """
+    counts: Dict[int, float] = {}
+    ngram_sizes = tuple(ngram_sizes)
+    for word in _WORD_RE.findall(fold_text(text)):
+        for idx in _word_buckets(word, n_features, ngram_sizes):
+            counts[idx] = counts.get(idx, 0.0) + 1.0
+
+    if not counts:
+        return {}
+    # tf sublineal + normalización L2
+    weights = {idx: 1.0 + math.log(c) for idx, c in counts.items()}
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    return {idx: w / norm for idx, w in weights.items()}
+
+
+class RelevanceClassifier:
+    """Regresión logística sobre n-gramas hasheados."""
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        bias: float,
+        threshold: float = 0.5,
+        ngram_sizes: Sequence[int] = DEFAULT_NGRAM_SIZES,
+    ):
+        self.weights = weights.astype(np.float32)
+        self.bias = float(bias)
+        self.threshold = float(threshold)
+        self.ngram_sizes = tuple(ngram_sizes)
+        self.n_features = int(weights.shape[0])
+
+    @classmethod
+    def load(cls, path: Path = MODEL_PATH) -> "RelevanceClassifier":
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        weights = np.zeros(int(data["n_features"]), dtype=np.float32)
+        # Pesos guardados en forma dispersa: solo los buckets vistos en entrenamiento
+        weights[np.asarray(data["indices"], dtype=np.int64)] = np.asarray(
+            data["values"], dtype=np.float32
+        )
+        return cls(
+            weights,
+            bias=data["bias"],
+            threshold=data.get("threshold", 0.5),
+            ngram_sizes=data.get("ngram_sizes", DEFAULT_NGRAM_SIZES),
+        )
+
+    def save(self, path: Path = MODEL_PATH, metrics: Optional[Dict] = None) -> None:
+        nonzero = np.flatnonzero(self.weights)
+        data = {
+            "n_features": self.n_features,
+            "ngram_sizes": list(self.ngram_sizes),
+            "bias": round(self.bias, 6),
+            "threshold": self.threshold,
+            "indices": nonzero.tolist(),
+            "values": [round(float(v), 5) for v in self.weights[nonzero]],
+        }
+        if metrics:
+            data["metrics"] = metrics
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False)
+
+    def predict_proba(self, text: str) -> float:
+        """Probabilidad de que el segmento sea clínicamente relevante."""
+        features = hashed_features(text, self.n_features, self.ngram_sizes)
+        if not features:
+            return 0.0
+        idx = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+        val = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+        z = float(np.dot(self.weights[idx], val)) + self.bias
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def is_relevant(self, text: str) -> bool:
+        return self.predict_proba(text) >= self.threshold
+
+
+_classifier: Optional[RelevanceClassifier] = None
+_load_attempted = False
+
+
+def get_relevance_classifier() -> Optional[RelevanceClassifier]:
+    """Modelo cargado una vez por proceso; None si está desactivado o no hay archivo."""
+    global _classifier, _load_attempted
+    if not _load_attempted:
+        _load_attempted = True
+        if not get_settings().relevance_model_enabled:
+            logger.info("[Relevance] Modelo desactivado (RELEVANCE_MODEL_ENABLED), filtro solo por regex")
+        elif MODEL_PATH.exists():
+            try:
+                _classifier = RelevanceClassifier.load(MODEL_PATH)
+                logger.info(
+                    f"[Relevance] Modelo cargado ({len(np.flatnonzero(_classifier.weights))} pesos, "
+                    f"umbral {_classifier.threshold})"
+                )
+            except Exception:
+                logger.exception("[Relevance] No se pudo cargar el modelo, filtro solo por regex")
+        else:
+            logger.info("[Relevance] Sin modelo local, filtro solo por regex")
+    return _classifier
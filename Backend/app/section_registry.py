@@ -0,0 +1,292 @@
+"""
+Registro de secciones generado automáticamente (CAPA 2 + CAPA 3a).
+
+SECTION_FIELD_REGISTRY / SECTION_CLASSIFIERS solo tienen entradas escritas a
+mano para unas pocas secciones. Este módulo genera el resto a partir del
+atributo `section` de los BiowelFieldIdentifier que envía el scanner:
+
+- Lista de campos por sección (sin botones ni opciones de dropdown)
+- Reglas por tipo de campo (solo los tipos presentes)
+- Prompt compacto + presupuesto de max_tokens según nº de campos
+- Keywords de clasificación derivadas de los labels
+
+El resultado se cachea por firma del formulario: el mismo escaneo de Biowel
+no vuelve a generar prompts ni regex.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Máximo de formularios distintos en cache (un formulario = una firma)
+REGISTRY_CACHE_SIZE = 16
+
+# Presupuesto de tokens: base + por campo, con techo
+SECTION_BASE_TOKENS = 40
+SECTION_TOKENS_PER_FIELD = 30
+SECTION_MAX_TOKENS = 400
+
+# Opciones de select listadas en el prompt por campo
+SECTION_PROMPT_MAX_OPTIONS = 8
+
+# Campos que nunca deben ir a un mini-prompt (son clicks, no datos)
+_EXCLUDED_KEY_FRAGMENTS = ("button", "btn", "link", "load-previous", "dropdown-item", "tab-")
+_EXCLUDED_KEY_PREFIXES = ("select-option-", "select-default-")
+
+# Palabras de labels que no discriminan sección (aparecen en todas)
+_STOPWORDS = {
+    "de", "del", "la", "las", "el", "los", "en", "y", "o", "con", "por",
+    "para", "un", "una", "al", "se", "que", "sin", "su", "sus",
+}
+_GENERIC_LABEL_WORDS = {
+    "ojo", "ojos", "derecho", "izquierdo", "ambos", "normal", "normales",
+    "campo", "texto", "seleccionar", "seleccione", "opcion", "opciones",
+    "observacion", "observaciones", "justificacion", "hallazgo", "hallazgos",
+    "valor", "tipo", "otro", "otros", "otra", "otras", "fecha", "si", "no",
+}
+# Una keyword presente en más de N secciones se descarta (no discrimina)
+_MAX_KEYWORD_SECTIONS = 2
+
+_TYPE_RULES = {
+    "textarea": "- textarea/text: texto clínico limpio, sin la etiqueta del campo.",
+    "text": "- textarea/text: texto clínico limpio, sin la etiqueta del campo.",
+    "number": "- number: solo el número (ej: \"3\"). Si no hay número claro, no llenar.",
+    "checkbox": "- checkbox: \"true\" si lo afirma, \"false\" si lo niega; si no es claro, no llenar.",
+    "radio": "- radio: \"true\" solo si la frase elige claramente esa opción.",
+    "select": "- select: value EXACTAMENTE igual a una de las opciones listadas; si no hay coincidencia, no llenar.",
+}
+
+_SECTION_SYSTEM_PROMPT = (
+    "Eres un asistente médico oftalmológico.\n"
+    "Objetivo: mapear una frase dictada por voz a campos PERMITIDOS de la sección '{section}'.\n"
+    "Salida: SOLO JSON válido, sin texto extra.\n"
+    "Reglas críticas: NO inventes datos. NO inventes campos.\n"
+    "Si no hay evidencia suficiente, responde {\"mappings\": null}.\n"
+    "La transcripción puede tener errores fonéticos; interpreta intención clínica sin suponer."
+)
+
+_SECTION_USER_PROMPT = """CAMPOS PERMITIDOS (solo puedes usar estos field_name):
+{field_lines}
+
+FRASE DICTADA:
+"{segment}"
+
+REGLAS DURAS:
+1) SOLO usa field_name de la lista anterior (exacto).
+2) No inventes información clínica.
+3) Si no hay evidencia clara para llenar algún campo → {"mappings": null}.
+4) Campos con [OD]/[OI] solo si la frase menciona ese ojo (o ambos ojos).
+5) value SIN la etiqueta del campo ni conectores iniciales ("es", "tiene", "presenta", artículos).
+
+REGLAS POR TIPO:
+{type_rules}
+
+FORMATO DE SALIDA (solo JSON, sin markdown):
+{"mappings":[{"field_name":"<field_name_permitido>","value":"<valor>","confidence":0.0}]}
+o
+{"mappings": null}"""
+
+
+def fold_text(text: str) -> str:
+    """Minúsculas sin acentos: 'Córnea Clara' → 'cornea clara'."""
+    decomposed = unicodedata.normalize("NFD", text.lower())
+    return "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+
+
+def form_signature(fields: Iterable[Dict]) -> str:
+    """
+    Firma estable de un escaneo de Biowel.
+    Dos escaneos con los mismos campos (en cualquier orden) comparten firma.
+    """
+    parts = sorted(
+        json.dumps(
+            [
+                f.get("unique_key", ""),
+                f.get("field_type", ""),
+                f.get("section") or "",
+                f.get("eye") or "",
+                f.get("label", ""),
+                list(f.get("options") or []),
+            ],
+            ensure_ascii=False,
+        )
+        for f in fields
+    )
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _is_mappable_field(field: Dict) -> bool:
+    """Excluye botones, tabs y opciones genéricas de dropdown."""
+    key = field.get("unique_key", "") or ""
+    if not key or field.get("field_type") == "button":
+        return False
+    if key.startswith(_EXCLUDED_KEY_PREFIXES):
+        return False
+    return not any(frag in key for frag in _EXCLUDED_KEY_FRAGMENTS)
+
+
+def label_keywords(label: str) -> List[str]:
+    """Palabras discriminativas de un label (sin acentos, sin stopwords)."""
+    words = re.findall(r"[a-z0-9ñ]+", fold_text(label))
+    return [
+        w for w in words
+        if len(w) >= 4 and w not in _STOPWORDS and w not in _GENERIC_LABEL_WORDS
+    ]
+
+
+def _format_field_line(field: Dict) -> str:
+    line = f"- {field['key']} ({field['label']}) [{field['type']}]"
+    if field.get("eye"):
+        line += f" [{field['eye']}]"
+    if field.get("options"):
+        line += f" opciones: {', '.join(field['options'][:SECTION_PROMPT_MAX_OPTIONS])}"
+    return line
+
+
+def _build_section_entry(section: str, fields: List[Dict]) -> Dict:
+    """Construye una entrada con la misma forma que SECTION_FIELD_REGISTRY."""
+    types_present = []
+    for f in fields:
+        rule = _TYPE_RULES.get(f["type"])
+        if rule and rule not in types_present:
+            types_present.append(rule)
+
+    user_prompt = (
+        _SECTION_USER_PROMPT
+        .replace("{field_lines}", "\n".join(_format_field_line(f) for f in fields))
+        .replace("{type_rules}", "\n".join(types_present))
+    )
+
+    return {
+        "fields": fields,
+        "system_prompt": _SECTION_SYSTEM_PROMPT.replace("{section}", section),
+        "user_prompt_template": user_prompt,
+        "max_tokens": min(
+            SECTION_BASE_TOKENS + SECTION_TOKENS_PER_FIELD * len(fields),
+            SECTION_MAX_TOKENS,
+        ),
+        "generated": True,
+    }
+
+
+class SectionClassifier:
+    """
+    Clasificador de sección por keywords derivadas de labels.
+
+    Cada keyword pesa 1/df (df = nº de secciones donde aparece), de modo que
+    una palabra exclusiva de "cornea" pesa más que una compartida.
+    Retorna (sección, confianza) donde la confianza combina el score absoluto
+    y el margen frente a la segunda sección.
+    """
+
+    def __init__(self, section_keywords: Dict[str, List[str]]):
+        df: Dict[str, int] = {}
+        for kws in section_keywords.values():
+            for kw in set(kws):
+                df[kw] = df.get(kw, 0) + 1
+
+        self._weights: Dict[str, Dict[str, float]] = {}
+        self._patterns: Dict[str, re.Pattern] = {}
+        for section, kws in section_keywords.items():
+            weights = {
+                kw: 1.0 / df[kw] for kw in set(kws) if df[kw] <= _MAX_KEYWORD_SECTIONS
+            }
+            if not weights:
+                continue
+            self._weights[section] = weights
+            alternation = "|".join(
+                re.escape(kw) for kw in sorted(weights, key=len, reverse=True)
+            )
+            self._patterns[section] = re.compile(r"\b(?:" + alternation + r")\b")
+
+    @property
+    def sections(self) -> List[str]:
+        return list(self._patterns.keys())
+
+    def classify(self, text: str) -> Optional[Tuple[str, float]]:
+        folded = fold_text(text)
+        scores: List[Tuple[float, str]] = []
+        for section, pattern in self._patterns.items():
+            hits = set(pattern.findall(folded))
+            if hits:
+                weights = self._weights[section]
+                scores.append((sum(weights[h] for h in hits), section))
+
+        if not scores:
+            return None
+
+        scores.sort(reverse=True)
+        best_score, best_section = scores[0]
+        second_score = scores[1][0] if len(scores) > 1 else 0.0
+        confidence = min(1.0, best_score / 2.0) * (1.0 - second_score / best_score)
+        return best_section, round(confidence, 3)
+
+
+class GeneratedSections:
+    """Registro + clasificador generados para un formulario concreto."""
+
+    def __init__(self, signature: str, registry: Dict[str, Dict], classifier: SectionClassifier):
+        self.signature = signature
+        self.registry = registry
+        self.classifier = classifier
+
+
+_CACHE: "OrderedDict[str, GeneratedSections]" = OrderedDict()
+
+
+def get_generated_sections(
+    fields: List[Dict], exclude_sections: Iterable[str] = ()
+) -> GeneratedSections:
+    """
+    Genera (o recupera de cache) los mini-prompts y el clasificador para
+    las secciones del escaneo. Las secciones en `exclude_sections` (las
+    escritas a mano) no se generan.
+    """
+    excluded = set(exclude_sections)
+    signature = form_signature(fields) + ":" + ",".join(sorted(excluded))
+    cached = _CACHE.get(signature)
+    if cached is not None:
+        _CACHE.move_to_end(signature)
+        return cached
+
+    by_section: Dict[str, List[Dict]] = {}
+    section_keywords: Dict[str, List[str]] = {}
+    for f in fields:
+        section = f.get("section")
+        if not section or section in excluded or not _is_mappable_field(f):
+            continue
+        by_section.setdefault(section, []).append({
+            "key": f["unique_key"],
+            "label": f.get("label", "") or f["unique_key"],
+            "type": f.get("field_type", "text") or "text",
+            "eye": f.get("eye"),
+            "options": list(f.get("options") or []),
+        })
+        kws = section_keywords.setdefault(section, [])
+        kws.extend(label_keywords(f.get("label", "") or ""))
+
+    for section in by_section:
+        section_keywords[section].extend(label_keywords(section.replace("-", " ").replace("_", " ")))
+
+    registry = {
+        section: _build_section_entry(section, section_fields)
+        for section, section_fields in by_section.items()
+    }
+    generated = GeneratedSections(signature, registry, SectionClassifier(section_keywords))
+
+    _CACHE[signature] = generated
+    if len(_CACHE) > REGISTRY_CACHE_SIZE:
+        _CACHE.popitem(last=False)
+
+    logger.info(
+        f"[SectionRegistry] {len(registry)} secciones generadas "
+        f"({sum(len(e['fields']) for e in registry.values())} campos), "
+        f"clasificables: {len(generated.classifier.sections)}"
+    )
+    return generated
@@ -0,0 +1,199 @@
+"""
+Preprocesado de WAV PCM antes de subirlo al STT (stdlib + NumPy).
+
+Navegadores y grabadoras entregan WAV de 44.1/48 kHz estéreo: hasta 6x los
+bytes que Deepgram necesita para voz. Aquí el WAV se convierte a mono,
+16 kHz, PCM16 mientras se lee por bloques:
+
+- Downmix: promedio de canales.
+- Remuestreo racional L/M (16000/fs reducido) con un kernel sinc con
+  ventana de Blackman; el corte queda bajo el Nyquist de la tasa menor,
+  así que el mismo filtro es el anti-aliasing al bajar la tasa.
+- PCM16 con saturación.
+
+La salida es un WAV completo (cabecera con el tamaño exacto + datos) que se
+genera por bloques: la memoria no depende de la duración.
+"""
+
+import asyncio
+import struct
+import wave
+from math import gcd
+from typing import AsyncIterator, BinaryIO, Iterator, Optional
+
+import numpy as np
+
+TARGET_RATE = 16000
+TARGET_CHANNELS = 1
+TARGET_SAMPLE_WIDTH = 2
+
+# Cruces por cero del sinc a cada lado: más = transición más abrupta, más CPU
+SINC_ZERO_CROSSINGS = 16
+# Fracción del Nyquist destino donde empieza el corte (margen para la ventana)
+LOWPASS_ROLLOFF = 0.92
+# Frames de entrada leídos por bloque y salidas calculadas por operación
+READ_BLOCK_SECONDS = 2.0
+OUTPUT_BATCH = 16384
+
+
+def needs_preprocessing(channels: int, sample_width: int, frame_rate: int) -> bool:
+    """True si la conversión reduce los bytes (subir 8 kHz a 16 kHz no ayuda)."""
+    return channels * sample_width * frame_rate > TARGET_CHANNELS * TARGET_SAMPLE_WIDTH * TARGET_RATE
+
+
+def pcm_to_float(raw: bytes, sample_width: int, channels: int) -> np.ndarray:
+    """Frames PCM intercalados → señal mono float32 en [-1, 1]."""
+    if sample_width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        # 24 bits little-endian: se arma el int32 desplazando al byte alto
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = ((b[:, 0] << 8) | (b[:, 1] << 16) | (b[:, 2] << 24)).astype(np.float32) / 2**31
+    elif sample_width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2**31
+    else:
+        raise ValueError(f"Ancho de muestra no soportado: {sample_width} bytes")
+    n = len(samples) // channels
+    if channels == 1:
+        return samples[:n]
+    return samples[: n * channels].reshape(n, channels).mean(axis=1)
+
+
+def float_to_pcm16(samples: np.ndarray) -> bytes:
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+def wav_header(n_frames: int, rate: int = TARGET_RATE, channels: int = TARGET_CHANNELS,
+               sample_width: int = TARGET_SAMPLE_WIDTH) -> bytes:
+    """Cabecera RIFF/WAVE PCM de 44 bytes para n_frames conocidos de antemano."""
+    data_size = n_frames * channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, 1, channels, rate,
+        rate * channels * sample_width, channels * sample_width, sample_width * 8,
+        b"data", data_size,
+    )
+
+
+def resampled_length(n_frames: int, source_rate: int, target_rate: int = TARGET_RATE) -> int:
+    """Muestras de salida: instantes k/target_rate anteriores al fin del audio."""
+    g = gcd(source_rate, target_rate)
+    up, down = target_rate // g, source_rate // g
+    return (n_frames * up + down - 1) // down
+
+
+class StreamingResampler:
+    """
+    Remuestreo racional por bloques con sinc de ventana Blackman.
+
+    La salida k corresponde al instante k * M / L de la entrada; su valor es
+    la suma de las 2*half entradas vecinas ponderadas por el kernel de la fase
+    (k*M mod L). Los kernels por fase se precalculan una vez.
+    """
+
+    def __init__(self, source_rate: int, target_rate: int = TARGET_RATE):
+        g = gcd(source_rate, target_rate)
+        self.up = target_rate // g
+        self.down = source_rate // g
+        # Corte relativo a la tasa de entrada (ciclos/muestra)
+        cutoff = 0.5 * min(1.0, self.up / self.down) * LOWPASS_ROLLOFF
+        self.half = int(np.ceil(SINC_ZERO_CROSSINGS / (2 * cutoff)))
+
+        offsets = np.arange(-self.half + 1, self.half + 1)  # j: entrada n0 + j
+        phases = np.arange(self.up)[:, None] / self.up
+        distance = phases - offsets[None, :]  # posición de salida - entrada
+        x = np.pi * distance / self.half
+        window = 0.42 + 0.5 * np.cos(x) + 0.08 * np.cos(2 * x)
+        window[np.abs(distance) >= self.half] = 0.0
+        kernels = 2 * cutoff * np.sinc(2 * cutoff * distance) * window
+        self._kernels = kernels.astype(np.float32)
+        self._offsets = offsets
+
+        # Historial: la entrada global `_base` está en _buffer[0] (ceros antes del inicio)
+        self._buffer = np.zeros(self.half, dtype=np.float32)
+        self._base = -self.half
+        self._consumed = 0  # Muestras de entrada recibidas
+        self._next = 0  # Próxima salida a calcular
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Agrega entrada y retorna las salidas que ya tienen todo su contexto."""
+        self._buffer = np.concatenate([self._buffer, samples.astype(np.float32, copy=False)])
+        self._consumed += len(samples)
+        last_input = self._base + len(self._buffer) - 1
+        # Salidas k cuyo n0 + half <= last_input
+        limit = ((last_input - self.half + 1) * self.up + self.down - 1) // self.down
+        return self._emit(limit)
+
+    def flush(self) -> np.ndarray:
+        """Completa con ceros y retorna las salidas restantes."""
+        self._buffer = np.concatenate([self._buffer, np.zeros(self.half, dtype=np.float32)])
+        limit = (self._consumed * self.up + self.down - 1) // self.down
+        return self._emit(limit)
+
+    def _emit(self, limit: int) -> np.ndarray:
+        outputs = []
+        while self._next < limit:
+            ks = np.arange(self._next, min(limit, self._next + OUTPUT_BATCH), dtype=np.int64)
+            positions = ks * self.down
+            n0 = positions // self.up
+            phase = positions % self.up
+            idx = (n0 - self._base)[:, None] + self._offsets[None, :]
+            outputs.append(np.einsum("ij,ij->i", self._buffer[idx], self._kernels[phase]))
+            self._next = int(ks[-1]) + 1
+
+        # Descartar la entrada que ninguna salida futura necesita
+        keep_from = (self._next * self.down) // self.up - self.half + 1
+        drop = keep_from - self._base
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._base += drop
+        return np.concatenate(outputs) if outputs else np.zeros(0, dtype=np.float32)
+
+
+def convert_pcm(raw: bytes, sample_width: int, channels: int, frame_rate: int) -> bytes:
+    """Frames PCM en memoria (un chunk) → PCM16 mono 16 kHz."""
+    resampler = StreamingResampler(frame_rate)
+    samples = pcm_to_float(raw, sample_width, channels)
+    parts = []
+    step = int(frame_rate * READ_BLOCK_SECONDS)
+    for start in range(0, len(samples), step):
+        parts.append(resampler.process(samples[start:start + step]))
+    parts.append(resampler.flush())
+    return float_to_pcm16(np.concatenate(parts))
+
+
+def iter_preprocessed_wav(fileobj: BinaryIO) -> Iterator[bytes]:
+    """WAV PCM cualquiera → WAV PCM16 mono 16 kHz, por bloques (cabecera primero)."""
+    fileobj.seek(0)
+    with wave.open(fileobj, "rb") as wav:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        frame_rate = wav.getframerate()
+        n_frames = wav.getnframes()
+
+        yield wav_header(resampled_length(n_frames, frame_rate))
+
+        resampler = StreamingResampler(frame_rate)
+        block_frames = max(1, int(frame_rate * READ_BLOCK_SECONDS))
+        while True:
+            raw = wav.readframes(block_frames)
+            if not raw:
+                break
+            out = resampler.process(pcm_to_float(raw, sample_width, channels))
+            if len(out):
+                yield float_to_pcm16(out)
+        yield float_to_pcm16(resampler.flush())
+
+
+async def aiter_preprocessed_wav(fileobj: BinaryIO) -> AsyncIterator[bytes]:
+    """iter_preprocessed_wav() con la lectura y el cálculo fuera del event loop."""
+    blocks = iter_preprocessed_wav(fileobj)
+    while True:
+        block: Optional[bytes] = await asyncio.to_thread(next, blocks, None)
+        if block is None:
+            break
+        if block:
+            yield block
@@ -0,0 +1,208 @@
+"""
+Cola de trabajos batch (audio → transcript → campos) fuera del request HTTP.
+
+POST /api/biowel/audio/jobs guarda el upload en un archivo temporal, encola
+el trabajo y responde al instante con su job_id. Un pool acotado de workers
+(settings.batch_job_workers) ejecuta transcripción y mapeo; si la cola está
+llena el submit falla con JobQueueFullError (HTTP 503) en vez de aceptar
+más trabajo del que se puede atender.
+
+Estados: uploaded → transcribing → mapping → done | error. El cliente los
+consulta por polling (snapshot()) o se suscribe a los eventos (subscribe(),
+expuesto como server-sent events). Los trabajos terminados se conservan en
+memoria settings.batch_job_ttl_seconds y luego se descartan.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+JOB_UPLOADED = "uploaded"
+JOB_TRANSCRIBING = "transcribing"
+JOB_MAPPING = "mapping"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+TERMINAL_STATES = (JOB_DONE, JOB_ERROR)
+
+
+class JobQueueFullError(RuntimeError):
+    """La cola de trabajos batch alcanzó su capacidad."""
+
+
+@dataclass
+class BatchJob:
+    job_id: str
+    status: str = JOB_UPLOADED
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    audio_path: Optional[str] = None  # Upload temporal; se borra al terminar
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    error_status: Optional[int] = None  # Código HTTP equivalente al error
+    _listeners: List[asyncio.Queue] = field(default_factory=list, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+    def snapshot(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+            data["error_status"] = self.error_status
+        return data
+
+    def set_status(self, status: str) -> None:
+        """Cambia el estado y notifica a los suscriptores."""
+        self.status = status
+        self.updated_at = time.time()
+        event = self.snapshot()
+        for listener in self._listeners:
+            listener.put_nowait(event)
+
+
+# Trabajo a ejecutar: recibe el job (para reportar progreso) y retorna el resultado
+JobRunner = Callable[[BatchJob], Awaitable[Dict[str, Any]]]
+
+
+class BatchJobQueue:
+    """Cola acotada + pool fijo de workers + registro de trabajos con TTL."""
+
+    def __init__(self, workers: int, max_queued: int, ttl_seconds: float):
+        self.workers = max(1, workers)
+        self.max_queued = max(1, max_queued)
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, BatchJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _ensure_workers(self) -> None:
+        # Arranque perezoso: necesita el event loop de la app
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queued)
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker(i)) for i in range(self.workers)
+            ]
+            logger.info(
+                f"[BatchJobs] {self.workers} workers iniciados "
+                f"(cola máx. {self.max_queued}, TTL {self.ttl_seconds:.0f}s)"
+            )
+
+    def submit(self, runner: JobRunner, audio_path: Optional[str] = None) -> BatchJob:
+        """Encola un trabajo. Lanza JobQueueFullError si no hay capacidad."""
+        self._ensure_workers()
+        self.purge_expired()
+
+        job = BatchJob(job_id=uuid.uuid4().hex, audio_path=audio_path)
+        try:
+            self._queue.put_nowait((job, runner))
+        except asyncio.QueueFull:
+            raise JobQueueFullError(
+                f"Cola de trabajos batch llena ({self.max_queued}). Reintenta en unos segundos."
+            )
+        self._jobs[job.job_id] = job
+        logger.info(f"[BatchJobs] Job {job.job_id} encolado ({self._queue.qsize()} en cola)")
+        return job
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        self.purge_expired()
+        return self._jobs.get(job_id)
+
+    async def subscribe(self, job: BatchJob) -> AsyncIterator[Dict[str, Any]]:
+        """Estado actual y luego cada cambio, hasta un estado terminal."""
+        listener: asyncio.Queue = asyncio.Queue()
+        job._listeners.append(listener)
+        try:
+            event = job.snapshot()
+            yield event
+            while event["status"] not in TERMINAL_STATES:
+                event = await listener.get()
+                yield event
+        finally:
+            job._listeners.remove(listener)
+
+    def purge_expired(self) -> None:
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.updated_at > self.ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if expired:
+            logger.info(f"[BatchJobs] {len(expired)} trabajos expirados descartados")
+
+    def stats(self) -> Dict[str, Any]:
+        by_status: Dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queued": self.max_queued,
+            "jobs": by_status,
+        }
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            job, runner = await self._queue.get()
+            started = time.perf_counter()
+            try:
+                job.result = await runner(job)
+                job.set_status(JOB_DONE)
+                logger.info(
+                    f"[BatchJobs] Job {job.job_id} listo en "
+                    f"{time.perf_counter() - started:.1f}s (worker {worker_id})"
+                )
+            except Exception as e:
+                # HTTPException trae detail/status_code; el resto es error interno
+                job.error = getattr(e, "detail", None) or str(e) or e.__class__.__name__
+                job.error_status = getattr(e, "status_code", 500)
+                job.set_status(JOB_ERROR)
+                logger.error(f"[BatchJobs] Job {job.job_id} falló: {job.error}")
+            finally:
+                if job.audio_path:
+                    try:
+                        os.unlink(job.audio_path)
+                    except OSError:
+                        pass
+                    job.audio_path = None
+                self._queue.task_done()
+
+    async def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+_job_queue: Optional[BatchJobQueue] = None
+
+
+def get_job_queue() -> BatchJobQueue:
+    """Cola de trabajos del proceso."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = BatchJobQueue(
+            workers=settings.batch_job_workers,
+            max_queued=settings.batch_job_queue_size,
+            ttl_seconds=settings.batch_job_ttl_seconds,
+        )
+    return _job_queue
@@ -15,9 +15,12 @@ Reglas:
 7) Si no hay match claro, no llenar
 """
 
+import hashlib
+import json
 import re
 import logging
-from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 from app.realtime_extractor import (
     KEYWORD_TO_FIELD,
@@ -121,6 +124,230 @@ for kw, testid in KEYWORD_TO_FIELD.items():
     ):
         _BUTTON_KEYWORDS[kw.lower()] = testid
 
+# Delimitadores de corte de sección: solo keywords de acción (guardar, etc.)
+_DELIMITER_KEYWORDS: List[str] = sorted(
+    (kw for kw, tid in _BUTTON_KEYWORDS.items() if "save" in tid or "guardar" in kw),
+    key=len,
+    reverse=True,
+)
+
+
+# ============================================
+# Índice de keywords: todas las categorías en un solo recorrido
+# Aho-Corasick sobre palabras (no caracteres): un keyword solo matchea
+# palabras completas ("ojo" no matchea dentro de "rojo") y cada hit trae su
+# offset, para verificar la negación en su contexto.
+# ============================================
+_WORD_RE = re.compile(r"\w+")
+_NEGATION_BEFORE_RE = re.compile(r"\bno\s+$")
+_NEGATION_LOOKBEHIND_CHARS = 16
+
+
+class KeywordHit(NamedTuple):
+    start: int
+    end: int
+    category: str
+    keyword: str
+    testid: str
+
+
+class KeywordIndex:
+    """Autómata Aho-Corasick sobre palabras de varios diccionarios keyword → testid."""
+
+    def __init__(self, keyword_maps: Dict[str, Dict[str, str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Por estado: (palabras del keyword, categoría, keyword, testid)
+        self._out: List[List[Tuple[int, str, str, str]]] = [[]]
+
+        for category, keywords in keyword_maps.items():
+            for kw, testid in keywords.items():
+                words = _WORD_RE.findall(kw)
+                if not words:
+                    continue
+                state = 0
+                for word in words:
+                    nxt = self._goto[state].get(word)
+                    if nxt is None:
+                        nxt = len(self._goto)
+                        self._goto[state][word] = nxt
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._out.append([])
+                    state = nxt
+                self._out[state].append((len(words), category, kw, testid))
+
+        # Enlaces de fallo por BFS (los de profundidad 1 apuntan a la raíz);
+        # cada estado hereda las salidas de su sufijo más largo
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(word, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str) -> List[KeywordHit]:
+        """
+        Todos los keywords presentes en `text` (ya en minúsculas), en orden de
+        aparición. Un keyword de varias palabras solo matchea como frase
+        contigua: puntuación entre dos palabras ("dilatación. no") reinicia
+        el autómata.
+        """
+        hits: List[KeywordHit] = []
+        starts: List[int] = []
+        state = 0
+        prev_end = 0
+        for match in _WORD_RE.finditer(text):
+            word = match.group()
+            gap = text[prev_end:match.start()]
+            if gap and not gap.isspace():
+                state = 0
+            prev_end = match.end()
+            starts.append(match.start())
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+            for n_words, category, kw, testid in self._out[state]:
+                hits.append(KeywordHit(starts[-n_words], match.end(), category, kw, testid))
+        return hits
+
+
+def _word_runs(text: str) -> List[List[str]]:
+    """
+    Palabras de `text` agrupadas en tramos sin puntuación entre medio: el
+    mismo corte que KeywordIndex.find_all ("miopía. degenerativa" son dos tramos).
+    """
+    runs: List[List[str]] = []
+    prev_end = None
+    for match in _WORD_RE.finditer(text):
+        gap = text[prev_end:match.start()] if prev_end is not None else ""
+        if prev_end is None or (gap and not gap.isspace()):
+            runs.append([])
+        runs[-1].append(match.group())
+        prev_end = match.end()
+    return runs
+
+
+def _is_negated(text: str, start: int) -> bool:
+    """True si el keyword en `start` va precedido de "no " ("no alergias")."""
+    window = text[max(0, start - _NEGATION_LOOKBEHIND_CHARS):start]
+    return bool(_NEGATION_BEFORE_RE.search(window))
+
+
+# Orden del paso 2: la primera categoría (y dentro, el keyword más largo) que
+# reclama un testid gana
+_KEYWORD_CATEGORIES: Dict[str, Dict[str, str]] = {
+    "uncheck": _UNCHECK_KEYWORDS,
+    "checkbox": _CHECKBOX_KEYWORDS,
+    "radio": _RADIO_KEYWORDS,
+    "select": _SELECT_KEYWORDS,
+    "button": _BUTTON_KEYWORDS,
+}
+_KEYWORD_RANK: Dict[str, Dict[str, int]] = {
+    category: {kw: rank for rank, kw in enumerate(sorted(keywords, key=len, reverse=True))}
+    for category, keywords in _KEYWORD_CATEGORIES.items()
+}
+KEYWORD_INDEX = KeywordIndex(_KEYWORD_CATEGORIES)
+
+
+# ============================================
+# Índice de labels de select-option-* (paso 2f)
+# ============================================
+SELECT_OPTION_INDEX_CACHE_SIZE = 16
+# Fragmentos iniciales más cortos que esto (caracteres) no identifican una opción
+MIN_OPTION_FRAGMENT_CHARS = 8
+
+
+class SelectOptionIndex:
+    """
+    Labels de los select-option-* de un escaneo, indexados por n-gramas de
+    palabras: cada n-grama de un label sabe en cuántos labels distintos
+    aparece, así la unicidad de un fragmento es una consulta y no un
+    recorrido de todos los demás labels. El transcript se recorre una vez
+    por n-gramas de hasta `max_words` palabras.
+    """
+
+    def __init__(self, fields: List[Dict]):
+        self._order: Dict[str, int] = {}  # testid → posición en fields
+        self._full: Dict[Tuple[str, ...], List[str]] = {}  # label completo → testids
+        self._prefixes: Dict[Tuple[str, ...], List[str]] = {}  # fragmento inicial → testids
+        self.max_words = 0
+
+        labels: Dict[str, Tuple[str, ...]] = {}
+        for f in fields:
+            testid = f.get("data_testid", "")
+            if not testid.startswith("select-option-"):
+                continue
+            label = (f.get("label") or "").strip().lower()
+            words = tuple(_WORD_RE.findall(label))
+            if len(label) >= 3 and words:
+                labels[testid] = words
+                self._order.setdefault(testid, len(self._order))
+
+        label_count: Dict[Tuple[str, ...], int] = {}
+        for words in labels.values():
+            grams = {
+                words[i:j] for i in range(len(words)) for j in range(i + 2, len(words) + 1)
+            }
+            for gram in grams:
+                label_count[gram] = label_count.get(gram, 0) + 1
+
+        for testid, words in labels.items():
+            self._full.setdefault(words, []).append(testid)
+            self.max_words = max(self.max_words, len(words))
+            for n in range(len(words) - 1, 1, -1):
+                prefix = words[:n]
+                if len(" ".join(prefix)) >= MIN_OPTION_FRAGMENT_CHARS and label_count.get(prefix) == 1:
+                    self._prefixes.setdefault(prefix, []).append(testid)
+
+    def match(self, text_lower: str) -> List[Tuple[str, str]]:
+        """
+        [(testid, fragmento)] de las opciones mencionadas, en el orden de
+        fields. Los n-gramas no cruzan puntuación (ver _word_runs).
+        """
+        found: Dict[str, str] = {}
+        partial: Dict[str, Tuple[str, ...]] = {}
+        for words in _word_runs(text_lower):
+            for i in range(len(words)):
+                for n in range(1, min(self.max_words, len(words) - i) + 1):
+                    gram = tuple(words[i:i + n])
+                    for testid in self._full.get(gram, ()):
+                        found[testid] = " ".join(gram)
+                    for testid in self._prefixes.get(gram, ()):
+                        # El fragmento más largo es el más informativo para el log
+                        if len(gram) > len(partial.get(testid, ())):
+                            partial[testid] = gram
+        for testid, gram in partial.items():
+            found.setdefault(testid, " ".join(gram))
+        return sorted(found.items(), key=lambda item: self._order[item[0]])
+
+
+_SELECT_OPTION_CACHE: "OrderedDict[str, SelectOptionIndex]" = OrderedDict()
+
+
+def get_select_option_index(fields: List[Dict]) -> SelectOptionIndex:
+    """Índice de labels de select-option-* cacheado por firma de esas opciones."""
+    options = sorted(
+        (f.get("data_testid", ""), f.get("label") or "")
+        for f in fields
+        if f.get("data_testid", "").startswith("select-option-")
+    )
+    signature = hashlib.sha1(json.dumps(options, ensure_ascii=False).encode("utf-8")).hexdigest()
+    cached = _SELECT_OPTION_CACHE.get(signature)
+    if cached is not None:
+        _SELECT_OPTION_CACHE.move_to_end(signature)
+        return cached
+
+    index = SelectOptionIndex(fields)
+    _SELECT_OPTION_CACHE[signature] = index
+    if len(_SELECT_OPTION_CACHE) > SELECT_OPTION_INDEX_CACHE_SIZE:
+        _SELECT_OPTION_CACHE.popitem(last=False)
+    return index
+
 
 def _build_field_index(fields: List[Dict]) -> Dict[str, Dict]:
     """Construye un índice rápido de campos por data_testid y unique_key."""
@@ -224,109 +451,73 @@ def map_transcript_to_fields(
 
     # =============================================
     # PASO 2: Checkbox / Radio / Select / Button por keywords
-    # Recorremos keywords ordenadas por longitud descendente
+    # Un solo recorrido del transcript (KEYWORD_INDEX); luego cada categoría
+    # procesa sus keywords encontradas por longitud descendente
     # =============================================
+    hits_by_category: Dict[str, Dict[str, List[KeywordHit]]] = {c: {} for c in _KEYWORD_CATEGORIES}
+    for hit in KEYWORD_INDEX.find_all(text_lower):
+        hits_by_category[hit.category].setdefault(hit.keyword, []).append(hit)
+
+    def _matched(category: str) -> List[Tuple[str, str, List[KeywordHit]]]:
+        found = hits_by_category[category]
+        rank = _KEYWORD_RANK[category]
+        return [
+            (kw, _KEYWORD_CATEGORIES[category][kw], found[kw])
+            for kw in sorted(found, key=rank.__getitem__)
+        ]
+
+    def _claimable(testid: str) -> bool:
+        return (
+            _field_exists(testid, field_index)
+            and testid not in filled
+            and not _is_already_filled(testid, already_filled)
+        )
 
     # 2a: Uncheck keywords (negación de checkbox)
-    for kw in sorted(_UNCHECK_KEYWORDS.keys(), key=len, reverse=True):
-        if kw in text_lower:
-            testid = _UNCHECK_KEYWORDS[kw]
-            if _field_exists(testid, field_index) and testid not in filled:
-                if not _is_already_filled(testid, already_filled):
-                    filled[testid] = "false"
-                    logger.debug(f"[BatchMapper] Uncheck: '{kw}' → '{testid}' = false")
-
-    # 2b: Checkbox keywords (activar)
-    for kw in sorted(_CHECKBOX_KEYWORDS.keys(), key=len, reverse=True):
-        if kw in text_lower:
-            testid = _CHECKBOX_KEYWORDS[kw]
-            if _field_exists(testid, field_index) and testid not in filled:
-                if not _is_already_filled(testid, already_filled):
-                    # Verificar que no haya negación cercana
-                    neg_pattern = re.compile(
-                        r"\bno\s+" + re.escape(kw) + r"\b", re.IGNORECASE
-                    )
-                    if neg_pattern.search(transcript):
-                        filled[testid] = "false"
-                    else:
-                        filled[testid] = "true"
-                    logger.debug(f"[BatchMapper] Checkbox: '{kw}' → '{testid}' = {filled[testid]}")
+    for kw, testid, _ in _matched("uncheck"):
+        if _claimable(testid):
+            filled[testid] = "false"
+            logger.debug(f"[BatchMapper] Uncheck: '{kw}' → '{testid}' = false")
+
+    # 2b: Checkbox keywords (activar, salvo "no <keyword>" en alguna mención)
+    for kw, testid, hits in _matched("checkbox"):
+        if _claimable(testid):
+            negated = any(_is_negated(text_lower, hit.start) for hit in hits)
+            filled[testid] = "false" if negated else "true"
+            logger.debug(f"[BatchMapper] Checkbox: '{kw}' → '{testid}' = {filled[testid]}")
 
     # 2c: Radio keywords
-    for kw in sorted(_RADIO_KEYWORDS.keys(), key=len, reverse=True):
-        if kw in text_lower:
-            testid = _RADIO_KEYWORDS[kw]
-            if _field_exists(testid, field_index) and testid not in filled:
-                if not _is_already_filled(testid, already_filled):
-                    filled[testid] = "true"
-                    logger.debug(f"[BatchMapper] Radio: '{kw}' → '{testid}' = true")
+    for kw, testid, _ in _matched("radio"):
+        if _claimable(testid):
+            filled[testid] = "true"
+            logger.debug(f"[BatchMapper] Radio: '{kw}' → '{testid}' = true")
 
     # 2d: Select keywords
-    for kw in sorted(_SELECT_KEYWORDS.keys(), key=len, reverse=True):
-        if kw in text_lower:
-            testid = _SELECT_KEYWORDS[kw]
-            if _field_exists(testid, field_index) and testid not in filled:
-                if not _is_already_filled(testid, already_filled):
-                    # Obtener valor real del select
-                    select_val = KEYWORD_TO_SELECT_VALUE.get(kw, kw)
-                    normalized = normalize_value(select_val, "select")
-                    filled[testid] = normalized
-                    logger.debug(f"[BatchMapper] Select: '{kw}' → '{testid}' = '{normalized}'")
+    for kw, testid, _ in _matched("select"):
+        if _claimable(testid):
+            # Obtener valor real del select
+            select_val = KEYWORD_TO_SELECT_VALUE.get(kw, kw)
+            normalized = normalize_value(select_val, "select")
+            filled[testid] = normalized
+            logger.debug(f"[BatchMapper] Select: '{kw}' → '{testid}' = '{normalized}'")
 
     # 2e: Button keywords (click directo)
-    for kw in sorted(_BUTTON_KEYWORDS.keys(), key=len, reverse=True):
-        if kw in text_lower:
-            testid = _BUTTON_KEYWORDS[kw]
-            if _field_exists(testid, field_index) and testid not in filled:
-                if not _is_already_filled(testid, already_filled):
-                    filled[testid] = "click"
-                    logger.debug(f"[BatchMapper] Button: '{kw}' → '{testid}' = click")
+    for kw, testid, _ in _matched("button"):
+        if _claimable(testid):
+            filled[testid] = "click"
+            logger.debug(f"[BatchMapper] Button: '{kw}' → '{testid}' = click")
 
     # 2f: Dynamic label-matching para select-option-* (genéricos reutilizables)
     # Los select-option-* cambian de significado según el dropdown abierto.
-    # En lugar de keywords hardcodeadas, matcheamos el label que envía el frontend.
-    # Recopilar todos los labels de select-option-* para verificar unicidad
-    so_labels = {}
-    for f in fields:
-        testid = f.get("data_testid", "")
-        if testid.startswith("select-option-"):
-            label = (f.get("label") or "").strip().lower()
-            if label and len(label) >= 3:
-                so_labels[testid] = label
-
-    for testid, label in so_labels.items():
-        if testid in filled:
-            continue
-        if _is_already_filled(testid, already_filled):
-            continue
-        # Match exacto del label completo
-        if label in text_lower:
-            filled[testid] = "click"
-            logger.debug(f"[BatchMapper] DynLabel: '{label}' → '{testid}' = click")
-            continue
-        # Match parcial: buscar fragmentos que sean ÚNICOS entre los labels
-        # (evita que "enfermedades del aparato" matchee todas las opciones)
-        words = label.split()
-        matched = False
-        for n in range(len(words), 1, -1):
-            fragment = " ".join(words[:n])
-            if len(fragment) < 8:
-                continue
-            if fragment not in text_lower:
-                continue
-            # Verificar que este fragmento es único (no matchea otros labels)
-            other_match = False
-            for other_tid, other_label in so_labels.items():
-                if other_tid != testid and fragment in other_label:
-                    other_match = True
-                    break
-            if not other_match:
-                filled[testid] = "click"
-                logger.debug(f"[BatchMapper] DynLabel(unique): '{fragment}' → '{testid}' = click")
-                matched = True
-                break
-        if matched:
+    # En lugar de keywords hardcodeadas, matcheamos el label que envía el frontend:
+    # label completo, o un fragmento inicial que ningún otro label contiene
+    # (evita que "enfermedades del aparato" matchee todas las opciones)
+    option_index = get_select_option_index(fields)
+    for testid, fragment in option_index.match(text_lower):
+        if testid in filled or _is_already_filled(testid, already_filled):
             continue
+        filled[testid] = "click"
+        logger.debug(f"[BatchMapper] DynLabel: '{fragment}' → '{testid}' = click")
 
     logger.info(f"[BatchMapper] Paso 2 (keywords): {len(filled)} campos total")
 
@@ -367,24 +558,15 @@ def map_transcript_to_fields(
     return final_filled
 
 
-def _extract_sections(
-    transcript: str,
-    field_index: Dict[str, Dict],
-    already_filled: Dict[str, str],
-    already_mapped: Dict[str, str],
-) -> Dict[str, str]:
-    """
-    Divide el transcript por anchors de sección y asigna el texto
-    entre anchors consecutivos al data-testid correspondiente.
+_BUTTON_DELIMITER = "__button_delimiter__"
 
-    Ejemplo:
-        "motivo de consulta visión borrosa enfermedad actual astigmatismo"
-        → {"attention-origin-reason-for-consulting-badge-field": "Visión borrosa",
-           "attention-origin-current-disease-badge-field": "Astigmatismo"}
-    """
-    if not transcript.strip():
-        return {}
 
+def _find_section_anchors(transcript: str) -> List[Tuple[int, int, str]]:
+    """
+    Posiciones (start, end, testid) de los anchors de sección en el
+    transcript, ordenadas y deduplicadas. Los delimitadores de acción
+    (guardar) aparecen con testid _BUTTON_DELIMITER.
+    """
     # Encontrar todas las posiciones de anchors en el transcript
     anchor_positions: List[Tuple[int, int, str]] = []  # (start, end, testid)
 
@@ -394,20 +576,16 @@ def _extract_sections(
 
     # Usar solo keywords de acción (guardar, etc.) como delimitadores de corte
     # para evitar que palabras genéricas (hallazgos, lesiones) corten el texto de secciones
-    _DELIMITER_KEYWORDS = {
-        kw: tid for kw, tid in _BUTTON_KEYWORDS.items()
-        if "save" in tid or "guardar" in kw
-    }
     text_lower = transcript.lower()
-    for kw in sorted(_DELIMITER_KEYWORDS.keys(), key=len, reverse=True):
+    for kw in _DELIMITER_KEYWORDS:
         idx = text_lower.find(kw)
         if idx >= 0:
             overlaps = any(s <= idx < e for s, e, _ in anchor_positions)
             if not overlaps:
-                anchor_positions.append((idx, idx + len(kw), "__button_delimiter__"))
+                anchor_positions.append((idx, idx + len(kw), _BUTTON_DELIMITER))
 
     if not anchor_positions:
-        return {}
+        return []
 
     # Ordenar por posición en el transcript
     anchor_positions.sort(key=lambda x: x[0])
@@ -429,16 +607,71 @@ def _extract_sections(
                     seen_testids.add(testid)
                 continue
 
-        if testid == "__button_delimiter__" or testid not in seen_testids:
+        if testid == _BUTTON_DELIMITER or testid not in seen_testids:
             deduped.append((start, end, testid))
-            if testid != "__button_delimiter__":
+            if testid != _BUTTON_DELIMITER:
                 seen_testids.add(testid)
 
+    return deduped
+
+
+def split_transcript_sections(transcript: str) -> List[Tuple[int, int, Optional[str]]]:
+    """
+    Divide el transcript en shards contiguos por anchors de sección (los
+    mismos que usa _extract_sections).
+
+    Returns:
+        Lista de (start, end, testid_anchor) que cubre todo el transcript.
+        El texto previo al primer anchor y el posterior a un delimitador de
+        acción tienen testid None. Cada shard incluye su frase de anchor.
+
+    Ejemplo:
+        "hola motivo de consulta visión borrosa plan control"
+        → [(0, 5, None),
+           (5, 39, "attention-origin-reason-for-consulting-badge-field"),
+           (39, 51, "analysis-and-plan-textarea")]
+    """
+    if not transcript.strip():
+        return []
+
+    shards: List[Tuple[int, int, Optional[str]]] = []
+    anchors = _find_section_anchors(transcript)
+    first_start = anchors[0][0] if anchors else len(transcript)
+    if transcript[:first_start].strip():
+        shards.append((0, first_start, None))
+
+    for i, (start, _end, testid) in enumerate(anchors):
+        next_start = anchors[i + 1][0] if i + 1 < len(anchors) else len(transcript)
+        if transcript[start:next_start].strip():
+            shards.append((start, next_start, None if testid == _BUTTON_DELIMITER else testid))
+
+    return shards
+
+
+def _extract_sections(
+    transcript: str,
+    field_index: Dict[str, Dict],
+    already_filled: Dict[str, str],
+    already_mapped: Dict[str, str],
+) -> Dict[str, str]:
+    """
+    Divide el transcript por anchors de sección y asigna el texto
+    entre anchors consecutivos al data-testid correspondiente.
+
+    Ejemplo:
+        "motivo de consulta visión borrosa enfermedad actual astigmatismo"
+        → {"attention-origin-reason-for-consulting-badge-field": "Visión borrosa",
+           "attention-origin-current-disease-badge-field": "Astigmatismo"}
+    """
+    if not transcript.strip():
+        return {}
+
+    deduped = _find_section_anchors(transcript)
     results: Dict[str, str] = {}
 
     for i, (start, end, testid) in enumerate(deduped):
         # Delimitadores de button solo sirven como puntos de corte, no generan contenido
-        if testid == "__button_delimiter__":
+        if testid == _BUTTON_DELIMITER:
             continue
 
         # El contenido va desde el fin del anchor hasta el inicio del siguiente anchor
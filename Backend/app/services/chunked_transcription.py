@@ -0,0 +1,266 @@
+"""
+Transcripción por chunks en paralelo para grabaciones WAV/PCM largas.
+
+Una consulta de 5+ minutos enviada como un solo request pre-recorded tarda
+lo proporcional a su duración y un fallo obliga a repetir todo. Aquí el
+WAV se corta en pausas (ventanas de baja energía) cerca de cada
+settings.batch_chunk_seconds, cada chunk lleva settings.batch_chunk_overlap_seconds
+de audio extra a cada lado, y los chunks se transcriben en paralelo
+(settings.batch_chunk_concurrency) con reintentos individuales.
+
+Costura: cada chunk es "dueño" del tramo entre sus dos cortes; de su
+transcripción solo se conservan las palabras cuyo punto medio (timestamp
+del proveedor + offset del chunk) cae en ese tramo. Así el audio solapado
+no duplica palabras y una palabra partida por el corte se recupera entera
+del chunk vecino. Con preprocess=True cada chunk se sube como PCM16 mono
+16 kHz (services/audio_preprocess.py).
+"""
+
+import asyncio
+import io
+import logging
+import threading
+import time
+import wave
+from dataclasses import dataclass
+from typing import Awaitable, BinaryIO, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import get_settings
+from app.services.audio_preprocess import TARGET_SAMPLE_WIDTH, convert_pcm, pcm_to_float, wav_header
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Resolución del perfil de energía y suavizado para detectar pausas
+ENERGY_WINDOW_SECONDS = 0.05
+PAUSE_SMOOTHING_WINDOWS = 6  # ~300 ms
+SUPPORTED_SAMPLE_WIDTHS = (1, 2, 3, 4)
+
+TimedWord = Tuple[str, float, float]  # (texto, inicio_s, fin_s)
+WordTranscriber = Callable[[bytes, str, str], Awaitable[List[TimedWord]]]
+
+
+@dataclass
+class WavLayout:
+    channels: int
+    sample_width: int
+    frame_rate: int
+    n_frames: int
+
+    @property
+    def duration(self) -> float:
+        return self.n_frames / self.frame_rate if self.frame_rate else 0.0
+
+
+@dataclass
+class AudioChunk:
+    index: int
+    keep_from: float  # Tramo propio del chunk (segundos absolutos)
+    keep_until: float
+    start: float  # Audio enviado, con solape (segundos absolutos)
+    end: float
+
+
+def probe_wav(fileobj: BinaryIO) -> Optional[WavLayout]:
+    """Formato del WAV PCM, o None si no es un WAV que se pueda analizar."""
+    fileobj.seek(0)
+    try:
+        with wave.open(fileobj, "rb") as wav:
+            layout = WavLayout(
+                channels=wav.getnchannels(),
+                sample_width=wav.getsampwidth(),
+                frame_rate=wav.getframerate(),
+                n_frames=wav.getnframes(),
+            )
+    except (wave.Error, EOFError):
+        return None
+    finally:
+        fileobj.seek(0)
+    if layout.sample_width not in SUPPORTED_SAMPLE_WIDTHS or not layout.frame_rate:
+        return None
+    return layout
+
+
+def energy_profile(fileobj: BinaryIO, layout: WavLayout) -> np.ndarray:
+    """RMS por ventana de ENERGY_WINDOW_SECONDS (mono), leyendo por bloques."""
+    window_frames = max(1, int(layout.frame_rate * ENERGY_WINDOW_SECONDS))
+    block_windows = 200  # ~10 s de audio por lectura
+    rms: List[np.ndarray] = []
+
+    fileobj.seek(0)
+    with wave.open(fileobj, "rb") as wav:
+        while True:
+            raw = wav.readframes(window_frames * block_windows)
+            if not raw:
+                break
+            frames = pcm_to_float(raw, layout.sample_width, layout.channels)
+            n_windows = len(frames) // window_frames
+            if n_windows:
+                windows = frames[: n_windows * window_frames].reshape(n_windows, window_frames)
+                rms.append(np.sqrt(np.mean(windows ** 2, axis=1)))
+    fileobj.seek(0)
+    return np.concatenate(rms) if rms else np.zeros(0, dtype=np.float32)
+
+
+def plan_chunks(
+    energy: np.ndarray,
+    duration: float,
+    target_seconds: float,
+    overlap_seconds: float,
+    search_seconds: float,
+) -> List[AudioChunk]:
+    """Cortes en la pausa más silenciosa a ±search_seconds de cada objetivo."""
+    if len(energy) >= PAUSE_SMOOTHING_WINDOWS:
+        kernel = np.ones(PAUSE_SMOOTHING_WINDOWS) / PAUSE_SMOOTHING_WINDOWS
+        smoothed = np.convolve(energy, kernel, mode="same")
+    else:
+        smoothed = energy
+
+    cuts: List[float] = []
+    position = 0.0
+    # El último chunk absorbe el resto si es menor a medio chunk
+    while duration - position > target_seconds * 1.5:
+        lo = max(position + target_seconds / 2, position + target_seconds - search_seconds)
+        hi = min(duration, position + target_seconds + search_seconds)
+        lo_w = int(lo / ENERGY_WINDOW_SECONDS)
+        hi_w = min(len(smoothed), int(hi / ENERGY_WINDOW_SECONDS))
+        if hi_w > lo_w:
+            cut = (lo_w + int(np.argmin(smoothed[lo_w:hi_w])) + 0.5) * ENERGY_WINDOW_SECONDS
+        else:
+            cut = position + target_seconds
+        cuts.append(cut)
+        position = cut
+
+    bounds = [0.0] + cuts + [duration]
+    return [
+        AudioChunk(
+            index=i,
+            keep_from=bounds[i],
+            keep_until=bounds[i + 1],
+            start=max(0.0, bounds[i] - overlap_seconds),
+            end=min(duration, bounds[i + 1] + overlap_seconds),
+        )
+        for i in range(len(bounds) - 1)
+    ]
+
+
+def read_chunk_wav(
+    fileobj: BinaryIO, layout: WavLayout, chunk: AudioChunk, preprocess: bool = False
+) -> bytes:
+    """
+    WAV independiente con el audio [start, end) del chunk: en el formato
+    original, o en PCM16 mono 16 kHz si preprocess.
+    """
+    first = int(chunk.start * layout.frame_rate)
+    count = int(chunk.end * layout.frame_rate) - first
+    fileobj.seek(0)
+    with wave.open(fileobj, "rb") as wav:
+        wav.setpos(first)
+        frames = wav.readframes(count)
+    fileobj.seek(0)
+
+    if preprocess:
+        pcm16 = convert_pcm(frames, layout.sample_width, layout.channels, layout.frame_rate)
+        return wav_header(len(pcm16) // TARGET_SAMPLE_WIDTH) + pcm16
+
+    out = io.BytesIO()
+    with wave.open(out, "wb") as chunk_wav:
+        chunk_wav.setnchannels(layout.channels)
+        chunk_wav.setsampwidth(layout.sample_width)
+        chunk_wav.setframerate(layout.frame_rate)
+        chunk_wav.writeframes(frames)
+    return out.getvalue()
+
+
+def stitch_words(chunks: List[AudioChunk], chunk_words: List[List[TimedWord]]) -> str:
+    """Une los chunks conservando de cada uno solo las palabras de su tramo."""
+    last = len(chunks) - 1
+    kept: List[Tuple[float, str]] = []
+    for chunk, words in zip(chunks, chunk_words):
+        for text, start, end in words:
+            midpoint = chunk.start + (start + end) / 2
+            if chunk.keep_from <= midpoint and (midpoint < chunk.keep_until or chunk.index == last):
+                kept.append((midpoint, text))
+    kept.sort(key=lambda item: item[0])
+    return " ".join(text for _, text in kept if text).strip()
+
+
+def should_chunk(layout: Optional[WavLayout]) -> bool:
+    return bool(
+        settings.batch_chunked_enabled
+        and layout is not None
+        and layout.duration > settings.batch_chunk_seconds * 1.5
+    )
+
+
+async def transcribe_wav_chunked(
+    fileobj: BinaryIO,
+    layout: WavLayout,
+    transcribe_words: WordTranscriber,
+    language: str = "es",
+    preprocess: bool = False,
+) -> str:
+    """
+    Transcribe un WAV largo por chunks en paralelo y devuelve el texto cosido.
+
+    Raises:
+        RuntimeError: Si un chunk sigue fallando tras settings.batch_chunk_retries.
+    """
+    started = time.perf_counter()
+    energy = await asyncio.to_thread(energy_profile, fileobj, layout)
+    chunks = plan_chunks(
+        energy,
+        layout.duration,
+        target_seconds=settings.batch_chunk_seconds,
+        overlap_seconds=settings.batch_chunk_overlap_seconds,
+        search_seconds=settings.batch_chunk_search_seconds,
+    )
+    logger.info(
+        f"[Batch-Chunks] {layout.duration:.0f}s de audio en {len(chunks)} chunks "
+        f"(cortes: {[round(c.keep_until, 1) for c in chunks[:-1]]})"
+    )
+
+    semaphore = asyncio.Semaphore(max(1, settings.batch_chunk_concurrency))
+    # Un solo lector a la vez: los chunks comparten el archivo (seek + read)
+    read_lock = threading.Lock()
+
+    def read_chunk(chunk: AudioChunk) -> bytes:
+        with read_lock:
+            return read_chunk_wav(fileobj, layout, chunk, preprocess=preprocess)
+
+    async def run_chunk(chunk: AudioChunk) -> List[TimedWord]:
+        async with semaphore:
+            audio = await asyncio.to_thread(read_chunk, chunk)
+            for attempt in range(settings.batch_chunk_retries + 1):
+                try:
+                    return await transcribe_words(audio, "audio/wav", language)
+                except RuntimeError as e:
+                    if attempt >= settings.batch_chunk_retries:
+                        raise RuntimeError(
+                            f"Chunk {chunk.index + 1}/{len(chunks)} "
+                            f"({chunk.start:.0f}-{chunk.end:.0f}s) falló: {e}"
+                        )
+                    delay = settings.batch_chunk_retry_backoff_seconds * (2 ** attempt)
+                    logger.warning(
+                        f"[Batch-Chunks] Chunk {chunk.index + 1} falló ({e}), "
+                        f"reintento {attempt + 1} en {delay:.1f}s"
+                    )
+                    await asyncio.sleep(delay)
+            return []
+
+    tasks = [asyncio.create_task(run_chunk(chunk)) for chunk in chunks]
+    try:
+        chunk_words = await asyncio.gather(*tasks)
+    except BaseException:
+        # Un chunk agotó sus reintentos: no seguir gastando en los demás
+        for task in tasks:
+            task.cancel()
+        raise
+    transcript = stitch_words(chunks, list(chunk_words))
+    logger.info(
+        f"[Batch-Chunks] Transcript cosido: {len(transcript)} chars en "
+        f"{time.perf_counter() - started:.1f}s"
+    )
+    return transcript
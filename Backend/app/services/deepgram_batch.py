@@ -3,12 +3,15 @@ Transcripción batch (pre-recorded) con Deepgram REST API.
 
 Recibe bytes de audio + mimetype y retorna el transcript completo.
 Usa la API pre-recorded de Deepgram (NO WebSocket).
+transcribe_audio_stream() envía el archivo como body chunked mientras se lee
+(uploads largos sin cargarlos enteros en memoria). transcribe_words() retorna
+palabras con timestamps para la transcripción por chunks en paralelo.
 
 DEEPGRAM_API_KEY se lee desde app.config (variable de entorno DEEPGRAM_API_KEY en .env).
 """
 
 import logging
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, List, Tuple, Union
 
 import httpx
 
@@ -38,6 +41,29 @@ MIME_NORMALIZE = {
 }
 
 
+class UploadTooLargeError(ValueError):
+    """El audio supera el límite de tamaño mientras se transmite."""
+
+
+def normalize_mimetype(mimetype: str) -> str:
+    """
+    Normaliza y valida el mimetype para Deepgram.
+
+    Raises:
+        ValueError: Si el formato no es soportado.
+    """
+    mime_clean = mimetype.lower().split(";")[0].strip()
+    # Normalizar video/* → audio/* (ej: .m4a reportado como video/mp4)
+    mime_clean = MIME_NORMALIZE.get(mime_clean, mime_clean)
+    if mime_clean not in SUPPORTED_MIMETYPES:
+        raise ValueError(
+            f"Formato de audio no soportado: '{mime_clean}'. "
+            f"Formatos aceptados: WAV, MP3, M4A, FLAC, OGG, WEBM. "
+            f"Recomendado: WAV PCM16 16kHz mono."
+        )
+    return mime_clean
+
+
 async def transcribe_audio(
     file_bytes: bytes,
     mimetype: str,
@@ -61,17 +87,77 @@ async def transcribe_audio(
     if not file_bytes:
         raise ValueError("El archivo de audio está vacío")
 
-    # Normalizar mimetype
-    mime_clean = mimetype.lower().split(";")[0].strip()
-    # Normalizar video/* → audio/* (ej: .m4a reportado como video/mp4)
-    mime_clean = MIME_NORMALIZE.get(mime_clean, mime_clean)
-    if mime_clean not in SUPPORTED_MIMETYPES:
-        raise ValueError(
-            f"Formato de audio no soportado: '{mime_clean}'. "
-            f"Formatos aceptados: WAV, MP3, M4A, FLAC, OGG, WEBM. "
-            f"Recomendado: WAV PCM16 16kHz mono."
-        )
+    mime_clean = normalize_mimetype(mimetype)
+    logger.info(
+        f"[Batch-DG] Transcribiendo audio: {len(file_bytes)} bytes, "
+        f"mime={mime_clean}, lang={language}, model={settings.deepgram_model}"
+    )
+    return await _post_prerecorded(file_bytes, mime_clean, language)
+
 
+async def transcribe_audio_stream(
+    chunks: AsyncIterator[bytes],
+    mimetype: str,
+    language: str = "es",
+) -> str:
+    """
+    Igual que transcribe_audio, pero el audio se envía como body chunked
+    a medida que se lee: la memoria por request no depende de la duración.
+
+    Args:
+        chunks: Iterador async de bloques del archivo. Puede lanzar
+            UploadTooLargeError a mitad de camino; se propaga tal cual.
+    """
+    mime_clean = normalize_mimetype(mimetype)
+    logger.info(
+        f"[Batch-DG] Transcribiendo audio en streaming: "
+        f"mime={mime_clean}, lang={language}, model={settings.deepgram_model}"
+    )
+    return await _post_prerecorded(chunks, mime_clean, language)
+
+
+async def transcribe_words(
+    file_bytes: bytes,
+    mimetype: str,
+    language: str = "es",
+) -> List[Tuple[str, float, float]]:
+    """
+    Palabras con timestamps de un audio (usado por la transcripción por chunks).
+
+    Returns:
+        Lista de (palabra con puntuación, inicio_s, fin_s) relativos al audio.
+    """
+    if not file_bytes:
+        raise ValueError("El archivo de audio está vacío")
+
+    data = await _request_prerecorded(file_bytes, normalize_mimetype(mimetype), language)
+    try:
+        words = data["results"]["channels"][0]["alternatives"][0].get("words", [])
+    except (KeyError, IndexError) as e:
+        logger.error(f"[Batch-DG] Respuesta inesperada de Deepgram: {e}")
+        raise RuntimeError("Respuesta inesperada de Deepgram al extraer palabras")
+    return [
+        (w.get("punctuated_word") or w.get("word", ""), float(w["start"]), float(w["end"]))
+        for w in words
+        if "start" in w and "end" in w
+    ]
+
+
+async def _post_prerecorded(
+    content: Union[bytes, AsyncIterator[bytes]],
+    mime_clean: str,
+    language: str,
+) -> str:
+    data = await _request_prerecorded(content, mime_clean, language)
+    return _extract_transcript(data)
+
+
+async def _request_prerecorded(
+    content: Union[bytes, AsyncIterator[bytes]],
+    mime_clean: str,
+    language: str,
+) -> Dict[str, Any]:
+    """POST a la API pre-recorded; retorna el JSON de respuesta."""
     api_key = settings.deepgram_api_key
     if not api_key:
         raise RuntimeError("DEEPGRAM_API_KEY no configurada. Revisa el archivo .env")
@@ -91,23 +177,19 @@ async def transcribe_audio(
         "Content-Type": mime_clean,
     }
 
-    logger.info(
-        f"[Batch-DG] Transcribiendo audio: {len(file_bytes)} bytes, "
-        f"mime={mime_clean}, lang={language}, model={settings.deepgram_model}"
-    )
-
     async with httpx.AsyncClient(timeout=600.0) as client:
         try:
             response = await client.post(
                 DEEPGRAM_PRERECORDED_URL,
                 params=params,
                 headers=headers,
-                content=file_bytes,
+                content=content,
             )
         except httpx.TimeoutException:
             raise RuntimeError("Timeout al conectar con Deepgram. Intenta con un audio más corto.")
-        except httpx.ConnectError as e:
-            raise RuntimeError(f"Error de conexión con Deepgram: {e}")
+        except httpx.TransportError as e:
+            # ConnectError, ReadError, RemoteProtocolError...: fallas de red reintentables
+            raise RuntimeError(f"Error de conexión con Deepgram: {e.__class__.__name__}: {e}")
 
     if response.status_code == 401:
         raise RuntimeError("Credenciales de Deepgram inválidas. Verifica DEEPGRAM_API_KEY en .env")
@@ -118,8 +200,10 @@ async def transcribe_audio(
             f"Error de Deepgram (HTTP {response.status_code}): {body}"
         )
 
-    data = response.json()
+    return response.json()
+
 
+def _extract_transcript(data: Dict[str, Any]) -> str:
     # Log estructura de respuesta para debug
     try:
         channels = data.get("results", {}).get("channels", [])
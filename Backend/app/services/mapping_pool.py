@@ -0,0 +1,150 @@
+"""
+Pool de procesos para el post-procesado CPU del modo batch.
+
+map_transcript_to_fields() es Python puro y síncrono: con un transcript
+largo, ejecutarlo en el event loop (o en un hilo, que compite por el GIL)
+frena las sesiones WebSocket de dictado del mismo worker. Aquí corre en un
+ProcessPoolExecutor acotado (settings.mapping_pool_workers):
+
+- Los procesos se calientan al arrancar: importan el mapper (tablas de
+  keywords e índices compilados) antes de recibir el primer mapeo.
+- Guardia de saturación: hasta settings.mapping_pool_queue_size tareas
+  esperan detrás de las que ya corren; más allá se rechaza con
+  MappingPoolSaturatedError (503 en la API).
+- Con mapping_pool_workers = 0 el trabajo corre en un hilo (sin pool).
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class MappingPoolSaturatedError(RuntimeError):
+    """Todas las plazas del pool (en ejecución + en espera) están ocupadas."""
+
+
+def _warm_worker() -> None:
+    """Initializer de cada proceso: el import compila las tablas del mapper una sola vez."""
+    from app.services import biowel_batch_mapper  # noqa: F401
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def map_fields(transcript: str, fields: List[Dict], already_filled: Dict[str, str]) -> Dict[str, str]:
+    """Punto de entrada picklable del mapeo batch (corre en el proceso hijo)."""
+    from app.services.biowel_batch_mapper import map_transcript_to_fields
+
+    return map_transcript_to_fields(
+        transcript=transcript,
+        fields=fields,
+        already_filled=already_filled,
+    )
+
+
+class MappingPool:
+    """ProcessPoolExecutor acotado con guardia de saturación."""
+
+    def __init__(self, workers: int, max_queued: int):
+        self.workers = max(0, workers)
+        self.max_queued = max(0, max_queued)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.finished = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    @property
+    def capacity(self) -> int:
+        return max(1, self.workers) + self.max_queued
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_warm_worker
+            )
+        return self._executor
+
+    async def warm(self) -> None:
+        """Levanta los procesos ya (el executor los crea bajo demanda)."""
+        if not self.workers:
+            return
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        pids = await asyncio.gather(
+            *(loop.run_in_executor(executor, _ping) for _ in range(self.workers))
+        )
+        logger.info(f"[MappingPool] {len(set(pids))} procesos listos")
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Ejecuta fn(*args) en el pool (fn y args deben ser picklables).
+
+        Raises:
+            MappingPoolSaturatedError: Si no quedan plazas libres.
+        """
+        if self._pending >= self.capacity:
+            self.rejected += 1
+            raise MappingPoolSaturatedError(
+                f"Pool de mapeo saturado ({self._pending} tareas en curso o en espera)"
+            )
+
+        self._pending += 1
+        try:
+            if not self.workers:
+                return await asyncio.to_thread(fn, *args)
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._get_executor(), fn, *args)
+            except BrokenProcessPool:
+                # Un proceso murió (OOM, señal): rehacer el pool y completar esta tarea en un hilo
+                logger.error("[MappingPool] Pool roto, recreando procesos")
+                self._reset()
+                return await asyncio.to_thread(fn, *args)
+        finally:
+            self._pending -= 1
+            self.finished += 1
+
+    def _reset(self) -> None:
+        executor, self._executor = self._executor, None
+        self.restarts += 1
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "capacity": self.capacity,
+            "finished": self.finished,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_mapping_pool: Optional[MappingPool] = None
+
+
+def get_mapping_pool() -> MappingPool:
+    """Pool de mapeo del proceso."""
+    global _mapping_pool
+    if _mapping_pool is None:
+        _mapping_pool = MappingPool(
+            workers=settings.mapping_pool_workers,
+            max_queued=settings.mapping_pool_queue_size,
+        )
+    return _mapping_pool
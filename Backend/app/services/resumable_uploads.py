@@ -0,0 +1,255 @@
+"""
+Uploads reanudables para el modo batch.
+
+En enlaces inestables un upload multipart de una consulta larga falla y
+hay que repetirlo entero. Aquí el cliente:
+
+1. crea el upload (nombre, mimetype, tamaño total opcional),
+2. envía bloques con su offset (PUT); tras un corte consulta el offset
+   actual y continúa desde ahí,
+3. finaliza: el archivo ensamblado entra al camino batch existente.
+
+Los bloques se escriben en disco (settings.upload_dir). Un bloque repetido
+(respuesta perdida y reenvío) se acepta sin duplicar bytes; un offset
+adelantado al recibido es un conflicto. Con transcripción en streaming
+(settings.upload_stream_transcription) el STT empieza a leer el prefijo
+recibido mientras el resto sigue llegando (tail()). Los uploads sin
+actividad por settings.upload_ttl_seconds se descartan.
+"""
+
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+
+from app.config import get_settings
+from app.services.deepgram_batch import UploadTooLargeError
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+TAIL_READ_BYTES = 256 * 1024
+
+
+class UploadNotFoundError(KeyError):
+    """Upload inexistente, expirado o ya finalizado."""
+
+
+class UploadOffsetError(ValueError):
+    """El bloque no continúa el archivo recibido (offset adelantado o tamaño excedido)."""
+
+    def __init__(self, message: str, current_offset: int):
+        super().__init__(message)
+        self.current_offset = current_offset
+
+
+class UploadAbortedError(RuntimeError):
+    """El upload expiró o se descartó mientras se leía en streaming."""
+
+
+@dataclass
+class UploadSession:
+    upload_id: str
+    filename: str
+    mimetype: str
+    path: str
+    total_size: Optional[int] = None  # Declarado al crear; None = desconocido
+    offset: int = 0  # Bytes recibidos (contiguos desde 0)
+    finalized: bool = False
+    aborted: bool = False
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    # Transcripción en streaming sobre el prefijo recibido (opcional)
+    transcription: Optional[asyncio.Task] = field(default=None, repr=False)
+    _grew: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    _lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    def snapshot(self) -> Dict:
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "offset": self.offset,
+            "size": self.total_size,
+            "finalized": self.finalized,
+            "streaming": self.transcription is not None,
+        }
+
+    def _notify(self) -> None:
+        self.updated_at = time.time()
+        self._grew.set()
+
+
+class UploadStore:
+    """Uploads en curso de este proceso, ensamblados en disco."""
+
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: float):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sessions: Dict[str, UploadSession] = {}
+
+    def create(self, filename: str, mimetype: str, total_size: Optional[int] = None) -> UploadSession:
+        self.purge_expired()
+        if total_size is not None and total_size > self.max_bytes:
+            raise UploadTooLargeError(
+                f"El audio supera el límite de {self.max_bytes // (1024 * 1024)} MB"
+            )
+        upload_id = uuid.uuid4().hex
+        path = self.directory / f"{upload_id}.part"
+        path.touch()
+        session = UploadSession(
+            upload_id=upload_id,
+            filename=filename,
+            mimetype=mimetype,
+            path=str(path),
+            total_size=total_size,
+        )
+        self._sessions[upload_id] = session
+        logger.info(
+            f"[Uploads] Upload {upload_id} creado: '{filename}', "
+            f"{total_size if total_size is not None else '?'} bytes"
+        )
+        return session
+
+    def get(self, upload_id: str) -> UploadSession:
+        self.purge_expired()
+        session = self._sessions.get(upload_id)
+        if session is None:
+            raise UploadNotFoundError(upload_id)
+        return session
+
+    async def write_chunk(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """
+        Escribe un bloque que empieza en `offset`. Retorna el nuevo offset.
+
+        Los bytes anteriores al offset actual (reenvío) se descartan; un
+        offset mayor al actual deja un hueco y se rechaza.
+        """
+        session = self.get(upload_id)
+        async with session._lock:
+            if session.finalized:
+                raise UploadOffsetError("El upload ya fue finalizado", session.offset)
+            if offset > session.offset:
+                raise UploadOffsetError(
+                    f"Offset {offset} adelantado: recibidos {session.offset} bytes",
+                    session.offset,
+                )
+
+            skip = session.offset - offset
+            with open(session.path, "r+b") as fh:
+                fh.seek(session.offset)
+                async for chunk in chunks:
+                    if skip:
+                        dropped = min(skip, len(chunk))
+                        chunk = chunk[dropped:]
+                        skip -= dropped
+                    if not chunk:
+                        continue
+                    new_offset = session.offset + len(chunk)
+                    if new_offset > self.max_bytes:
+                        raise UploadTooLargeError(
+                            f"El audio supera el límite de {self.max_bytes // (1024 * 1024)} MB"
+                        )
+                    if session.total_size is not None and new_offset > session.total_size:
+                        raise UploadOffsetError(
+                            f"El bloque excede el tamaño declarado ({session.total_size} bytes)",
+                            session.offset,
+                        )
+                    fh.write(chunk)
+                    fh.flush()
+                    # Solo se publica lo ya escrito: tail() puede leerlo
+                    session.offset = new_offset
+                    session._notify()
+            return session.offset
+
+    async def finalize(self, upload_id: str) -> UploadSession:
+        """
+        Cierra el upload y lo saca del store; el archivo pasa al llamador.
+
+        Raises:
+            UploadOffsetError: Si hay un bloque escribiéndose (PUT en curso),
+                si faltan bytes o si el archivo está vacío.
+        """
+        session = self.get(upload_id)
+        if session._lock.locked():
+            raise UploadOffsetError("Hay un bloque escribiéndose en este upload", session.offset)
+        async with session._lock:
+            if session.total_size is not None and session.offset != session.total_size:
+                raise UploadOffsetError(
+                    f"Upload incompleto: {session.offset}/{session.total_size} bytes",
+                    session.offset,
+                )
+            if session.offset == 0:
+                raise UploadOffsetError("El archivo de audio está vacío", 0)
+            session.finalized = True
+            session._notify()
+            del self._sessions[upload_id]
+        logger.info(f"[Uploads] Upload {upload_id} finalizado: {session.offset} bytes")
+        return session
+
+    async def tail(self, session: UploadSession) -> AsyncIterator[bytes]:
+        """Bloques del archivo a medida que llegan, hasta que se finaliza."""
+        position = 0
+        with open(session.path, "rb") as fh:
+            while True:
+                if position < session.offset:
+                    fh.seek(position)
+                    block = fh.read(min(TAIL_READ_BYTES, session.offset - position))
+                    position += len(block)
+                    yield block
+                    continue
+                if session.aborted:
+                    raise UploadAbortedError(f"Upload {session.upload_id} descartado")
+                if session.finalized:
+                    return
+                session._grew.clear()
+                await session._grew.wait()
+
+    def discard(self, session: UploadSession) -> None:
+        session.aborted = True
+        session._notify()
+        if session.transcription is not None:
+            if not session.transcription.done():
+                session.transcription.cancel()
+            session.transcription.add_done_callback(_log_discarded_transcription)
+        self._sessions.pop(session.upload_id, None)
+        try:
+            os.unlink(session.path)
+        except OSError:
+            pass
+
+    def purge_expired(self) -> None:
+        now = time.time()
+        expired = [
+            session for session in self._sessions.values()
+            if now - session.updated_at > self.ttl_seconds
+        ]
+        for session in expired:
+            self.discard(session)
+        if expired:
+            logger.info(f"[Uploads] {len(expired)} uploads abandonados descartados")
+
+    def stats(self) -> Dict:
+        return {
+            "active": len(self._sessions),
+            "bytes_pending": sum(s.offset for s in self._sessions.values()),
+        }
+
+
+def _log_discarded_transcription(task: asyncio.Task) -> None:
+    """Recoge el resultado de la transcripción de un upload descartado."""
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None and not isinstance(error, UploadAbortedError):
+        logger.warning(f"[Uploads] Transcripción de upload descartado falló: {error}")
+
+
+def default_upload_dir() -> str:
+    return settings.upload_dir or os.path.join(tempfile.gettempdir(), "biowel-uploads")
@@ -0,0 +1,188 @@
+"""
+Caché de transcripciones batch direccionada por contenido.
+
+Un reintento tras un timeout, o re-procesar la misma grabación con un scan
+de campos actualizado, no debe pagar otra transcripción completa. La clave
+es el sha256 del audio + proveedor, modelo, idioma y opciones que cambian
+el resultado; el valor es el transcript.
+
+Dos niveles:
+- Memoria: LRU de settings.transcript_cache_entries transcripts.
+- Disco (opcional, settings.transcript_cache_dir): un archivo por clave,
+  compartido entre workers y reinicios, con tope de tamaño
+  (settings.transcript_cache_disk_max_mb) que descarta los de acceso más antiguo.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+HASH_BLOCK_BYTES = 1024 * 1024
+# Sube si cambia la forma de extraer el transcript (invalida lo ya guardado)
+CACHE_FORMAT_VERSION = 1
+
+
+def hash_audio(fileobj: BinaryIO) -> str:
+    """sha256 del archivo completo, leído por bloques (deja el cursor al inicio)."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    while True:
+        block = fileobj.read(HASH_BLOCK_BYTES)
+        if not block:
+            break
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def transcript_cache_key(audio_digest: str, provider: str, language: str, options: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        {
+            "v": CACHE_FORMAT_VERSION,
+            "audio": audio_digest,
+            "provider": provider,
+            "language": language,
+            "options": options,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TranscriptCache:
+    """LRU en memoria + nivel en disco opcional con tope de tamaño."""
+
+    def __init__(self, max_entries: int, disk_dir: str = "", disk_max_bytes: int = 0):
+        self.max_entries = max(1, max_entries)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        # Los accesos llegan del event loop y de hilos (asyncio.to_thread)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            transcript = self._memory.get(key)
+            if transcript is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return transcript
+
+        transcript = self._read_disk(key)
+        with self._lock:
+            if transcript is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, transcript)
+        return transcript
+
+    def put(self, key: str, transcript: str) -> None:
+        with self._lock:
+            self._remember(key, transcript)
+        self._write_disk(key, transcript)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+        }
+
+    def _remember(self, key: str, transcript: str) -> None:
+        self._memory[key] = transcript
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # --------------------------------------------
+    # Nivel en disco
+    # --------------------------------------------
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.txt"
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            transcript = path.read_text(encoding="utf-8")
+            os.utime(path)  # mtime = último acceso, para el descarte por tamaño
+            return transcript
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"[TranscriptCache] No se pudo leer {path.name}: {e}")
+            return None
+
+    def _write_disk(self, key: str, transcript: str) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp.write_text(transcript, encoding="utf-8")
+            os.replace(tmp, path)  # Atómico: otro worker nunca lee un archivo a medias
+        except OSError as e:
+            logger.warning(f"[TranscriptCache] No se pudo escribir {path.name}: {e}")
+            return
+        self._enforce_disk_cap()
+
+    def _enforce_disk_cap(self) -> None:
+        if not self.disk_max_bytes:
+            return
+        try:
+            entries = [
+                (entry.stat().st_mtime, entry.stat().st_size, entry)
+                for entry in self.disk_dir.glob("*.txt")
+            ]
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        if total <= self.disk_max_bytes:
+            return
+        removed = 0
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                entry.unlink()
+                total -= size
+                removed += 1
+            except OSError:
+                continue
+        logger.info(f"[TranscriptCache] Disco sobre el tope: {removed} transcripts descartados")
+
+
+_transcript_cache: Optional[TranscriptCache] = None
+
+
+def get_transcript_cache() -> TranscriptCache:
+    """Caché de transcripciones del proceso."""
+    global _transcript_cache
+    if _transcript_cache is None:
+        _transcript_cache = TranscriptCache(
+            max_entries=settings.transcript_cache_entries,
+            disk_dir=settings.transcript_cache_dir,
+            disk_max_bytes=int(settings.transcript_cache_disk_max_mb * 1024 * 1024),
+        )
+    return _transcript_cache
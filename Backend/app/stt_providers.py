@@ -0,0 +1,318 @@
+"""
+Proveedores de speech-to-text intercambiables (streaming y batch).
+
+Se elige con settings.stt_provider:
+- "deepgram": DeepgramStreamer (WebSocket) y la API pre-recorded
+  (services/deepgram_batch.py). Requiere DEEPGRAM_API_KEY.
+- "replay": reproduce transcripciones grabadas, sin audio real ni red.
+  Cada línea del JSONL es un evento {"timestamp", "text", "is_final"}
+  (segundos desde el inicio del dictado). Sirve para pruebas de carga y CI
+  del pipeline WebSocket sin Deepgram ni costo por minuto.
+
+Interfaz de streaming (StreamingSTTProvider): start() → send_audio()* →
+eventos (texto, is_final) vía consume_transcripts() → finish() devuelve la
+transcripción final. Batch (BatchSTTProvider): transcribe(bytes, mime) o
+transcribe_stream(bloques, mime) para uploads largos sin cargarlos en memoria.
+
+Un motor local en CPU (whisper.cpp, Vosk...) se agrega implementando
+ambas clases y registrándolo en create_streaming_stt() / get_batch_stt().
+"""
+
+import asyncio
+import json
+import logging
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+DEFAULT_REPLAY_FILE = Path(__file__).parent / "data" / "replay" / "sample_session.jsonl"
+
+# PCM16 mono 16 kHz (formato que envía el frontend): bytes por segundo de audio
+PCM16_BYTES_PER_SECOND = 16000 * 2
+
+TranscriptEvent = Tuple[float, str, bool]  # (timestamp, texto, is_final)
+
+
+class StreamingSTTProvider:
+    """
+    Sesión de transcripción en streaming.
+
+    Las implementaciones encolan (texto, is_final) en _transcript_queue y
+    acumulan los finales en final_transcript_parts; consume_transcripts()
+    los entrega al callback on_partial en el event loop.
+    """
+
+    name = "base"
+
+    def __init__(self, on_partial: Callable[[str, bool], Awaitable[None]]):
+        self.on_partial = on_partial
+        self.final_transcript_parts: list[str] = []
+        self.is_open = False
+        self._transcript_queue: asyncio.Queue = asyncio.Queue()
+
+    async def start(self) -> None:
+        raise NotImplementedError
+
+    async def send_audio(self, audio_bytes: bytes) -> None:
+        raise NotImplementedError
+
+    async def finish(self) -> str:
+        """Cierra la sesión y retorna la transcripción final completa."""
+        raise NotImplementedError
+
+    async def consume_transcripts(self) -> None:
+        """
+        Tarea async que consume transcripciones del queue interno
+        y las envía al frontend a través del callback on_partial.
+        """
+        try:
+            while self.is_open:
+                try:
+                    text, is_final = await asyncio.wait_for(
+                        self._transcript_queue.get(),
+                        timeout=1.0
+                    )
+                    await self.on_partial(text, is_final)
+                except asyncio.TimeoutError:
+                    continue
+        except asyncio.CancelledError:
+            # Procesar transcripciones restantes
+            while not self._transcript_queue.empty():
+                try:
+                    text, is_final = self._transcript_queue.get_nowait()
+                    await self.on_partial(text, is_final)
+                except asyncio.QueueEmpty:
+                    break
+            raise
+
+
+class BatchSTTProvider:
+    """Transcripción de un archivo de audio completo."""
+
+    name = "base"
+    # True si implementa transcribe_words() (transcripción por chunks en paralelo)
+    supports_word_timestamps = False
+    # True si sube el audio a un servicio: vale la pena reducirlo a PCM16 mono 16 kHz
+    uploads_audio = False
+
+    async def transcribe(self, file_bytes: bytes, mimetype: str, language: str = "es") -> str:
+        raise NotImplementedError
+
+    async def transcribe_stream(
+        self, chunks: AsyncIterator[bytes], mimetype: str, language: str = "es"
+    ) -> str:
+        """
+        Transcribe leyendo el audio por bloques. Por defecto junta los bloques;
+        los proveedores con upload en streaming lo sobreescriben.
+        """
+        return await self.transcribe(b"".join([c async for c in chunks]), mimetype, language)
+
+    async def transcribe_words(
+        self, file_bytes: bytes, mimetype: str, language: str = "es"
+    ) -> List[Tuple[str, float, float]]:
+        """Palabras (texto, inicio_s, fin_s) relativas al audio recibido."""
+        raise NotImplementedError
+
+
+# ============================================
+# Deepgram
+# ============================================
+
+class DeepgramBatchProvider(BatchSTTProvider):
+    name = "deepgram"
+    supports_word_timestamps = True
+    uploads_audio = True
+
+    async def transcribe(self, file_bytes: bytes, mimetype: str, language: str = "es") -> str:
+        from app.services.deepgram_batch import transcribe_audio
+
+        return await transcribe_audio(file_bytes=file_bytes, mimetype=mimetype, language=language)
+
+    async def transcribe_stream(
+        self, chunks: AsyncIterator[bytes], mimetype: str, language: str = "es"
+    ) -> str:
+        from app.services.deepgram_batch import transcribe_audio_stream
+
+        return await transcribe_audio_stream(chunks, mimetype=mimetype, language=language)
+
+    async def transcribe_words(
+        self, file_bytes: bytes, mimetype: str, language: str = "es"
+    ) -> List[Tuple[str, float, float]]:
+        from app.services.deepgram_batch import transcribe_words
+
+        return await transcribe_words(file_bytes, mimetype=mimetype, language=language)
+
+
+# ============================================
+# Replay de transcripciones grabadas
+# ============================================
+
+@lru_cache(maxsize=16)
+def load_replay_events(path: str) -> Tuple[TranscriptEvent, ...]:
+    """Eventos del JSONL ordenados por timestamp (cacheados por archivo)."""
+    events: List[TranscriptEvent] = []
+    with open(path, "r", encoding="utf-8") as fh:
+        for line_no, line in enumerate(fh, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+                events.append((float(row["timestamp"]), str(row["text"]), bool(row.get("is_final"))))
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+                logger.warning(f"[Replay] {path}:{line_no} inválida, ignorada: {e}")
+    events.sort(key=lambda e: e[0])
+    return tuple(events)
+
+
+def _replay_path() -> str:
+    return settings.stt_replay_file or str(DEFAULT_REPLAY_FILE)
+
+
+class ReplayStreamer(StreamingSTTProvider):
+    """
+    Emite una sesión grabada con su ritmo original.
+
+    pace="wall": cada evento sale cuando el reloj desde start() alcanza
+    timestamp / speed. pace="audio": sale cuando el audio PCM16 recibido
+    por send_audio() cubre su timestamp (el ritmo lo marca el cliente,
+    útil con el generador de carga).
+    """
+
+    name = "replay"
+
+    def __init__(
+        self,
+        on_partial: Callable[[str, bool], Awaitable[None]],
+        path: Optional[str] = None,
+        speed: Optional[float] = None,
+        pace: Optional[str] = None,
+    ):
+        super().__init__(on_partial)
+        self.path = path or _replay_path()
+        self.speed = speed or settings.stt_replay_speed
+        self.pace = pace or settings.stt_replay_pace
+        self._events: Tuple[TranscriptEvent, ...] = ()
+        self._next = 0
+        self._audio_seconds = 0.0
+        self._audio_arrived = asyncio.Event()
+        self._emitter: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._events = load_replay_events(self.path)
+        self.is_open = True
+        self._emitter = asyncio.create_task(self._emit_loop())
+        logger.info(
+            f"[Replay] Sesión iniciada: {len(self._events)} eventos de {self.path} "
+            f"(pace={self.pace}, speed={self.speed})"
+        )
+
+    async def send_audio(self, audio_bytes: bytes) -> None:
+        if not self.is_open:
+            return
+        self._audio_seconds += len(audio_bytes) / PCM16_BYTES_PER_SECOND
+        self._audio_arrived.set()
+
+    async def finish(self) -> str:
+        if self._emitter and not self._emitter.done():
+            self._emitter.cancel()
+            try:
+                await self._emitter
+            except asyncio.CancelledError:
+                pass
+        # Como Deepgram al cerrar: los finales pendientes entran en la transcripción
+        for _, text, is_final in self._events[self._next:]:
+            if is_final:
+                self.final_transcript_parts.append(text)
+        self._next = len(self._events)
+        self.is_open = False
+
+        full_transcript = " ".join(self.final_transcript_parts).strip()
+        logger.info(f"[Replay] Transcripción final: {full_transcript[:100]}...")
+        return full_transcript
+
+    async def _emit_loop(self) -> None:
+        started = time.monotonic()
+        while self.is_open and self._next < len(self._events):
+            timestamp, text, is_final = self._events[self._next]
+            if self.pace == "audio":
+                while self._audio_seconds < timestamp:
+                    self._audio_arrived.clear()
+                    await self._audio_arrived.wait()
+            else:
+                delay = started + timestamp / self.speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            self._next += 1
+            if is_final:
+                self.final_transcript_parts.append(text)
+            self._transcript_queue.put_nowait((text, is_final))
+
+
+class ReplayBatchProvider(BatchSTTProvider):
+    """Devuelve los finales de la sesión grabada, ignorando el audio."""
+
+    name = "replay"
+
+    async def transcribe(self, file_bytes: bytes, mimetype: str, language: str = "es") -> str:
+        if not file_bytes:
+            raise ValueError("El archivo de audio está vacío")
+        return self._recorded_transcript()
+
+    async def transcribe_stream(
+        self, chunks: AsyncIterator[bytes], mimetype: str, language: str = "es"
+    ) -> str:
+        # Se consume el upload (y sus límites de tamaño) sin acumularlo
+        total = 0
+        async for chunk in chunks:
+            total += len(chunk)
+        if not total:
+            raise ValueError("El archivo de audio está vacío")
+        return self._recorded_transcript()
+
+    @staticmethod
+    def _recorded_transcript() -> str:
+        events = load_replay_events(_replay_path())
+        return " ".join(text for _, text, is_final in events if is_final).strip()
+
+
+# ============================================
+# Selección por settings
+# ============================================
+
+def create_streaming_stt(
+    on_partial: Callable[[str, bool], Awaitable[None]],
+) -> StreamingSTTProvider:
+    """Nueva sesión de streaming del proveedor configurado."""
+    provider = settings.stt_provider.lower()
+    if provider == "deepgram":
+        from app.deepgram_streamer import DeepgramStreamer
+
+        return DeepgramStreamer(on_partial=on_partial)
+    if provider == "replay":
+        return ReplayStreamer(on_partial=on_partial)
+    raise ValueError(f"STT_PROVIDER desconocido: '{provider}' (deepgram | replay)")
+
+
+_batch_provider: Optional[BatchSTTProvider] = None
+
+
+def get_batch_stt() -> BatchSTTProvider:
+    """Proveedor batch configurado (uno por proceso)."""
+    global _batch_provider
+    if _batch_provider is None:
+        provider = settings.stt_provider.lower()
+        if provider == "deepgram":
+            _batch_provider = DeepgramBatchProvider()
+        elif provider == "replay":
+            _batch_provider = ReplayBatchProvider()
+        else:
+            raise ValueError(f"STT_PROVIDER desconocido: '{provider}' (deepgram | replay)")
+    return _batch_provider
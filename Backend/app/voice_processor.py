@@ -10,22 +10,40 @@ El LLM puede responder null/vacío si la transcripción no contiene
 información clínica relevante para la historia clínica.
 """
 
+import asyncio
 import json
 import re
 import logging
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional, Set, Tuple
 
-from groq import Groq
 
 from app.config import get_settings
-from app.models import FormStructure, FieldMapping
+from app.llm_client import get_llm_client
+from app.llm_usage import SessionUsage, extract_usage
+from pydantic import ValidationError
+
+from app.models import FormStructure, FieldMapping, MappingsResponse
 from app.realtime_extractor import normalize_value
+from app.section_registry import get_generated_sections
+from app.field_retrieval import FieldRetrievalIndex, get_field_index
+from app.option_index import OptionIndex, get_option_index
+from app.fewshot_examples import format_examples, get_fewshot_library
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Max tokens de salida del prompt genérico de segmento
+SEGMENT_MAX_TOKENS = 500
+
+# Con más campos que esto el schema solo restringe field_name (no value por campo)
+SCHEMA_MAX_PER_FIELD_VARIANTS = 40
+
 # Regex para extraer JSON de respuestas LLM con code fences
 _JSON_FENCE_RE = re.compile(r"```(?:json)?\s*([\s\S]*?)```")
+# Frases de una transcripción (spans unidos con " ... ", puntos, saltos de línea)
+_PHRASE_SPLIT_RE = re.compile(r"\s*(?:\.\.\.|[.;\n])\s*")
+# Máximo de frases comparadas contra la biblioteca de ejemplos
+FEWSHOT_MAX_PHRASES = 64
 
 
 def _extract_json(text: str) -> str:
@@ -36,10 +54,146 @@ def _extract_json(text: str) -> str:
     return text.strip()
 
 
+def _split_phrases(text: str) -> List[str]:
+    phrases = [p for p in _PHRASE_SPLIT_RE.split(text) if len(p.split()) >= 2]
+    return phrases[:FEWSHOT_MAX_PHRASES] or [text]
+
+
+def _value_schema(field_type: str, options: Optional[List[str]]) -> Dict[str, Any]:
+    """Schema del value según tipo de campo Biowel."""
+    if options:
+        return {"type": "string", "enum": list(options)}
+    if field_type == "number":
+        return {"type": ["number", "string"]}
+    if field_type in ("checkbox", "radio"):
+        return {"type": ["boolean", "string"]}
+    return {"type": "string"}
+
+
+def build_mappings_schema(fields: List[Tuple[str, str, Optional[List[str]]]]) -> Dict[str, Any]:
+    """
+    JSON Schema de la respuesta {"mappings": [...] | null}.
+
+    Args:
+        fields: (field_name tal como aparece en el prompt, tipo, opciones).
+            Con pocos campos cada item es una variante por campo (value
+            restringido a sus opciones); con muchos solo se restringe field_name.
+    """
+    item_base = {
+        "type": "object",
+        "required": ["field_name", "value", "confidence"],
+        "additionalProperties": False,
+    }
+    if len(fields) <= SCHEMA_MAX_PER_FIELD_VARIANTS:
+        items = {
+            "anyOf": [
+                {
+                    **item_base,
+                    "properties": {
+                        "field_name": {"type": "string", "enum": [name]},
+                        "value": _value_schema(ftype, options),
+                        "confidence": {"type": "number"},
+                    },
+                }
+                for name, ftype, options in fields
+            ]
+        }
+    else:
+        items = {
+            **item_base,
+            "properties": {
+                "field_name": {"type": "string", "enum": [name for name, _, _ in fields]},
+                "value": {"type": ["string", "number", "boolean"]},
+                "confidence": {"type": "number"},
+            },
+        }
+
+    return {
+        "type": "object",
+        "properties": {
+            "mappings": {"anyOf": [{"type": "null"}, {"type": "array", "items": items}]},
+        },
+        "required": ["mappings"],
+        "additionalProperties": False,
+    }
+
+
+def _response_format(fields: List[Tuple[str, str, Optional[List[str]]]]) -> Dict[str, Any]:
+    """kwargs de response_format para la llamada LLM según llm_output_mode."""
+    mode = settings.llm_output_mode
+    if mode == "json_schema" and fields:
+        return {
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": "field_mappings", "schema": build_mappings_schema(fields)},
+            }
+        }
+    if mode in ("json_object", "json_schema"):
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+def _parse_mappings(raw_content: str) -> Optional[List[FieldMapping]]:
+    """
+    Valida la respuesta del LLM directamente a FieldMapping.
+    Con salida estructurada el proveedor ya garantiza JSON: no hay extracción
+    por regex. En modo texto se conservan los code fences de respaldo.
+
+    Raises:
+        json.JSONDecodeError / ValidationError si la respuesta no es válida.
+    """
+    if settings.llm_output_mode == "text":
+        return MappingsResponse.model_validate(json.loads(_extract_json(raw_content))).mappings
+    return MappingsResponse.model_validate_json(raw_content).mappings
+
+
+class FieldAliasTable:
+    """
+    Alias cortos de sesión para los unique_key de Biowel.
+
+    Los unique_key son largos ("attention-origin-reason-for-consulting-badge-field")
+    y aparecen en el catálogo del prompt y en cada mapping de la respuesta.
+    Con alias ("f17") el prompt y la salida gastan bastantes menos tokens;
+    la respuesta se traduce de vuelta con resolve().
+    """
+
+    def __init__(self, keys: List[str]):
+        self._by_key: Dict[str, str] = {}
+        self._by_alias: Dict[str, str] = {}
+        for key in keys:
+            if key and key not in self._by_key:
+                alias = f"f{len(self._by_key) + 1}"
+                self._by_key[key] = alias
+                self._by_alias[alias] = key
+        # Una sola pasada, claves largas primero y sin tocar sub-cadenas de otras claves
+        alternation = "|".join(
+            re.escape(k) for k in sorted(self._by_key, key=len, reverse=True)
+        )
+        self._key_re = re.compile(r"(?<![\w-])(?:" + alternation + r")(?![\w-])") if alternation else None
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def alias(self, key: str) -> str:
+        return self._by_key.get(key, key)
+
+    def resolve(self, alias: str) -> Optional[str]:
+        """unique_key real del alias, o None si el alias no existe."""
+        return self._by_alias.get((alias or "").strip())
+
+    def alias_text(self, text: str) -> str:
+        """Reemplaza en un prompt ya armado cada unique_key conocido por su alias."""
+        if not self._key_re:
+            return text
+        return self._key_re.sub(lambda m: self._by_key[m.group(0)], text)
+
+
 # ============================================
 # Registro de campos por sección (mini-prompts)
 # Cada sección define: campos, system prompt, user prompt template, max_tokens.
 # Extensible: agregar nuevas secciones aquí sin tocar main.py.
+# Las secciones que no estén aquí se generan desde el escaneo de Biowel
+# (ver app/section_registry.py); las escritas a mano tienen prioridad.
 # ============================================
 SECTION_FIELD_REGISTRY = {
     "attention-origin": {
@@ -108,9 +262,21 @@ o
 
 class VoiceProcessor:
     def __init__(self):
-        self.groq_client = Groq(api_key=settings.groq_api_key)
+        self.llm = get_llm_client()
         self.form_structure: FormStructure = None
         self.biowel_fields: Optional[List[Dict]] = None
+        # Índice TF-IDF de n-gramas para preseleccionar campos candidatos
+        self.field_index: Optional[FieldRetrievalIndex] = None
+        # Registro de secciones activo: escritas a mano + generadas del escaneo
+        self.section_registry: Dict[str, Dict] = dict(SECTION_FIELD_REGISTRY)
+        # Alias cortos de campos para los prompts (None = unique_key tal cual)
+        self.field_aliases: Optional[FieldAliasTable] = None
+        # Opciones escaneadas para ajustar values de select del LLM
+        self.option_index: Optional[OptionIndex] = None
+        # Tokens gastados por carreras especulativas en esta sesión
+        self.speculative_tokens_spent = 0
+        # Llamadas, tokens y latencia LLM de la sesión (resumen en end_stream)
+        self.usage = SessionUsage()
         logger.info("VoiceProcessor inicializado (solo mapeo LLM)")
 
     def set_form_structure(self, structure: FormStructure):
@@ -123,6 +289,52 @@ class VoiceProcessor:
         self.biowel_fields = biowel_fields
         logger.info(f"Contexto Biowel guardado: {len(biowel_fields)} campos")
 
+        self.section_registry = dict(SECTION_FIELD_REGISTRY)
+        try:
+            generated = get_generated_sections(
+                biowel_fields, exclude_sections=SECTION_FIELD_REGISTRY.keys()
+            )
+            self.section_registry.update(generated.registry)
+        except Exception:
+            # Escaneo malformado: seguir con las secciones estáticas
+            logger.exception("Error generando secciones desde Biowel fields")
+        self.field_index = get_field_index(biowel_fields) if settings.llm_retrieval_enabled else None
+        self.option_index = get_option_index(biowel_fields)
+
+        if settings.llm_field_aliases:
+            keys = [f.get("unique_key", "") for f in biowel_fields]
+            for entry in self.section_registry.values():
+                keys.extend(f["key"] for f in entry["fields"])
+            self.field_aliases = FieldAliasTable(keys)
+            logger.info(f"[Aliases] {len(self.field_aliases)} alias de campo para los prompts")
+
+    def _snap_option(self, mapping: FieldMapping, field_type: str) -> bool:
+        """
+        Ajusta el value de un select a una opción escaneada.
+        Retorna False si el value no se parece a ninguna opción (rechazar).
+        """
+        if field_type != "select" or not self.option_index:
+            return True
+        snapped = self.option_index.snap(mapping.field_name, mapping.value)
+        if snapped is None:
+            return False
+        mapping.value = snapped
+        return True
+
+    def _alias(self, key: str) -> str:
+        """Alias del campo para el prompt (o el unique_key si no hay alias)."""
+        return self.field_aliases.alias(key) if self.field_aliases else key
+
+    def _resolve_field_name(self, field_name: str) -> Optional[str]:
+        """
+        Traduce el field_name devuelto por el LLM a unique_key.
+        Con alias activos, un alias desconocido (o un nombre que no es alias)
+        se rechaza con None.
+        """
+        if not self.field_aliases:
+            return field_name
+        return self.field_aliases.resolve(field_name)
+
     async def map_segment_to_fields(
         self, segment: str, already_filled: Optional[Dict[str, str]] = None
     ) -> List[FieldMapping]:
@@ -130,15 +342,30 @@ class VoiceProcessor:
         HU-012: Mapeo en TIEMPO REAL de un segmento individual.
         Prompt ligero optimizado para baja latencia (~200ms en Groq).
         """
-        if not self.biowel_fields:
-            return []
-
         segment = segment.strip()
-        if not segment:
+        built = self._build_segment_prompt(segment, already_filled)
+        if not built:
             return []
+        prompt, schema_fields = built
+        return await self._map_segment_prompt(segment, prompt, schema_fields)
+
+    def _build_segment_prompt(
+        self, segment: str, already_filled: Optional[Dict[str, str]] = None
+    ) -> Optional[Tuple[str, List[Tuple[str, str, Optional[List[str]]]]]]:
+        """
+        Construye el prompt genérico de segmento.
+        Retorna (prompt, campos permitidos para el schema) o None si no hay
+        nada que mapear.
+        """
+        if not self.biowel_fields or not segment:
+            return None
+
+        candidates = self._retrieve_candidates(segment, already_filled)
 
         # Construir lista compacta de campos disponibles
         fields_compact = []
+        schema_fields = []
+        allowed_keys = []
         for f in self.biowel_fields:
             key = f.get("unique_key", "")
             label = f.get("label", "")
@@ -149,8 +376,11 @@ class VoiceProcessor:
             # Saltar campos ya llenos
             if already_filled and key in already_filled:
                 continue
+            # Saltar campos fuera del top-K recuperado
+            if candidates is not None and key not in candidates:
+                continue
 
-            entry = f"{key} ({label})"
+            entry = f"{self._alias(key)} ({label})"
             if eye:
                 entry += f" [{eye}]"
             if section:
@@ -158,20 +388,25 @@ class VoiceProcessor:
             if opts:
                 entry += f" opciones: {', '.join(opts[:5])}"
             fields_compact.append(entry)
+            schema_fields.append((self._alias(key), f.get("field_type", "text"), opts))
+            allowed_keys.append(key)
 
         if not fields_compact:
-            return []
-
-        prompt = f"""Tu tarea es mapear UNA frase dictada por un médico a UNO o MÁS campos del formulario.
-Solo puedes usar los campos listados abajo. Si no hay evidencia clínica clara, devuelve null.
-
-CAMPOS PERMITIDOS (field_name válidos):
-{chr(10).join(fields_compact)}
-
-FRASE:
-"{segment}"
-
-REGLAS DURAS (OBLIGATORIAS):
+            return None
+
+        examples = self._fewshot_block([segment], allowed_keys)
+        if examples:
+            rules = f"""REGLAS:
+1) SOLO field_name de "CAMPOS PERMITIDOS" (exacto). Nunca campos "button", "btn", "link", "load-previous".
+2) Sin evidencia clínica clara (saludo, cortesía, instrucción al paciente, procedimiento) → {{"mappings": null}}. No inventes datos ni opciones.
+3) value = solo contenido clínico, sin la etiqueta del campo ni conectores iniciales ("es", "tiene", "presenta", "refiere").
+4) Si el campo muestra "opciones:", value debe ser EXACTAMENTE una de ellas; si no hay coincidencia clara, no lo llenes.
+
+EJEMPLOS (frases ya revisadas; sigue el mismo criterio):
+{examples}
+"""
+        else:
+            rules = f"""REGLAS DURAS (OBLIGATORIAS):
 1) SOLO puedes devolver mappings cuyos field_name estén EXACTAMENTE en "CAMPOS PERMITIDOS".
 2) Si la frase es saludo, cortesía, instrucción al paciente, conversación casual o procedimiento sin dato clínico → {{"mappings": null}}
 3) Si NO hay evidencia clínica clara para un campo → NO lo incluyas.
@@ -188,20 +423,88 @@ REGLAS PARA CAMPOS CON OPCIONES:
 - Si no hay coincidencia clara con las opciones mostradas, NO llenes ese campo.
 
 REGLAS ESPECIALES (si aplica):
-- Si el doctor dice explícitamente "motivo de consulta: X" o "consulta por X" → usa attention-origin-reason-for-consulting-badge-field con value=X (limpio)
-- Si dice "enfermedad actual: X" o "padecimiento X" → usa badge-text-field-textarea con value=X (limpio)
+- Si el doctor dice explícitamente "motivo de consulta: X" o "consulta por X" → usa {self._alias("attention-origin-reason-for-consulting-badge-field")} con value=X (limpio)
+- Si dice "enfermedad actual: X" o "padecimiento X" → usa {self._alias("badge-text-field-textarea")} con value=X (limpio)
+"""
+
+        prompt = f"""Tu tarea es mapear UNA frase dictada por un médico a UNO o MÁS campos del formulario.
+Solo puedes usar los campos listados abajo. Si no hay evidencia clínica clara, devuelve null.
+
+CAMPOS PERMITIDOS (field_name válidos):
+{chr(10).join(fields_compact)}
 
+FRASE:
+"{segment}"
+
+{rules}
 SALIDA:
 Responde SOLO JSON válido (sin markdown):
 {{"mappings":[{{"field_name":"<field_name_permitido>","value":"<valor>","confidence":0.0}}]}}
 o
 {{"mappings": null}}
 """
+        return prompt, schema_fields
 
+    def _fewshot_block(self, phrases: List[str], available_keys: List[str]) -> str:
+        """
+        Ejemplos resueltos más parecidos a las frases, listos para el prompt
+        (field_name ya en alias). "" si no hay biblioteca o ningún ejemplo
+        se parece lo suficiente: el llamador usa entonces las reglas completas.
+        """
+        library = get_fewshot_library() if settings.llm_fewshot_enabled else None
+        if not library:
+            return ""
+        examples = library.nearest(
+            phrases,
+            k=settings.llm_fewshot_k,
+            min_score=settings.llm_fewshot_min_score,
+            available_keys=available_keys,
+        )
+        if not examples:
+            return ""
+        logger.info(f"[FewShot] {len(examples)} ejemplos para '{phrases[0][:40]}'")
+        return format_examples(examples, self._alias)
 
+    def _retrieve_candidates(
+        self, segment: str, already_filled: Optional[Dict[str, str]] = None
+    ) -> Optional[set]:
+        """
+        Top-K campos candidatos para el segmento, o None para usar la lista
+        completa (formulario pequeño, índice desactivado o confianza baja).
+        """
+        if not self.field_index or len(self.biowel_fields) <= settings.llm_retrieval_min_fields:
+            return None
+
+        top = self.field_index.top_k(
+            segment,
+            k=settings.llm_retrieval_top_k,
+            min_score=settings.llm_retrieval_min_score,
+            exclude=already_filled.keys() if already_filled else None,
+        )
+        if top is None:
+            logger.info(f"[Retrieval] Confianza baja, lista completa para '{segment[:40]}'")
+            return None
+
+        logger.info(f"[Retrieval] {len(top)}/{len(self.biowel_fields)} candidatos para '{segment[:40]}'")
+        return set(top)
+
+    async def _map_segment_prompt(
+        self,
+        segment: str,
+        prompt: str,
+        schema_fields: List[Tuple[str, str, Optional[List[str]]]],
+        speculative: bool = False,
+    ) -> List[FieldMapping]:
+        """
+        Ejecuta el prompt genérico de segmento y valida los mappings.
+
+        Con speculative=True los tokens que reporta el proveedor se descuentan
+        del presupuesto especulativo de la sesión.
+        """
         try:
-            response = self.groq_client.chat.completions.create(
-                model=settings.llm_model,
+            response = await self.llm.chat(
+                layer="segment",
+                usage=self.usage,
                 messages=[
                     {
                         "role": "system",
@@ -222,27 +525,36 @@ o
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.1,
-                max_tokens=500
+                max_tokens=SEGMENT_MAX_TOKENS,
+                **_response_format(schema_fields),
             )
+            if speculative:
+                prompt_tokens, completion_tokens, _ = extract_usage(response)
+                self.speculative_tokens_spent += prompt_tokens + completion_tokens
 
             raw_content = response.choices[0].message.content
             if not raw_content:
                 logger.warning("[Segment LLM] Respuesta vacía del LLM")
                 return []
 
-            response_text = _extract_json(raw_content)
-            result = json.loads(response_text)
-            raw_mappings = result.get("mappings")
-
-            if raw_mappings is None or raw_mappings == []:
+            parsed = _parse_mappings(raw_content)
+            if not parsed:
                 logger.info(f"[Segment LLM] Casual/sin datos: '{segment[:50]}'")
                 return []
 
+            # Guard anti-alucinación: solo aceptar unique_key escaneados
+            valid_keys = {f.get("unique_key") for f in self.biowel_fields or []}
             mappings = []
-            for mapping_data in raw_mappings:
-                mapping = FieldMapping(**mapping_data)
+            for mapping in parsed:
+                field_name = self._resolve_field_name(mapping.field_name)
+                if field_name not in valid_keys:
+                    logger.warning(f"[Segment LLM] Campo desconocido '{mapping.field_name}', ignorado")
+                    continue
+                mapping.field_name = field_name
                 field_type = self._get_field_type_for_key(mapping.field_name)
                 mapping.value = normalize_value(str(mapping.value), field_type)
+                if not self._snap_option(mapping, field_type):
+                    continue
                 mappings.append(mapping)
 
             logger.info(
@@ -251,7 +563,7 @@ o
             )
             return mappings
 
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, ValidationError) as e:
             logger.error(f"[Segment LLM] Error JSON: {e} | raw: {raw_content[:200] if 'raw_content' in dir() else 'N/A'}")
             return []
         except Exception as e:
@@ -266,14 +578,14 @@ o
         Usa un prompt ultraligero con solo los campos de esa sección (~100ms).
 
         Args:
-            section: Nombre de sección de SECTION_CLASSIFIERS (ej: "attention-origin")
+            section: Nombre de sección (escrita a mano o generada del escaneo)
             segment: Segmento de transcripción a procesar
             already_filled: Campos ya llenos (para excluir)
 
         Returns:
             Lista de FieldMapping solo para campos de esta sección
         """
-        section_config = SECTION_FIELD_REGISTRY.get(section)
+        section_config = self.section_registry.get(section)
         if not section_config:
             logger.warning(f"[Section LLM] Sección desconocida: {section}")
             return []
@@ -293,19 +605,27 @@ o
             return []
 
         # Construir prompt desde el template de la sección
-        user_prompt = section_config["user_prompt_template"].format(segment=segment)
+        # replace() y no format(): los templates contienen llaves JSON literales
+        user_prompt = section_config["user_prompt_template"].replace("{segment}", segment)
+        if self.field_aliases:
+            user_prompt = self.field_aliases.alias_text(user_prompt)
         system_prompt = section_config["system_prompt"]
         max_tokens = section_config.get("max_tokens", 150)
 
         try:
-            response = self.groq_client.chat.completions.create(
-                model=settings.llm_model,
+            response = await self.llm.chat(
+                layer="section",
+                usage=self.usage,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt},
                 ],
                 temperature=0.1,
                 max_tokens=max_tokens,
+                **_response_format([
+                    (self._alias(f["key"]), f["type"], f.get("options"))
+                    for f in available_fields
+                ]),
             )
 
             raw_content = response.choices[0].message.content
@@ -313,25 +633,23 @@ o
                 logger.warning(f"[Section LLM] Respuesta vacía para '{section}'")
                 return []
 
-            response_text = _extract_json(raw_content)
-            result = json.loads(response_text)
-            raw_mappings = result.get("mappings")
-
-            if raw_mappings is None or raw_mappings == []:
+            parsed = _parse_mappings(raw_content)
+            if not parsed:
                 logger.info(f"[Section LLM] Sin datos para '{section}': '{segment[:50]}'")
                 return []
 
             # Guard anti-alucinación: solo aceptar campos de esta sección
             valid_keys = {f["key"] for f in section_fields}
             mappings = []
-            for mapping_data in raw_mappings:
-                mapping = FieldMapping(**mapping_data)
-                if mapping.field_name not in valid_keys:
+            for mapping in parsed:
+                field_name = self._resolve_field_name(mapping.field_name)
+                if field_name not in valid_keys:
                     logger.warning(
                         f"[Section LLM] Campo '{mapping.field_name}' "
                         f"no pertenece a sección '{section}', ignorado"
                     )
                     continue
+                mapping.field_name = field_name
                 if already_filled and mapping.field_name in already_filled:
                     continue
                 field_type = next(
@@ -339,6 +657,8 @@ o
                     "text"
                 )
                 mapping.value = normalize_value(str(mapping.value), field_type)
+                if not self._snap_option(mapping, field_type):
+                    continue
                 mappings.append(mapping)
 
             logger.info(
@@ -347,22 +667,87 @@ o
             )
             return mappings
 
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, ValidationError) as e:
             logger.error(f"[Section LLM] JSON error para '{section}': {e}")
             return []
         except Exception as e:
             logger.error(f"[Section LLM] Error para '{section}': {e}")
             return []
 
+    async def map_segment_speculative(
+        self, section: str, segment: str, already_filled: Optional[Dict[str, str]] = None
+    ) -> List[FieldMapping]:
+        """
+        CAPA 3a + 3b en paralelo: lanza el mini-prompt de sección y el prompt
+        genérico a la vez y se queda con el primer resultado válido no vacío;
+        la otra llamada se cancela.
+
+        Se usa cuando la confianza del clasificador es baja: una sección mal
+        clasificada cuesta un round trip en vez de dos. Los tokens que reporta
+        el proveedor para el prompt genérico extra se descuentan de
+        `llm_speculative_token_budget` (si se cancela antes de responder no
+        hay uso que descontar); con el presupuesto agotado se vuelve al flujo
+        secuencial.
+        """
+        segment = segment.strip()
+        built = self._build_segment_prompt(segment, already_filled)
+        if not built:
+            return await self.map_section_fields(section, segment, already_filled=already_filled)
+        prompt, schema_fields = built
+
+        if self.speculative_tokens_spent >= settings.llm_speculative_token_budget:
+            logger.info(
+                f"[Speculative] Presupuesto agotado ({self.speculative_tokens_spent}/"
+                f"{settings.llm_speculative_token_budget}), modo secuencial"
+            )
+            mappings = await self.map_section_fields(section, segment, already_filled=already_filled)
+            if mappings:
+                return mappings
+            return await self._map_segment_prompt(segment, prompt, schema_fields)
+
+        section_task = asyncio.create_task(
+            self.map_section_fields(section, segment, already_filled=already_filled)
+        )
+        generic_task = asyncio.create_task(
+            self._map_segment_prompt(segment, prompt, schema_fields, speculative=True)
+        )
+        pending = {section_task, generic_task}
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Si ambas terminan a la vez, el mini-prompt de sección tiene prioridad
+                for task in sorted(done, key=lambda t: t is not section_task):
+                    mappings = task.result()
+                    if mappings:
+                        winner = "section" if task is section_task else "generic"
+                        logger.info(f"[Speculative] Gana {winner} para '{segment[:40]}'")
+                        return mappings
+            return []
+        finally:
+            for task in pending:
+                task.cancel()
+            # Esperar a los perdedores: liberan el probe del breaker y su excepción se recoge
+            await asyncio.gather(*pending, return_exceptions=True)
+
     async def map_voice_to_fields(
-        self, transcription: str, already_filled: Optional[Dict[str, str]] = None
+        self,
+        transcription: str,
+        already_filled: Optional[Dict[str, str]] = None,
+        only_fields: Optional[Set[str]] = None,
+        timeout: Optional[float] = None,
     ) -> List[FieldMapping]:
         """
         Mapea la transcripción a campos del formulario usando Llama 3.
 
         Args:
-            transcription: Texto completo transcrito por Deepgram.
-            already_filled: Campos ya llenos por el extractor en tiempo real.
+            transcription: Texto transcrito por Deepgram (en modo Biowel, solo
+                los spans que no consumieron keywords ni el campo activo).
+            already_filled: Campos ya llenos por el extractor en tiempo real;
+                en modo Biowel no se listan en el prompt.
+            only_fields: Si se indica, el catálogo Biowel se limita a estos
+                unique_key (shard de una sección).
+            timeout: Deadline de la llamada LLM (default: llm_timeout_full).
 
         Returns:
             Lista de FieldMapping con los campos mapeados.
@@ -376,9 +761,14 @@ o
         # Construir contexto médico
         medical_context = self._build_medical_context()
 
+        # Catálogo Biowel: solo campos aún vacíos (los llenos no se listan)
+        biowel_catalog = bool(self.biowel_fields) and not self.form_structure.fields
+        # Los alias solo aplican si el catálogo del prompt es el de Biowel
+        use_aliases = bool(self.field_aliases) and biowel_catalog
+
         # Construir contexto de campos ya llenos
         already_filled_context = ""
-        if already_filled:
+        if already_filled and not biowel_catalog:
             filled_lines = [f"  - {k} = {v}" for k, v in already_filled.items()]
             already_filled_context = f"""
 CAMPOS YA COMPLETADOS (NO los repitas en tu respuesta):
@@ -388,14 +778,57 @@ CAMPOS YA COMPLETADOS (NO los repitas en tu respuesta):
         # Contexto Biowel si aplica
         biowel_context = ""
         if self.biowel_fields:
-            biowel_context = self._format_biowel_fields()
+            biowel_context = self._format_biowel_fields(exclude=already_filled, only=only_fields)
+            if biowel_catalog and not biowel_context:
+                logger.info("Todos los campos Biowel ya están llenos, sin mapeo LLM")
+                return []
 
         # Estructura del formulario
         form_structure_text = self._format_form_structure()
+        diagnosis_field = "diagnostic-impression-diagnosis-select"
+        if use_aliases:
+            diagnosis_field = self._alias(diagnosis_field)
         if not form_structure_text and biowel_context:
             form_structure_text = biowel_context
 
        
+        examples = ""
+        if biowel_catalog:
+            available = [
+                f.get("unique_key", "") for f in self.biowel_fields
+                if not (already_filled and f.get("unique_key") in already_filled)
+                and (only_fields is None or f.get("unique_key") in only_fields)
+            ]
+            examples = self._fewshot_block(_split_phrases(transcription), available)
+        if examples:
+            rules = f"""REGLAS:
+1. Selects/radios: EXACTAMENTE una de las opciones. Órganos: derecho → "OD", izquierdo → "OI", ambos → "AO". Vía: gotas/oftálmico → "Oftalmico". Forma: gotas → "Frasco", tableta → "Tableta"
+2. Solo campos mencionados en el dictado y aún no completados; si no estás seguro, omite el campo
+3. IGNORA saludos, cortesía, instrucciones al paciente e indicaciones de procedimiento
+4. value = SOLO contenido clínico, sin conectores iniciales ("es el", "es", "tiene", "son", artículos)
+5. NUNCA mapees a campos con "button", "btn", "link", "load-previous" en su nombre
+6. Si se menciona un diagnóstico, mapea TAMBIÉN a {diagnosis_field}
+7. Responde SOLO con el JSON, sin explicaciones
+
+EJEMPLOS (frases ya revisadas; sigue el mismo criterio):
+{examples}"""
+        else:
+            rules = f"""REGLAS:
+1. Para selects/radios, usa EXACTAMENTE el valor de las opciones
+2. Para órganos: "derecho"/"ojo derecho" → "OD", "izquierdo"/"ojo izquierdo" → "OI", "ambos"/"los dos" → "AO"
+3. Para vía oftálmica: "gotas"/"oftálmico" → "Oftalmico"
+4. Para formas farmacéuticas: "gotas"→"Frasco", "tableta"→"Tableta"
+5. Si no estás seguro, omite el campo
+6. NO incluyas campos que no se mencionan en el dictado
+7. NO repitas campos que ya están completados
+8. IGNORA conversación casual: saludos ("hola", "buenos días"), despedidas, instrucciones al paciente ("siéntese", "mire aquí", "abra los ojos"), preguntas personales ("cómo está", "cuántos años tiene"), frases de cortesía
+9. IGNORA indicaciones de procedimiento: "le voy a poner gotas", "vamos a examinar", "un momento"
+10. Responde SOLO con el JSON, sin explicaciones
+11. NUNCA mapees a campos que contengan "button", "btn", "link", "load-previous" en su nombre — esos son botones, no campos
+12. El "value" debe ser SOLO el contenido clínico. ELIMINA conectores: "es el", "es la", "es", "tiene", "son", artículos iniciales
+    Ej: "enfermedad actual es atigmatismo" → value="Atigmatismo" (NO "es atigmatismo")
+13. Si el doctor menciona un diagnóstico/enfermedad, mapea TAMBIÉN al campo {diagnosis_field} con el nombre de la enfermedad"""
+
         prompt = f"""Eres un asistente médico experto en extraer información clínica de dictados de consultas oftalmológicas y mapearla a campos de formularios.
 
 CONTEXTO MÉDICO:
@@ -427,29 +860,16 @@ Si la transcripción es conversación casual, saludos, instrucciones al paciente
   "mappings": null
 }}
 
-REGLAS:
-1. Para selects/radios, usa EXACTAMENTE el valor de las opciones
-2. Para órganos: "derecho"/"ojo derecho" → "OD", "izquierdo"/"ojo izquierdo" → "OI", "ambos"/"los dos" → "AO"
-3. Para vía oftálmica: "gotas"/"oftálmico" → "Oftalmico"
-4. Para formas farmacéuticas: "gotas"→"Frasco", "tableta"→"Tableta"
-5. Si no estás seguro, omite el campo
-6. NO incluyas campos que no se mencionan en el dictado
-7. NO repitas campos que ya están completados
-8. IGNORA conversación casual: saludos ("hola", "buenos días"), despedidas, instrucciones al paciente ("siéntese", "mire aquí", "abra los ojos"), preguntas personales ("cómo está", "cuántos años tiene"), frases de cortesía
-9. IGNORA indicaciones de procedimiento: "le voy a poner gotas", "vamos a examinar", "un momento"
-10. Responde SOLO con el JSON, sin explicaciones
-11. NUNCA mapees a campos que contengan "button", "btn", "link", "load-previous" en su nombre — esos son botones, no campos
-12. El "value" debe ser SOLO el contenido clínico. ELIMINA conectores: "es el", "es la", "es", "tiene", "son", artículos iniciales
-    Ej: "enfermedad actual es atigmatismo" → value="Atigmatismo" (NO "es atigmatismo")
-13. Si el doctor menciona un diagnóstico/enfermedad, mapea TAMBIÉN al campo diagnostic-impression-diagnosis-select con el nombre de la enfermedad
+{rules}
 
 JSON:"""
 
         try:
             logger.info("Enviando a Llama 3 para mapeo...")
 
-            response = self.groq_client.chat.completions.create(
-                model=settings.llm_model,
+            response = await self.llm.chat(
+                layer="full",
+                usage=self.usage,
                 messages=[
                     {
                         "role": "system",
@@ -473,7 +893,11 @@ JSON:"""
                     }
                 ],
                 temperature=0.1,
-                max_tokens=2000
+                max_tokens=2000,
+                timeout=timeout,
+                **_response_format(
+                    self._full_schema_fields(use_aliases, exclude=already_filled, only=only_fields)
+                ),
             )
 
             # Extraer JSON de la respuesta
@@ -484,23 +908,29 @@ JSON:"""
 
             logger.debug(f"Respuesta de Llama: {raw_content[:200]}...")
 
-            response_text = _extract_json(raw_content)
-            result = json.loads(response_text)
-
             # HU-010: Manejar respuesta null del LLM (conversación casual)
-            raw_mappings = result.get("mappings")
-            if raw_mappings is None or raw_mappings == []:
+            parsed = _parse_mappings(raw_content)
+            if not parsed:
                 logger.info("LLM determinó: conversación casual / sin datos clínicos")
                 return []
 
-            # Convertir a FieldMapping con normalización de valores
+            # Normalización de valores
             mappings = []
-            for mapping_data in raw_mappings:
-                mapping = FieldMapping(**mapping_data)
+            for mapping in parsed:
+                if use_aliases:
+                    field_name = self._resolve_field_name(mapping.field_name)
+                    if field_name is None:
+                        logger.warning(f"Alias de campo desconocido '{mapping.field_name}', ignorado")
+                        continue
+                    mapping.field_name = field_name
+                if biowel_catalog and already_filled and mapping.field_name in already_filled:
+                    continue
 
                 # Normalizar valor según tipo de campo
                 field_type = self._get_field_type_for_key(mapping.field_name)
                 mapping.value = normalize_value(str(mapping.value), field_type)
+                if not self._snap_option(mapping, field_type):
+                    continue
 
                 mappings.append(mapping)
 
@@ -510,13 +940,95 @@ JSON:"""
 
             return mappings
 
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, ValidationError) as e:
             logger.error(f"Error parseando JSON: {e} | raw: {raw_content[:200] if 'raw_content' in dir() else 'N/A'}")
             return []
         except Exception as e:
             logger.error(f"Error en mapeo: {e}")
             return []
 
+    async def map_voice_to_fields_sharded(
+        self,
+        shards: List[Tuple[Optional[str], str]],
+        already_filled: Optional[Dict[str, str]] = None,
+    ) -> List[FieldMapping]:
+        """
+        Mapeo de fin de stream por secciones en paralelo.
+
+        Cada shard (testid del anchor, texto) se agrupa por la sección Biowel
+        de su anchor y se mapea SOLO contra los campos vacíos de esa sección;
+        el texto sin anchor (o con anchor de sección desconocida) va contra
+        todos los campos vacíos. Los grupos corren con concurrencia acotada
+        (llm_shard_concurrency) y deadline por shard (llm_shard_timeout), así
+        el tiempo total depende de la sección más larga y no de la consulta.
+
+        Merge determinista: por campo gana la mayor confianza; en empate, el
+        shard que aparece antes en la transcripción.
+        """
+        already_filled = already_filled or {}
+        section_of = {f.get("unique_key"): f.get("section") for f in self.biowel_fields or []}
+        fields_by_section: Dict[str, Set[str]] = {}
+        for f in self.biowel_fields or []:
+            key = f.get("unique_key", "")
+            if f.get("section") and key not in already_filled:
+                fields_by_section.setdefault(f["section"], set()).add(key)
+
+        # Agrupar shards por sección conservando el orden de primera aparición
+        groups: Dict[Optional[str], List[str]] = {}
+        for anchor_testid, text in shards:
+            if not text.strip():
+                continue
+            section = section_of.get(anchor_testid) if anchor_testid else None
+            if section is not None and section not in fields_by_section:
+                section = None
+            groups.setdefault(section, []).append(text.strip())
+
+        if not groups:
+            return []
+
+        semaphore = asyncio.Semaphore(max(1, settings.llm_shard_concurrency))
+
+        async def run_group(section: Optional[str], texts: List[str]) -> List[FieldMapping]:
+            async with semaphore:
+                only = fields_by_section[section] if section else None
+                logger.info(
+                    f"[Sharded] Shard '{section or 'general'}': "
+                    f"{sum(len(t) for t in texts)} chars, "
+                    f"{len(only) if only is not None else 'todos los'} campos"
+                )
+                mappings = await self.map_voice_to_fields(
+                    " ... ".join(texts),
+                    already_filled=already_filled,
+                    only_fields=only,
+                    timeout=settings.llm_shard_timeout,
+                )
+            if only is None:
+                return mappings
+            # only_fields acota el prompt, no la respuesta: un campo de otra
+            # sección no puede ganar el merge desde este shard
+            foreign = [m.field_name for m in mappings if m.field_name not in only]
+            if foreign:
+                logger.warning(f"[Sharded] Shard '{section}': campos fuera de la sección descartados: {foreign}")
+            return [m for m in mappings if m.field_name in only]
+
+        results = await asyncio.gather(
+            *(run_group(section, texts) for section, texts in groups.items()),
+            return_exceptions=True,
+        )
+
+        merged: Dict[str, FieldMapping] = {}
+        for section, result in zip(groups.keys(), results):
+            if isinstance(result, BaseException):
+                logger.error(f"[Sharded] Shard '{section or 'general'}' falló: {result}")
+                continue
+            for mapping in result:
+                current = merged.get(mapping.field_name)
+                if current is None or mapping.confidence > current.confidence:
+                    merged[mapping.field_name] = mapping
+
+        logger.info(f"[Sharded] {len(groups)} shards → {len(merged)} campos")
+        return list(merged.values())
+
     def _build_medical_context(self) -> str:
         """Contexto médico para mejorar el mapeo."""
         return """
@@ -560,21 +1072,34 @@ MEDICAMENTOS COMUNES:
 
         return "\n".join(formatted)
 
-    def _format_biowel_fields(self) -> str:
-        """Formatea los campos Biowel para el prompt del LLM."""
+    def _format_biowel_fields(
+        self, exclude: Optional[Dict[str, str]] = None, only: Optional[Set[str]] = None
+    ) -> str:
+        """
+        Formatea los campos Biowel para el prompt del LLM.
+        Los campos en `exclude` (ya llenos) o fuera de `only` no se listan;
+        "" si no queda ninguno.
+        """
         if not self.biowel_fields:
             return ""
 
-        formatted = ["CAMPOS DE BIOWEL (usar unique_key como field_name):"]
+        if self.field_aliases:
+            formatted = ["CAMPOS DE BIOWEL (usar el alias fN como field_name):"]
+        else:
+            formatted = ["CAMPOS DE BIOWEL (usar unique_key como field_name):"]
         for field in self.biowel_fields:
             key = field.get("unique_key", "")
+            if exclude and key in exclude:
+                continue
+            if only is not None and key not in only:
+                continue
             label = field.get("label", "")
             ftype = field.get("field_type", "")
             eye = field.get("eye", "")
             section = field.get("section", "")
             options = field.get("options", [])
 
-            info = f"- {key} ({label}) [{ftype}]"
+            info = f"- {self._alias(key)} ({label}) [{ftype}]"
             if eye:
                 info += f" Ojo: {eye}"
             if section:
@@ -584,8 +1109,37 @@ MEDICAMENTOS COMUNES:
 
             formatted.append(info)
 
+        if len(formatted) == 1:
+            return ""
         return "\n".join(formatted)
 
+    def _full_schema_fields(
+        self,
+        use_aliases: bool,
+        exclude: Optional[Dict[str, str]] = None,
+        only: Optional[Set[str]] = None,
+    ) -> List[Tuple[str, str, Optional[List[str]]]]:
+        """Campos del catálogo del prompt completo, para el schema de salida."""
+        if self.form_structure and self.form_structure.fields:
+            return [
+                (
+                    f.name,
+                    "select" if f.options else "text",
+                    [opt.value for opt in f.options] if f.options else None,
+                )
+                for f in self.form_structure.fields
+            ]
+        return [
+            (
+                self._alias(f.get("unique_key", "")) if use_aliases else f.get("unique_key", ""),
+                f.get("field_type", "text"),
+                f.get("options"),
+            )
+            for f in self.biowel_fields or []
+            if not (exclude and f.get("unique_key") in exclude)
+            and (only is None or f.get("unique_key") in only)
+        ]
+
     def _get_field_type_for_key(self, field_name: str) -> str:
         """Retorna el tipo de campo dado un field_name/unique_key."""
         if self.biowel_fields:
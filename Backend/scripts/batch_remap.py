@@ -0,0 +1,318 @@
+"""
+Re-mapeo offline de consultas archivadas con map_transcript_to_fields.
+
+Cuando cambian las tablas de keywords hay que volver a correr la extracción
+sobre miles de consultas para comparar tasas de llenado y detectar
+regresiones. Este script lo hace sin red ni servidor, usando todos los
+núcleos (multiprocessing.Pool + imap con chunksize).
+
+Entrada (`source`):
+
+- Directorio: cada `*.txt` es un transcript. Cada audio (.wav, .mp3, ...)
+  usa su transcript hermano (`consulta.txt` junto a `consulta.wav`) o, si
+  no existe, el de la caché de transcripciones (TRANSCRIPT_CACHE_DIR). La
+  clave de la caché sale de la misma configuración que usa el servidor
+  (STT_PROVIDER, DEEPGRAM_MODEL, chunks, preprocesado).
+- JSONL: una consulta por línea:
+
+    {"id": "c-001", "transcript": "motivo de consulta visión borrosa ..."}
+    {"id": "c-002", "audio": "audios/c-002.wav", "already_filled": {...}}
+
+  `text` se acepta como alias de `transcript`; `fields` (lista) reemplaza
+  el escaneo para esa consulta; `audio` es relativo al JSONL.
+
+Salida: NDJSON, una línea por consulta y en el orden de entrada, a
+`--out` o stdout. Al final, un resumen con throughput y tasa de llenado por
+campo (a stderr si el NDJSON va a stdout). Con `--baseline` (un NDJSON de
+una corrida anterior) el resumen muestra la diferencia por campo.
+
+Uso (desde Backend/):
+
+    python scripts/batch_remap.py archivo/ --out remap.ndjson
+    python scripts/batch_remap.py consultas.jsonl --fields scan.json --workers 8 \\
+        --out nuevo.ndjson --baseline anterior.ndjson
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, TextIO
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Importado en el proceso principal: con fork los workers heredan las tablas
+# del mapper ya compiladas; con spawn las compila el import de cada worker
+from app.services.biowel_batch_mapper import map_transcript_to_fields  # noqa: E402
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_FIELDS = BACKEND_DIR / "scripts" / "data" / "biowel_scan_sample.json"
+
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".m4a", ".flac", ".ogg", ".webm"}
+# Diferencia de tasa de llenado (puntos porcentuales) que se marca como cambio
+DEFAULT_DELTA_THRESHOLD = 2.0
+
+
+def available_cpus() -> int:
+    """Núcleos utilizables por este proceso (respeta cpusets de contenedores)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# ============================================
+# Entrada
+# ============================================
+
+def iter_directory(root: Path) -> Iterator[Dict]:
+    for path in sorted(root.rglob("*")):
+        if not path.is_file():
+            continue
+        suffix = path.suffix.lower()
+        if suffix == ".txt":
+            yield {"id": str(path.relative_to(root).with_suffix("")), "transcript_path": str(path)}
+        elif suffix in AUDIO_EXTENSIONS and not path.with_suffix(".txt").exists():
+            # Con transcript hermano ya se procesa por el .txt
+            yield {"id": str(path.relative_to(root).with_suffix("")), "audio": str(path)}
+
+
+def iter_jsonl(path: Path) -> Iterator[Dict]:
+    with path.open(encoding="utf-8") as fh:
+        for line_no, line in enumerate(fh, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"id": f"{path.name}:{line_no}", "error": f"JSON inválido: {e}"}
+                continue
+            record.setdefault("id", f"{path.name}:{line_no}")
+            if "transcript" not in record and "text" in record:
+                record["transcript"] = record.pop("text")
+            if record.get("audio"):
+                record["audio"] = str((path.parent / record["audio"]).resolve())
+            yield record
+
+
+def iter_source(source: Path) -> Iterator[Dict]:
+    if source.is_dir():
+        return iter_directory(source)
+    return iter_jsonl(source)
+
+
+# ============================================
+# Worker (un proceso por núcleo)
+# ============================================
+
+_fields: List[Dict] = []
+_mimetype: Optional[str] = None
+
+
+def _init_worker(fields: List[Dict], mimetype: Optional[str], log_level: str) -> None:
+    """Carga el escaneo una vez por proceso (las tablas del mapper ya vienen con el import)."""
+    global _fields, _mimetype
+    logging.basicConfig(level=log_level, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    _fields = fields
+    _mimetype = mimetype
+
+
+def _cached_transcript(audio_path: str) -> Optional[str]:
+    """Transcript de la caché del servidor para este audio, sin llamar al STT."""
+    try:
+        from app.api.batch_routes import _resolve_mimetype, plan_transcription
+        from app.services.transcript_cache import get_transcript_cache
+        from app.stt_providers import get_batch_stt
+    except SystemExit:
+        # get_settings() sale del proceso si falta configuración: en un worker
+        # del Pool eso deja la tarea colgada, así que se reporta como error
+        raise RuntimeError("Configuración del servidor incompleta (ver .env) para resolver audios")
+
+    mimetype = _mimetype or _resolve_mimetype(audio_path, None)
+    with open(audio_path, "rb") as fileobj:
+        plan = plan_transcription(fileobj, mimetype, get_batch_stt())
+    return get_transcript_cache().get(plan.cache_key)
+
+
+def remap_record(record: Dict) -> Dict:
+    started = time.perf_counter()
+    result = {"id": record.get("id")}
+    if record.get("error"):
+        result["error"] = record["error"]
+        return result
+    try:
+        transcript = record.get("transcript")
+        if transcript is None and record.get("transcript_path"):
+            transcript = Path(record["transcript_path"]).read_text(encoding="utf-8")
+        if transcript is None and record.get("audio"):
+            transcript = _cached_transcript(record["audio"])
+            if transcript is None:
+                result["error"] = "Audio sin transcript hermano ni en la caché de transcripciones"
+                return result
+        if transcript is None:
+            result["error"] = "Registro sin transcript ni audio"
+            return result
+
+        fields = record.get("fields") or _fields
+        already_filled = record.get("already_filled") or {}
+        filled = map_transcript_to_fields(
+            transcript=transcript, fields=fields, already_filled=already_filled
+        )
+    except Exception as e:
+        result["error"] = f"{e.__class__.__name__}: {e}"
+        return result
+
+    result.update({
+        "transcript_chars": len(transcript),
+        "total_fields": len(fields),
+        "mapped_count": len(filled),
+        "filled_fields": filled,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+    return result
+
+
+# ============================================
+# Resumen
+# ============================================
+
+class FillStats:
+    """Tasa de llenado por campo sobre las consultas mapeadas sin error."""
+
+    def __init__(self):
+        self.records = 0
+        self.errors = 0
+        self.chars = 0
+        self.filled: Dict[str, int] = {}
+
+    def add(self, result: Dict) -> None:
+        if result.get("error"):
+            self.errors += 1
+            return
+        self.records += 1
+        self.chars += result.get("transcript_chars", 0)
+        for testid in result.get("filled_fields", {}):
+            self.filled[testid] = self.filled.get(testid, 0) + 1
+
+    def rates(self) -> Dict[str, float]:
+        if not self.records:
+            return {}
+        return {testid: count / self.records for testid, count in self.filled.items()}
+
+
+def load_baseline(path: Path) -> FillStats:
+    stats = FillStats()
+    with path.open(encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                stats.add(json.loads(line))
+    return stats
+
+
+def build_summary(stats: FillStats, elapsed: float, workers: int, baseline: Optional[FillStats]) -> Dict:
+    rates = stats.rates()
+    summary = {
+        "records": stats.records,
+        "errors": stats.errors,
+        "workers": workers,
+        "elapsed_s": round(elapsed, 2),
+        "records_per_s": round(stats.records / elapsed, 1) if elapsed else None,
+        "chars_per_s": round(stats.chars / elapsed) if elapsed else None,
+        "fill_rate": {testid: round(rate, 4) for testid, rate in sorted(rates.items(), key=lambda i: -i[1])},
+    }
+    if baseline is not None:
+        base_rates = baseline.rates()
+        summary["baseline_records"] = baseline.records
+        summary["fill_rate_delta"] = {
+            testid: round(rates.get(testid, 0.0) - base_rates.get(testid, 0.0), 4)
+            for testid in sorted(set(rates) | set(base_rates))
+        }
+    return summary
+
+
+def print_summary(summary: Dict, top: int, delta_threshold: float, out: TextIO) -> None:
+    print(
+        f"Consultas: {summary['records']} mapeadas, {summary['errors']} con error "
+        f"({summary['workers']} procesos, {summary['elapsed_s']}s)",
+        file=out,
+    )
+    print(f"Throughput: {summary['records_per_s']} consultas/s, {summary['chars_per_s']} chars/s", file=out)
+
+    fill_rate = summary["fill_rate"]
+    print(f"Tasa de llenado ({min(top, len(fill_rate))} de {len(fill_rate)} campos):", file=out)
+    for testid, rate in list(fill_rate.items())[:top]:
+        print(f"  {rate * 100:6.1f}%  {testid}", file=out)
+
+    deltas = summary.get("fill_rate_delta")
+    if deltas is not None:
+        changed = [
+            (testid, delta) for testid, delta in deltas.items()
+            if abs(delta) * 100 >= delta_threshold
+        ]
+        changed.sort(key=lambda item: item[1])
+        print(
+            f"Vs. baseline ({summary['baseline_records']} consultas): "
+            f"{len(changed)} campos cambian ≥ {delta_threshold} pp",
+            file=out,
+        )
+        for testid, delta in changed:
+            print(f"  {delta * 100:+6.1f} pp  {testid}", file=out)
+
+
+# ============================================
+# CLI
+# ============================================
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-mapeo offline de consultas archivadas")
+    parser.add_argument("source", type=Path, help="Directorio de transcripts/audios o JSONL de consultas")
+    parser.add_argument("--fields", type=Path, default=DEFAULT_FIELDS, help="Escaneo de campos (JSON)")
+    parser.add_argument("--out", type=Path, help="NDJSON de resultados (default: stdout)")
+    parser.add_argument("--workers", type=int, default=available_cpus())
+    parser.add_argument("--chunksize", type=int, default=16, help="Consultas por envío a cada proceso")
+    parser.add_argument("--mimetype", help="Mimetype con el que se subieron los audios (clave de caché)")
+    parser.add_argument("--baseline", type=Path, help="NDJSON de una corrida anterior para comparar")
+    parser.add_argument("--delta-threshold", type=float, default=DEFAULT_DELTA_THRESHOLD,
+                        help="Cambio de tasa (pp) que se lista vs. baseline")
+    parser.add_argument("--top", type=int, default=40, help="Campos listados en el resumen")
+    parser.add_argument("--summary-json", type=Path, help="Escribir el resumen en este archivo")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    fields = json.loads(args.fields.read_text(encoding="utf-8"))
+    baseline = load_baseline(args.baseline) if args.baseline else None
+    workers = max(1, args.workers)
+
+    out = args.out.open("w", encoding="utf-8") if args.out else sys.stdout
+    report_to = sys.stderr if out is sys.stdout else sys.stdout
+    stats = FillStats()
+    started = time.perf_counter()
+    try:
+        with multiprocessing.Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(fields, args.mimetype, args.log_level),
+        ) as pool:
+            # imap conserva el orden de entrada y consume la fuente de a poco
+            for result in pool.imap(remap_record, iter_source(args.source), chunksize=max(1, args.chunksize)):
+                stats.add(result)
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        else:
+            out.flush()
+    elapsed = time.perf_counter() - started
+
+    summary = build_summary(stats, elapsed, workers, baseline)
+    print_summary(summary, args.top, args.delta_threshold, report_to)
+    if args.summary_json:
+        args.summary_json.write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Generador de carga para /ws/voice-stream.
+
+Abre N sesiones WebSocket concurrentes contra el servidor. Cada sesión:
+1. envía `biowel_form_structure` con un escaneo de campos capturado,
+2. transmite audio a ritmo real (o un múltiplo con --speed): un WAV PCM16
+   16 kHz mono, o silencio durante lo que dura una transcripción grabada
+   (el servidor con STT_PROVIDER=replay la reproduce),
+3. envía `end_stream` y espera "Stream procesado completamente".
+
+Reporta p50/p95/p99 de time-to-first-partial, keyword→autofill (transcripción
+que dispara un partial_autofill hasta que llega) y fin de stream, más CPU y
+RSS del servidor muestreados de /metrics/process.
+
+Sin red ni costo, con backends stub en el servidor:
+
+    STT_PROVIDER=replay STT_REPLAY_PACE=audio LLM_BACKEND=fake \\
+    LLM_FAKE_LATENCY_MS=200 uvicorn app.main:app --port 8000
+
+    python scripts/loadgen.py --sessions 20 --speed 2
+    python scripts/loadgen.py --sessions 5 --wav dictado.wav --json resultado.json
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import statistics
+import sys
+import time
+import wave
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_FIELDS = BACKEND_DIR / "scripts" / "data" / "biowel_scan_sample.json"
+DEFAULT_TRANSCRIPT = BACKEND_DIR / "app" / "data" / "replay" / "sample_session.jsonl"
+
+SAMPLE_RATE = 16000
+CHUNK_SECONDS = 0.1  # Mismo tamaño de chunk que el MediaRecorder del userscript
+STREAM_DONE_MESSAGE = "Stream procesado completamente"
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def load_audio_chunks(wav_path: Optional[Path], transcript_path: Path) -> List[bytes]:
+    """Chunks PCM16 de CHUNK_SECONDS: del WAV o silencio con la duración de la grabación."""
+    chunk_bytes = int(SAMPLE_RATE * CHUNK_SECONDS) * 2
+    if wav_path:
+        with wave.open(str(wav_path), "rb") as wav:
+            if (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) != (SAMPLE_RATE, 1, 2):
+                sys.exit(f"{wav_path}: se requiere WAV PCM16 16 kHz mono")
+            pcm = wav.readframes(wav.getnframes())
+        return [pcm[i:i + chunk_bytes] for i in range(0, len(pcm), chunk_bytes)]
+
+    duration = 0.0
+    with open(transcript_path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                duration = max(duration, float(json.loads(line)["timestamp"]))
+    # Un segundo de cola para que el último evento quede cubierto
+    n_chunks = int((duration + 1.0) / CHUNK_SECONDS)
+    return [b"\x00" * chunk_bytes] * n_chunks
+
+
+class SessionResult:
+    def __init__(self, session_id: int):
+        self.session_id = session_id
+        self.first_partial_s: Optional[float] = None
+        self.autofill_s: List[float] = []
+        self.end_of_stream_s: Optional[float] = None
+        self.autofill_items = 0
+        self.error: Optional[str] = None
+
+
+async def run_session(
+    session_id: int,
+    url: str,
+    fields: List[Dict],
+    chunks: List[bytes],
+    speed: float,
+    timeout: float,
+) -> SessionResult:
+    result = SessionResult(session_id)
+    transcript_seen_at: Dict[str, float] = {}
+    last_transcript_at: Optional[float] = None
+    first_audio_at: Optional[float] = None
+    end_sent_at: Optional[float] = None
+    done = asyncio.Event()
+
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            await ws.send(json.dumps({
+                "type": "biowel_form_structure", "fields": fields, "already_filled": {},
+            }))
+            ready = json.loads(await asyncio.wait_for(ws.recv(), timeout=timeout))
+            if ready.get("type") != "info":
+                raise RuntimeError(f"Inicio rechazado: {ready}")
+
+            async def receiver() -> None:
+                nonlocal last_transcript_at
+                async for raw in ws:
+                    msg = json.loads(raw)
+                    now = time.perf_counter()
+                    kind = msg.get("type")
+                    if kind in ("partial_transcription", "final_segment"):
+                        if result.first_partial_s is None and first_audio_at is not None:
+                            result.first_partial_s = now - first_audio_at
+                        transcript_seen_at.setdefault(msg.get("text", ""), now)
+                        last_transcript_at = now
+                    elif kind == "partial_autofill":
+                        result.autofill_items += len(msg.get("items") or [])
+                        seen = transcript_seen_at.get(msg.get("source_text", ""), last_transcript_at)
+                        if seen is not None:
+                            result.autofill_s.append(now - seen)
+                    elif kind == "info" and msg.get("message") == STREAM_DONE_MESSAGE:
+                        if end_sent_at is not None:
+                            result.end_of_stream_s = now - end_sent_at
+                        done.set()
+                        return
+                    elif kind == "error":
+                        result.error = msg.get("message")
+
+            receiver_task = asyncio.create_task(receiver())
+
+            # Audio a ritmo real × speed, con reloj absoluto para no acumular deriva
+            interval = CHUNK_SECONDS / speed
+            started = time.perf_counter()
+            for i, chunk in enumerate(chunks):
+                if first_audio_at is None:
+                    first_audio_at = time.perf_counter()
+                await ws.send(json.dumps({
+                    "type": "audio_chunk", "data": base64.b64encode(chunk).decode("ascii"),
+                }))
+                delay = started + (i + 1) * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            end_sent_at = time.perf_counter()
+            await ws.send(json.dumps({"type": "end_stream"}))
+            try:
+                await asyncio.wait_for(done.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                result.error = result.error or f"sin fin de stream tras {timeout}s"
+            receiver_task.cancel()
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+
+async def sample_server(base_url: str, stop: asyncio.Event, interval: float) -> List[Dict]:
+    """Muestras periódicas de /metrics/process durante la prueba."""
+    samples = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=5.0) as client:
+        while True:
+            try:
+                response = await client.get("/metrics/process")
+                samples.append({**response.json(), "_at": time.perf_counter()})
+            except httpx.HTTPError:
+                pass
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=interval)
+                return samples
+            except asyncio.TimeoutError:
+                continue
+
+
+def summarize_server(samples: List[Dict]) -> Dict:
+    if len(samples) < 2 or samples[0].get("cpu_user_s") is None:
+        return {"samples": len(samples)}
+    cpu_pct = []
+    for prev, cur in zip(samples, samples[1:]):
+        wall = cur["_at"] - prev["_at"]
+        cpu = (cur["cpu_user_s"] + cur["cpu_system_s"]) - (prev["cpu_user_s"] + prev["cpu_system_s"])
+        if wall > 0:
+            cpu_pct.append(100.0 * cpu / wall)
+    rss = [s["rss_mb"] for s in samples if s.get("rss_mb") is not None]
+    return {
+        "samples": len(samples),
+        "cpu_pct_avg": round(statistics.mean(cpu_pct), 1) if cpu_pct else None,
+        "cpu_pct_max": round(max(cpu_pct), 1) if cpu_pct else None,
+        "rss_mb_start": rss[0] if rss else None,
+        "rss_mb_max": max(rss) if rss else None,
+        "max_rss_mb": samples[-1].get("max_rss_mb"),
+        "max_active_sessions": max(s.get("active_sessions", 0) for s in samples),
+    }
+
+
+def latency_stats(values: List[float]) -> Dict:
+    return {
+        "n": len(values),
+        **{f"p{p}_ms": round(percentile(values, p) * 1000, 1) if values else None for p in (50, 95, 99)},
+    }
+
+
+async def main_async(args: argparse.Namespace) -> Dict:
+    fields = json.loads(Path(args.fields).read_text(encoding="utf-8"))
+    chunks = load_audio_chunks(Path(args.wav) if args.wav else None, Path(args.transcript))
+    url = f"{args.url.rstrip('/')}/ws/voice-stream"
+    http_base = args.url.replace("ws://", "http://").replace("wss://", "https://").rstrip("/")
+    audio_seconds = len(chunks) * CHUNK_SECONDS
+    print(
+        f"{args.sessions} sesiones → {url} | {len(fields)} campos | "
+        f"{audio_seconds:.1f}s de audio a {args.speed}x | rampa {args.ramp}s"
+    )
+
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_server(http_base, stop, args.sample_interval))
+
+    async def delayed(i: int) -> SessionResult:
+        if args.ramp and args.sessions > 1:
+            await asyncio.sleep(args.ramp * i / (args.sessions - 1))
+        return await run_session(i, url, fields, chunks, args.speed, args.timeout)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(delayed(i) for i in range(args.sessions)))
+    wall = time.perf_counter() - started
+    stop.set()
+    samples = await sampler
+
+    ok = [r for r in results if not r.error]
+    report = {
+        "sessions": args.sessions,
+        "ok": len(ok),
+        "errors": [f"#{r.session_id}: {r.error}" for r in results if r.error],
+        "wall_s": round(wall, 1),
+        "audio_s_per_session": round(audio_seconds, 1),
+        "speed": args.speed,
+        "time_to_first_partial": latency_stats([r.first_partial_s for r in results if r.first_partial_s is not None]),
+        "keyword_to_autofill": latency_stats([s for r in results for s in r.autofill_s]),
+        "end_of_stream": latency_stats([r.end_of_stream_s for r in results if r.end_of_stream_s is not None]),
+        "autofill_items": sum(r.autofill_items for r in results),
+        "server": summarize_server(samples),
+    }
+    return report
+
+
+def print_report(report: Dict) -> None:
+    print(f"\nSesiones OK: {report['ok']}/{report['sessions']} en {report['wall_s']}s")
+    for err in report["errors"][:10]:
+        print(f"  ERROR {err}")
+    print(f"{'métrica':<24}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name in ("time_to_first_partial", "keyword_to_autofill", "end_of_stream"):
+        s = report[name]
+        fmt = lambda v: f"{v:>10.1f}" if v is not None else f"{'-':>10}"  # noqa: E731
+        print(f"{name:<24}{s['n']:>6}{fmt(s['p50_ms'])}{fmt(s['p95_ms'])}{fmt(s['p99_ms'])}")
+    print(f"autofill items: {report['autofill_items']}")
+    server = report["server"]
+    if "cpu_pct_avg" in server:
+        print(
+            f"servidor: CPU avg {server['cpu_pct_avg']}% / max {server['cpu_pct_max']}%, "
+            f"RSS {server['rss_mb_start']} → {server['rss_mb_max']} MB "
+            f"(max_rss {server['max_rss_mb']} MB), sesiones activas max {server['max_active_sessions']}"
+        )
+    else:
+        print(f"servidor: sin métricas de proceso ({server['samples']} muestras)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generador de carga para /ws/voice-stream")
+    parser.add_argument("--url", default="ws://localhost:8000")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--speed", type=float, default=1.0, help="Múltiplo del ritmo real del audio")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Segundos para escalonar el inicio")
+    parser.add_argument("--fields", default=str(DEFAULT_FIELDS), help="Escaneo de campos capturado (JSON)")
+    parser.add_argument("--wav", help="WAV PCM16 16 kHz mono a transmitir")
+    parser.add_argument("--transcript", default=str(DEFAULT_TRANSCRIPT),
+                        help="Transcripción grabada (JSONL) que marca la duración sin --wav")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Espera máxima del fin de stream")
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--json", help="Escribir el reporte en este archivo")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Entrena el clasificador local de relevancia clínica (app/relevance_model.py).
+
+Entrada: JSONL de segmentos etiquetados exportados de los logs de sesión,
+una línea por segmento:
+
+    {"text": "refiere ardor en los ojos", "label": 1}
+    {"text": "apoye la barbilla aquí", "label": 0}
+
+`label` acepta 1/0, true/false o "relevant"/"casual".
+
+Uso (desde Backend/):
+
+    python scripts/train_relevance_model.py scripts/data/relevance_segments.jsonl
+    python scripts/train_relevance_model.py export.jsonl --holdout 0.25 --min-recall 0.95
+
+Reporta precisión/recall/F1 en un held-out estratificado (del modelo solo y
+del filtro completo regex + modelo) y escribe app/data/relevance_model.json.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.relevance_model import (  # noqa: E402
+    DEFAULT_N_FEATURES,
+    DEFAULT_NGRAM_SIZES,
+    MODEL_PATH,
+    RelevanceClassifier,
+    hashed_features,
+)
+
+_POSITIVE_LABELS = {"1", "true", "relevant", "relevante", "clinical", "clinico"}
+
+
+def load_segments(path: Path) -> List[Tuple[str, int]]:
+    segments = []
+    with open(path, "r", encoding="utf-8") as fh:
+        for line_no, line in enumerate(fh, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"  línea {line_no}: JSON inválido, ignorada", file=sys.stderr)
+                continue
+            text = (row.get("text") or "").strip()
+            if text:
+                segments.append((text, 1 if str(row.get("label")).lower() in _POSITIVE_LABELS else 0))
+    return segments
+
+
+def stratified_split(
+    segments: List[Tuple[str, int]], holdout: float, seed: int
+) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]:
+    rng = random.Random(seed)
+    train, test = [], []
+    for label in (0, 1):
+        group = [s for s in segments if s[1] == label]
+        rng.shuffle(group)
+        cut = int(round(len(group) * holdout))
+        test.extend(group[:cut])
+        train.extend(group[cut:])
+    return train, test
+
+
+def featurize(texts: List[str], n_features: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Matriz dispersa en formato COO (filas, columnas, valores)."""
+    rows, cols, vals = [], [], []
+    for i, text in enumerate(texts):
+        for idx, val in hashed_features(text, n_features, DEFAULT_NGRAM_SIZES).items():
+            rows.append(i)
+            cols.append(idx)
+            vals.append(val)
+    return (
+        np.asarray(rows, dtype=np.int64),
+        np.asarray(cols, dtype=np.int64),
+        np.asarray(vals, dtype=np.float64),
+    )
+
+
+def train_logistic(
+    texts: List[str],
+    labels: np.ndarray,
+    n_features: int,
+    epochs: int,
+    lr: float,
+    l2: float,
+) -> Tuple[np.ndarray, float]:
+    """Regresión logística por descenso de gradiente (batch completo) con L2."""
+    rows, cols, vals = featurize(texts, n_features)
+    n = len(texts)
+    w = np.zeros(n_features, dtype=np.float64)
+    b = 0.0
+    # Balancear clases: cada clase pesa lo mismo en la pérdida
+    pos = max(1, int(labels.sum()))
+    neg = max(1, n - pos)
+    sample_weight = np.where(labels == 1, n / (2.0 * pos), n / (2.0 * neg))
+
+    for _ in range(epochs):
+        z = np.bincount(rows, weights=w[cols] * vals, minlength=n) + b
+        p = 1.0 / (1.0 + np.exp(-z))
+        err = (p - labels) * sample_weight / n
+        grad_w = np.bincount(cols, weights=err[rows] * vals, minlength=n_features) + l2 * w
+        w -= lr * grad_w
+        b -= lr * float(err.sum())
+    return w, b
+
+
+def out_of_fold_probs(
+    texts: List[str],
+    labels: np.ndarray,
+    fit: Callable[[List[str], np.ndarray], Tuple[np.ndarray, float]],
+    folds: int,
+    seed: int,
+) -> np.ndarray:
+    """Probabilidad de cada segmento de train según un modelo que no lo vio."""
+    order = list(range(len(texts)))
+    random.Random(seed).shuffle(order)
+    probs = np.zeros(len(texts), dtype=np.float64)
+    for k in range(folds):
+        held = set(order[k::folds])
+        train_idx = [i for i in range(len(texts)) if i not in held]
+        w, b = fit([texts[i] for i in train_idx], labels[train_idx])
+        fold_model = RelevanceClassifier(w, b)
+        for i in held:
+            probs[i] = fold_model.predict_proba(texts[i])
+    return probs
+
+
+def pick_threshold(probs: np.ndarray, labels: np.ndarray, min_recall: float) -> float:
+    """Umbral más alto que mantiene recall >= min_recall (out-of-fold)."""
+    positives = np.sort(probs[labels == 1])
+    if not positives.size:
+        return 0.5
+    allowed_misses = int(np.floor((1.0 - min_recall) * positives.size))
+    return float(min(0.5, positives[allowed_misses]))
+
+
+def report(name: str, predicted: List[bool], labels: List[int]) -> Dict[str, float]:
+    tp = sum(1 for p, y in zip(predicted, labels) if p and y)
+    fp = sum(1 for p, y in zip(predicted, labels) if p and not y)
+    fn = sum(1 for p, y in zip(predicted, labels) if not p and y)
+    tn = sum(1 for p, y in zip(predicted, labels) if not p and not y)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    blocked = tn / (tn + fp) if tn + fp else 0.0
+    print(
+        f"  {name:<22} precision={precision:.3f} recall={recall:.3f} f1={f1:.3f} "
+        f"casual_bloqueado={blocked:.3f} (tp={tp} fp={fp} fn={fn} tn={tn})"
+    )
+    return {
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(f1, 4),
+        "casual_blocked": round(blocked, 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Entrena el clasificador de relevancia clínica")
+    parser.add_argument("data", type=Path, help="JSONL de segmentos etiquetados")
+    parser.add_argument("--out", type=Path, default=MODEL_PATH)
+    parser.add_argument("--holdout", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--n-features", type=int, default=DEFAULT_N_FEATURES)
+    parser.add_argument("--epochs", type=int, default=400)
+    parser.add_argument("--lr", type=float, default=2.0)
+    parser.add_argument("--l2", type=float, default=1e-4)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--min-recall", type=float, default=0.95,
+                        help="Recall mínimo (out-of-fold) al elegir el umbral")
+    args = parser.parse_args()
+
+    segments = load_segments(args.data)
+    train, test = stratified_split(segments, args.holdout, args.seed)
+    print(f"Segmentos: {len(segments)} (train={len(train)}, held-out={len(test)})")
+
+    train_texts = [t for t, _ in train]
+    train_labels = np.asarray([y for _, y in train], dtype=np.float64)
+    fit = lambda texts, labels: train_logistic(  # noqa: E731
+        texts, labels, args.n_features, args.epochs, args.lr, args.l2
+    )
+
+    # El umbral se elige con probabilidades out-of-fold: sobre el propio
+    # train el modelo está sobreajustado y el recall saldría inflado
+    oof_probs = out_of_fold_probs(train_texts, train_labels, fit, args.folds, args.seed)
+    w, b = fit(train_texts, train_labels)
+    model = RelevanceClassifier(w, b, threshold=0.5)
+    model.threshold = round(pick_threshold(oof_probs, train_labels, args.min_recall), 4)
+    print(f"Umbral elegido: {model.threshold}")
+
+    # Importado aquí: el filtro completo usa el modelo recién entrenado
+    import app.relevance_model as relevance_model
+    from app.realtime_extractor import is_clinically_relevant
+
+    test_texts = [t for t, _ in test]
+    test_labels = [y for _, y in test]
+
+    print("Held-out:")
+    started = time.perf_counter()
+    model_pred = [model.is_relevant(t) for t in test_texts]
+    per_segment_us = (time.perf_counter() - started) / max(1, len(test_texts)) * 1e6
+    metrics = {"model": report("modelo", model_pred, test_labels)}
+
+    relevance_model._classifier, relevance_model._load_attempted = None, True
+    metrics["regex_only"] = report("regex (sin modelo)", [is_clinically_relevant(t) for t in test_texts], test_labels)
+    relevance_model._classifier = model
+    metrics["regex_plus_model"] = report("regex + modelo", [is_clinically_relevant(t) for t in test_texts], test_labels)
+    print(f"  inferencia: {per_segment_us:.0f} µs/segmento")
+
+    metrics["segments"] = {"train": len(train), "holdout": len(test)}
+    model.save(args.out, metrics=metrics)
+    print(f"Modelo guardado en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""
+Configuración común de los tests: sin red ni credenciales.
+
+El LLM usa el backend fake y el STT el replay; se fija antes de que algún
+test importe app.config (get_settings() sale si falta GROQ_API_KEY).
+"""
+
+import os
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("STT_PROVIDER", "replay")
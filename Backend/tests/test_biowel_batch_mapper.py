@@ -0,0 +1,68 @@
+"""
+Regresiones del mapper batch: keywords de varias palabras solo como frase contigua.
+"""
+
+import pytest
+
+from app.services.biowel_batch_mapper import (
+    _KEYWORD_CATEGORIES,
+    KEYWORD_INDEX,
+    SelectOptionIndex,
+    map_transcript_to_fields,
+)
+
+FIELDS = [
+    {"data_testid": testid, "unique_key": testid, "label": testid, "field_type": "text"}
+    for testid in sorted({t for keywords in _KEYWORD_CATEGORIES.values() for t in keywords.values()})
+]
+
+
+@pytest.mark.parametrize(
+    "transcript, testid",
+    [
+        ("Se realizó dilatación. No refiere alergias.", "dilatation-requires-no-radio"),
+        ("Se realizó dilatación, no refiere alergias.", "dilatation-requires-no-radio"),
+        ("pupilometría OD, normal", "oftalmology-pupillometry-od-normal-checkbox"),
+        ("pupilometría od; normal", "oftalmology-pupillometry-od-normal-checkbox"),
+    ],
+)
+def test_punctuation_breaks_multiword_keywords(transcript, testid):
+    assert testid not in map_transcript_to_fields(transcript, FIELDS, {})
+
+
+@pytest.mark.parametrize(
+    "transcript, testid, value",
+    [
+        ("se realizó dilatación no", "dilatation-requires-no-radio", "true"),
+        ("pupilometría od normal", "oftalmology-pupillometry-od-normal-checkbox", "true"),
+        ("Pupilometría  OD\nnormal.", "oftalmology-pupillometry-od-normal-checkbox", "true"),
+    ],
+)
+def test_contiguous_phrase_still_matches(transcript, testid, value):
+    assert map_transcript_to_fields(transcript, FIELDS, {}).get(testid) == value
+
+
+def test_find_all_resets_on_punctuation():
+    hits = KEYWORD_INDEX.find_all("dilatación. no")
+    assert "dilatación no" not in {hit.keyword for hit in hits}
+    hits = KEYWORD_INDEX.find_all("dilatación no")
+    assert "dilatación no" in {hit.keyword for hit in hits}
+
+
+OPTION_FIELDS = [
+    {"data_testid": "select-option-1", "label": "Miopía degenerativa", "field_type": "button"},
+    {"data_testid": "select-option-2", "label": "Miopía simple", "field_type": "button"},
+]
+
+
+@pytest.mark.parametrize(
+    "transcript, expected",
+    [
+        ("diagnóstico miopía degenerativa", ["select-option-1"]),
+        ("diagnóstico miopía. degenerativa", []),
+        ("miopía, degenerativa y miopía simple", ["select-option-2"]),
+    ],
+)
+def test_select_option_ngrams_stop_at_punctuation(transcript, expected):
+    index = SelectOptionIndex(OPTION_FIELDS)
+    assert [testid for testid, _ in index.match(transcript)] == expected
@@ -0,0 +1,98 @@
+"""
+Transcripción por chunks: cortes en pausas, costura por punto medio y
+errores de red reintentables.
+"""
+
+import asyncio
+
+import httpx
+import numpy as np
+import pytest
+
+from app.services import deepgram_batch
+from app.services.chunked_transcription import (
+    ENERGY_WINDOW_SECONDS,
+    AudioChunk,
+    plan_chunks,
+    stitch_words,
+)
+
+
+def energy_with_pauses(duration: float, pauses: list) -> np.ndarray:
+    energy = np.ones(int(duration / ENERGY_WINDOW_SECONDS), dtype=np.float32)
+    for at in pauses:
+        lo = int((at - 0.5) / ENERGY_WINDOW_SECONDS)
+        energy[lo: lo + int(1.0 / ENERGY_WINDOW_SECONDS)] = 0.0
+    return energy
+
+
+def test_plan_chunks_cuts_at_pauses():
+    chunks = plan_chunks(
+        energy_with_pauses(200.0, [57.0, 123.0]),
+        200.0,
+        target_seconds=60.0,
+        overlap_seconds=1.5,
+        search_seconds=8.0,
+    )
+
+    cuts = [chunk.keep_until for chunk in chunks[:-1]]
+    assert len(cuts) == 2
+    assert abs(cuts[0] - 57.0) < 0.6
+    assert abs(cuts[1] - 123.0) < 0.6
+    # Tramos propios contiguos que cubren todo el audio; el envío lleva el solape
+    assert chunks[0].keep_from == 0.0 and chunks[-1].keep_until == 200.0
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert prev.keep_until == nxt.keep_from
+        assert nxt.start == pytest.approx(nxt.keep_from - 1.5)
+        assert prev.end == pytest.approx(prev.keep_until + 1.5)
+
+
+def test_plan_chunks_short_audio_is_single_chunk():
+    chunks = plan_chunks(np.ones(1800), 90.0, target_seconds=60.0, overlap_seconds=1.5, search_seconds=8.0)
+    assert len(chunks) == 1
+    assert (chunks[0].start, chunks[0].end) == (0.0, 90.0)
+
+
+def test_plan_chunks_last_chunk_absorbs_short_remainder():
+    chunks = plan_chunks(
+        energy_with_pauses(140.0, [60.0]), 140.0,
+        target_seconds=60.0, overlap_seconds=1.5, search_seconds=8.0,
+    )
+    assert len(chunks) == 2
+    assert chunks[-1].keep_until - chunks[-1].keep_from > 60.0
+
+
+def test_stitch_words_midpoint_owns_overlap():
+    chunks = [
+        AudioChunk(index=0, keep_from=0.0, keep_until=10.0, start=0.0, end=11.0),
+        AudioChunk(index=1, keep_from=10.0, keep_until=20.0, start=9.0, end=20.0),
+    ]
+    chunk_words = [
+        # Tiempos relativos al inicio de cada chunk
+        [("visión", 8.0, 8.5), ("borrosa", 9.6, 10.2), ("ojo", 10.3, 10.8)],
+        [("borrosa", 0.6, 1.2), ("ojo", 1.3, 1.8), ("derecho", 2.0, 2.5)],
+    ]
+    # "borrosa" (punto medio 9.9) es del chunk 0; "ojo" (10.55) del chunk 1
+    assert stitch_words(chunks, chunk_words) == "visión borrosa ojo derecho"
+
+
+def test_stitch_words_last_chunk_keeps_words_at_end():
+    chunks = [AudioChunk(index=0, keep_from=0.0, keep_until=5.0, start=0.0, end=5.0)]
+    assert stitch_words(chunks, [[("fin", 4.8, 5.4)]]) == "fin"
+
+
+@pytest.mark.parametrize("error", [httpx.ReadError("reset"), httpx.RemoteProtocolError("closed")])
+def test_transport_errors_become_retryable(monkeypatch, error):
+    def handler(request):
+        raise error
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(deepgram_batch.settings, "deepgram_api_key", "test")
+    monkeypatch.setattr(
+        deepgram_batch.httpx, "AsyncClient",
+        lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs),
+    )
+
+    # run_chunk reintenta RuntimeError
+    with pytest.raises(RuntimeError, match="Error de conexión con Deepgram"):
+        asyncio.run(deepgram_batch.transcribe_words(b"RIFF", "audio/wav"))
@@ -0,0 +1,55 @@
+"""
+end_stream en modo Biowel: el pase final del LLM recibe todo el texto sin consumir.
+"""
+
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.stt_providers import StreamingSTTProvider
+from app.voice_processor import VoiceProcessor
+
+DURING_SESSION = "paciente refiere visión borrosa"
+DURING_FINISH = "dolor ocular intenso en ojo derecho desde hace dos días"
+
+
+class FinishTailStreamer(StreamingSTTProvider):
+    """Un final durante la sesión y otro que solo llega en finish() (drenaje del STT)."""
+
+    name = "test"
+
+    async def start(self) -> None:
+        self.is_open = True
+        self.final_transcript_parts.append(DURING_SESSION)
+        self._transcript_queue.put_nowait((DURING_SESSION, True))
+
+    async def send_audio(self, audio_bytes: bytes) -> None:
+        pass
+
+    async def finish(self) -> str:
+        self.is_open = False
+        await asyncio.sleep(0)
+        self.final_transcript_parts.append(DURING_FINISH)
+        return " ".join(self.final_transcript_parts).strip()
+
+
+def test_finals_delivered_during_finish_reach_llm(monkeypatch):
+    prompts = []
+
+    async def fake_map(self, transcription, already_filled=None):
+        prompts.append(transcription)
+        return []
+
+    monkeypatch.setattr(main, "create_streaming_stt", lambda on_partial: FinishTailStreamer(on_partial))
+    monkeypatch.setattr(VoiceProcessor, "map_voice_to_fields", fake_map)
+
+    with TestClient(main.app).websocket_connect("/ws/voice-stream") as ws:
+        ws.send_json({"type": "biowel_form_structure", "fields": [], "already_filled": {}})
+        ws.send_json({"type": "end_stream"})
+        while ws.receive_json().get("message") != "Stream procesado completamente":
+            pass
+
+    assert len(prompts) == 1
+    assert DURING_SESSION in prompts[0]
+    assert DURING_FINISH in prompts[0]
@@ -0,0 +1,181 @@
+"""
+Circuit breaker del cliente LLM y modo sin LLM de los segmentos en tiempo real.
+"""
+
+import asyncio
+import logging
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import llm_client, main
+from app.llm_backends import LLMBackend
+from app.llm_client import CircuitBreaker, LLMUnavailableError, ResilientLLMClient
+from app.stt_providers import StreamingSTTProvider
+from app.voice_processor import VoiceProcessor
+
+
+class FailingBackend(LLMBackend):
+    name = "failing"
+
+    def __init__(self, error: Exception):
+        self.error = error
+        self.calls = 0
+
+    async def complete(self, request):
+        self.calls += 1
+        raise self.error
+
+
+class StatusError(RuntimeError):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=3, cooldown_seconds=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.is_available()
+    assert not breaker.allow_request()
+
+
+def test_half_open_allows_single_probe(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_client.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+    open_breaker(breaker)
+    now[0] += 31
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.consecutive_failures == 0
+
+
+def test_failed_probe_reopens(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_client.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+    open_breaker(breaker)
+    now[0] += 31
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opens == 2
+
+
+def test_released_probe_lets_next_call_probe(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_client.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+    open_breaker(breaker)
+    now[0] += 31
+    assert breaker.allow_request()
+    breaker.release_probe()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+
+
+def chat(client: ResilientLLMClient):
+    return asyncio.run(client.chat(
+        layer="segment", messages=[{"role": "user", "content": "x"}], max_tokens=10
+    ))
+
+
+def test_request_rejections_do_not_open_breaker():
+    backend = FailingBackend(StatusError(400))
+    client = ResilientLLMClient(backend=backend)
+    client.breaker = CircuitBreaker(failure_threshold=2, cooldown_seconds=60)
+    for _ in range(5):
+        with pytest.raises(StatusError):
+            chat(client)
+    # Sin reintentos ante un 4xx y sin contar para el breaker
+    assert backend.calls == 5
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    assert client.breaker.consecutive_failures == 0
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_provider_errors_open_breaker(monkeypatch, status):
+    monkeypatch.setattr(llm_client.settings, "llm_max_retries", 0)
+    client = ResilientLLMClient(backend=FailingBackend(StatusError(status)))
+    client.breaker = CircuitBreaker(failure_threshold=2, cooldown_seconds=60)
+    for _ in range(2):
+        with pytest.raises(StatusError):
+            chat(client)
+    assert client.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(LLMUnavailableError):
+        chat(client)
+
+
+# ============================================
+# Segmentos en tiempo real con el breaker abierto
+# ============================================
+
+SEGMENT = "paciente refiere dolor ocular intenso"
+
+
+class OneFinalStreamer(StreamingSTTProvider):
+    name = "test"
+
+    async def start(self) -> None:
+        self.is_open = True
+        self.final_transcript_parts.append(SEGMENT)
+        self._transcript_queue.put_nowait((SEGMENT, True))
+
+    async def send_audio(self, audio_bytes: bytes) -> None:
+        pass
+
+    async def finish(self) -> str:
+        self.is_open = False
+        return " ".join(self.final_transcript_parts).strip()
+
+
+def test_open_breaker_skips_llm_for_segments(monkeypatch, caplog):
+    llm_calls = []
+
+    async def record_call(self, *args, **kwargs):
+        llm_calls.append(args)
+        return []
+
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=60)
+    open_breaker(breaker)
+    monkeypatch.setattr(llm_client.get_llm_client(), "breaker", breaker)
+    monkeypatch.setattr(main, "create_streaming_stt", lambda on_partial: OneFinalStreamer(on_partial))
+    for name in ("map_section_fields", "map_segment_to_fields", "map_segment_speculative", "map_voice_to_fields"):
+        monkeypatch.setattr(VoiceProcessor, name, record_call)
+
+    messages = []
+    with caplog.at_level(logging.INFO, logger="app.main"):
+        with TestClient(main.app).websocket_connect("/ws/voice-stream") as ws:
+            ws.send_json({"type": "biowel_form_structure", "fields": [], "already_filled": {}})
+            # El segmento final llega y su tarea LLM corre antes de cerrar el stream
+            while ws.receive_json().get("is_final") is not True:
+                pass
+            time.sleep(0.2)
+            ws.send_json({"type": "end_stream"})
+            while True:
+                message = ws.receive_json()
+                messages.append(message)
+                if message.get("message") == "Stream procesado completamente":
+                    break
+
+    assert "segmento sin mapear" in caplog.text
+    assert llm_calls == []
+    assert not [m for m in messages if m["type"] == "partial_autofill"]
+    assert any(
+        m.get("message") == "LLM no disponible: campos llenados solo por reglas" for m in messages
+    )
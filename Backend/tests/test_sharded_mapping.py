@@ -0,0 +1,143 @@
+"""
+Mapeo de fin de stream por secciones: corte del transcript en shards y
+merge de los resultados por confianza.
+"""
+
+import asyncio
+
+from app.models import FieldMapping
+from app.services.biowel_batch_mapper import _DELIMITER_KEYWORDS, split_transcript_sections
+from app.voice_processor import VoiceProcessor
+
+REASON = "attention-origin-reason-for-consulting-badge-field"
+DISEASE = "attention-origin-current-disease-badge-field"
+PLAN = "analysis-and-plan-textarea"
+CORNEA = "oftalmology-córnea-od-textfield"
+
+
+# ============================================
+# split_transcript_sections
+# ============================================
+
+def test_split_sections_by_anchor():
+    text = "hola motivo de consulta visión borrosa plan control"
+    assert split_transcript_sections(text) == [
+        (0, 5, None),
+        (5, 39, REASON),
+        (39, 51, PLAN),
+    ]
+
+
+def test_split_sections_cover_transcript_and_cut_at_delimiter():
+    delimiter = _DELIMITER_KEYWORDS[-1]
+    text = (
+        "Motivo de consulta visión borrosa. Enfermedad actual astigmatismo "
+        f"desde hace un año {delimiter} y después comentarios"
+    )
+    shards = split_transcript_sections(text)
+
+    assert [testid for _, _, testid in shards] == [REASON, DISEASE, None]
+    assert text[shards[2][0]:].startswith(delimiter)
+    # Shards contiguos: juntos reconstruyen el transcript
+    assert shards[0][0] == 0 and shards[-1][1] == len(text)
+    for (_, end, _), (start, _, _) in zip(shards, shards[1:]):
+        assert end == start
+
+
+def test_split_sections_without_anchor_is_one_general_shard():
+    assert split_transcript_sections("paciente tranquilo") == [(0, 18, None)]
+    assert split_transcript_sections("   ") == []
+
+
+# ============================================
+# map_voice_to_fields_sharded
+# ============================================
+
+FIELDS = [
+    {"data_testid": REASON, "unique_key": REASON, "label": "Motivo de consulta",
+     "field_type": "textarea", "section": "attention-origin"},
+    {"data_testid": DISEASE, "unique_key": DISEASE, "label": "Enfermedad actual",
+     "field_type": "textarea", "section": "attention-origin"},
+    {"data_testid": CORNEA, "unique_key": CORNEA, "label": "Córnea OD",
+     "field_type": "text", "section": "physical-exam"},
+]
+
+
+def sharded(responses, shards, already_filled=None):
+    """Corre el mapeo por secciones con respuestas fijas por sección (clave: campos del prompt)."""
+    processor = VoiceProcessor()
+    processor.set_biowel_context(FIELDS)
+    calls = []
+
+    async def fake_map(text, already_filled=None, only_fields=None, timeout=None):
+        key = frozenset(only_fields) if only_fields is not None else None
+        calls.append((text, key))
+        return [FieldMapping(field_name=f, value=v, confidence=c) for f, v, c in responses.get(key, [])]
+
+    processor.map_voice_to_fields = fake_map
+    result = asyncio.run(processor.map_voice_to_fields_sharded(shards, already_filled=already_filled))
+    return {m.field_name: (m.value, m.confidence) for m in result}, calls
+
+
+def test_shards_grouped_by_section_with_empty_fields_only():
+    _, calls = sharded(
+        {},
+        [(None, "hola"), (REASON, "motivo de consulta visión borrosa"), (CORNEA, "córnea clara"),
+         (DISEASE, "enfermedad actual astigmatismo")],
+        already_filled={DISEASE: "ya lleno"},
+    )
+    assert sorted(calls, key=lambda c: c[0]) == [
+        ("córnea clara", frozenset({CORNEA})),
+        ("hola", None),
+        ("motivo de consulta visión borrosa ... enfermedad actual astigmatismo", frozenset({REASON})),
+    ]
+
+
+def test_merge_keeps_highest_confidence():
+    result, _ = sharded(
+        {
+            None: [(REASON, "general", 0.6), (CORNEA, "clara", 0.95)],
+            frozenset({REASON, DISEASE}): [(REASON, "visión borrosa", 0.9)],
+            frozenset({CORNEA}): [(CORNEA, "transparente", 0.7)],
+        },
+        [(None, "texto suelto"), (REASON, "motivo de consulta visión borrosa"), (CORNEA, "córnea")],
+    )
+    assert result == {REASON: ("visión borrosa", 0.9), CORNEA: ("clara", 0.95)}
+
+
+def test_merge_tie_keeps_earlier_shard():
+    result, _ = sharded(
+        {
+            frozenset({REASON, DISEASE}): [(REASON, "primero", 0.8)],
+            None: [(REASON, "después", 0.8)],
+        },
+        [(REASON, "motivo de consulta visión borrosa"), (None, "texto suelto")],
+    )
+    assert result == {REASON: ("primero", 0.8)}
+
+
+def test_foreign_fields_dropped_before_merge():
+    result, _ = sharded(
+        {
+            frozenset({CORNEA}): [(REASON, "intruso", 0.99), (CORNEA, "clara", 0.9)],
+            frozenset({REASON, DISEASE}): [(REASON, "visión borrosa", 0.6)],
+        },
+        [(REASON, "motivo de consulta visión borrosa"), (CORNEA, "córnea clara")],
+    )
+    assert result == {REASON: ("visión borrosa", 0.6), CORNEA: ("clara", 0.9)}
+
+
+def test_failed_shard_does_not_drop_others():
+    processor = VoiceProcessor()
+    processor.set_biowel_context(FIELDS)
+
+    async def fake_map(text, already_filled=None, only_fields=None, timeout=None):
+        if only_fields and CORNEA in only_fields:
+            raise asyncio.TimeoutError()
+        return [FieldMapping(field_name=REASON, value="visión borrosa", confidence=0.9)]
+
+    processor.map_voice_to_fields = fake_map
+    result = asyncio.run(processor.map_voice_to_fields_sharded(
+        [(REASON, "motivo de consulta visión borrosa"), (CORNEA, "córnea clara")]
+    ))
+    assert [(m.field_name, m.value) for m in result] == [(REASON, "visión borrosa")]
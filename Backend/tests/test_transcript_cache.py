@@ -0,0 +1,61 @@
+"""
+Caché de transcripciones: LRU en memoria, nivel en disco y tope de tamaño.
+"""
+
+import os
+
+from app.services.transcript_cache import TranscriptCache
+
+
+def test_memory_lru_evicts_least_recently_used():
+    cache = TranscriptCache(max_entries=2)
+    cache.put("a", "uno")
+    cache.put("b", "dos")
+    assert cache.get("a") == "uno"  # "a" pasa a ser la más reciente
+    cache.put("c", "tres")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "uno"
+    assert cache.get("c") == "tres"
+    assert cache.stats()["entries"] == 2
+    assert cache.misses == 1
+
+
+def test_disk_round_trip(tmp_path):
+    TranscriptCache(max_entries=4, disk_dir=str(tmp_path)).put("k", "visión borrosa OD")
+
+    # Otra instancia (otro worker o reinicio) lo lee del disco y lo sube a memoria
+    cache = TranscriptCache(max_entries=4, disk_dir=str(tmp_path))
+    assert cache.get("k") == "visión borrosa OD"
+    assert cache.disk_hits == 1
+    assert cache.get("k") == "visión borrosa OD"
+    assert cache.hits == 1
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_disk_cap_discards_oldest_access(tmp_path):
+    cache = TranscriptCache(max_entries=1, disk_dir=str(tmp_path), disk_max_bytes=25)
+    cache.put("viejo", "x" * 10)
+    cache.put("medio", "y" * 10)
+    os.utime(tmp_path / "viejo.txt", (1_000, 1_000))
+    os.utime(tmp_path / "medio.txt", (2_000, 2_000))
+
+    cache.put("nuevo", "z" * 10)
+
+    remaining = sorted(p.stem for p in tmp_path.glob("*.txt"))
+    assert remaining == ["medio", "nuevo"]
+
+
+def test_disk_read_refreshes_mtime(tmp_path):
+    cache = TranscriptCache(max_entries=1, disk_dir=str(tmp_path), disk_max_bytes=25)
+    cache.put("a", "x" * 10)
+    cache.put("b", "y" * 10)
+    os.utime(tmp_path / "a.txt", (1_000, 1_000))
+    os.utime(tmp_path / "b.txt", (2_000, 2_000))
+
+    # "b" está en memoria; "a" se lee del disco y pasa a ser el acceso más reciente
+    assert cache.get("a") == "x" * 10
+    cache.put("c", "z" * 10)
+
+    remaining = sorted(p.stem for p in tmp_path.glob("*.txt"))
+    assert remaining == ["a", "c"]
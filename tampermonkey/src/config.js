@@ -2,6 +2,12 @@ export const CONFIG = {
     BACKEND_WS: 'ws://localhost:8000/ws/voice-stream',
     BACKEND_HTTP: 'http://localhost:8000',
     BATCH_ENDPOINT: '/api/biowel/audio/process',
+    BATCH_JOBS_ENDPOINT: '/api/biowel/audio/jobs',
+    BATCH_UPLOADS_ENDPOINT: '/api/biowel/uploads',
+    BATCH_UPLOAD_CHUNK: 4 * 1024 * 1024,
+    BATCH_UPLOAD_RETRIES: 10,
+    BATCH_POLL_INTERVAL: 1500,
+    BATCH_JOB_TIMEOUT: 1800000,
     MIN_DATA_TESTID_COUNT: 3,
     HIGHLIGHT_COLOR: '#6e22c5',
     HIGHLIGHT_DURATION: 1000,
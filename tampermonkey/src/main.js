@@ -171,6 +171,9 @@ function init() {
                     if (filled.length > 0) addLog('fill', `LLM final: ${filled.join(', ')}`);
                 }
                 break;
+            case 'llm_usage':
+                if (msg.summary) addLog('decision', `LLM: ${msg.summary.calls} llamadas, ${msg.summary.total_tokens} tokens, ${msg.summary.latency_ms_total} ms`);
+                break;
             case 'info':
                 addLog('decision', msg.message || 'Info del servidor');
                 break;
@@ -276,6 +279,91 @@ function init() {
         batchStatus.textContent = '';
     }
 
+    const BATCH_JOB_STATUS_TEXT = {
+        uploaded: 'En cola...',
+        transcribing: 'Transcribiendo...',
+        mapping: 'Mapeando campos...',
+    };
+
+    async function batchErrorMessage(response) {
+        let errMsg = `Error HTTP ${response.status}`;
+        try {
+            const errBody = await response.json();
+            errMsg = errBody.detail || errMsg;
+        } catch (e) { /* ignore parse error */ }
+        return errMsg;
+    }
+
+    async function uploadResumable(file) {
+        const createResponse = await fetch(CONFIG.BACKEND_HTTP + CONFIG.BATCH_UPLOADS_ENDPOINT, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, mimetype: file.type || null, size: file.size }),
+        });
+        if (!createResponse.ok) {
+            throw new Error(await batchErrorMessage(createResponse));
+        }
+        const upload = await createResponse.json();
+        const uploadUrl = CONFIG.BACKEND_HTTP + upload.upload_url;
+
+        let offset = 0;
+        let failures = 0;
+        while (offset < file.size) {
+            const end = Math.min(offset + CONFIG.BATCH_UPLOAD_CHUNK, file.size);
+            try {
+                const response = await fetch(`${uploadUrl}?offset=${offset}`, {
+                    method: 'PUT',
+                    body: file.slice(offset, end),
+                });
+                if (response.ok || response.status === 409) {
+                    // 409: el servidor tiene otro offset (bloque a medias o reenviado)
+                    const body = await response.json();
+                    offset = response.ok ? body.offset : body.detail.offset;
+                    failures = 0;
+                    setBatchStatus(`Subiendo audio... ${Math.round(offset * 100 / file.size)}%`);
+                    continue;
+                }
+                throw new Error(await batchErrorMessage(response));
+            } catch (err) {
+                if (err instanceof TypeError && ++failures <= CONFIG.BATCH_UPLOAD_RETRIES) {
+                    // Red caída: esperar y preguntar desde dónde seguir
+                    setBatchStatus(`Sin conexión, reintentando subida (${failures})...`);
+                    await new Promise(r => setTimeout(r, CONFIG.BATCH_POLL_INTERVAL * failures));
+                    try {
+                        const status = await fetch(uploadUrl);
+                        if (status.ok) offset = (await status.json()).offset;
+                    } catch (e) { /* se reintenta con el offset conocido */ }
+                    continue;
+                }
+                throw err;
+            }
+        }
+        return uploadUrl;
+    }
+
+    async function pollBatchJob(statusUrl) {
+        const deadline = Date.now() + CONFIG.BATCH_JOB_TIMEOUT;
+        while (Date.now() < deadline) {
+            await new Promise(r => setTimeout(r, CONFIG.BATCH_POLL_INTERVAL));
+            let response;
+            try {
+                response = await fetch(statusUrl);
+            } catch (e) {
+                // Red caída: el trabajo sigue en el servidor, reintentar
+                setBatchStatus('Sin conexión, reintentando...');
+                continue;
+            }
+            if (!response.ok) {
+                throw new Error(await batchErrorMessage(response));
+            }
+            const job = await response.json();
+            if (job.status === 'done') return job.result;
+            if (job.status === 'error') throw new Error(job.error || 'Error procesando el audio');
+            setBatchStatus(BATCH_JOB_STATUS_TEXT[job.status] || job.status);
+        }
+        throw new Error('Tiempo de espera agotado');
+    }
+
     function setBatchFile(file) {
         batchSelectedFile = file;
         if (file) {
@@ -368,43 +456,26 @@ function init() {
             const freshFields = rescanFields();
             const filledFields = manipulator.getFilledFields();
 
-            // 2. Build FormData
+            // 2. Upload reanudable por bloques (tras un corte continúa desde el offset del servidor)
             setBatchStatus('Subiendo audio...');
+            const uploadUrl = await uploadResumable(batchSelectedFile);
+
             const formData = new FormData();
-            formData.append('audio_file', batchSelectedFile);
             formData.append('fields', JSON.stringify(freshFields));
             formData.append('already_filled', JSON.stringify(filledFields));
 
             addLog('decision', `Batch: enviando ${freshFields.length} campos + audio`);
 
-            // 3. POST to batch endpoint (timeout 10 min para audios largos)
-            setBatchStatus('Transcribiendo...');
-            const url = CONFIG.BACKEND_HTTP + CONFIG.BATCH_ENDPOINT;
-            const controller = new AbortController();
-            const timeoutId = setTimeout(() => controller.abort(), 600000);
-            let response;
-            try {
-                response = await fetch(url, {
-                    method: 'POST',
-                    body: formData,
-                    signal: controller.signal,
-                });
-            } finally {
-                clearTimeout(timeoutId);
-            }
-
+            // 3. Finalizar: encola el trabajo de transcripción + mapeo
+            const response = await fetch(uploadUrl + '/finalize', { method: 'POST', body: formData });
             if (!response.ok) {
-                let errMsg = `Error HTTP ${response.status}`;
-                try {
-                    const errBody = await response.json();
-                    errMsg = errBody.detail || errMsg;
-                } catch (e) { /* ignore parse error */ }
-                throw new Error(errMsg);
+                throw new Error(await batchErrorMessage(response));
             }
+            const job = await response.json();
+            addLog('decision', `Batch: trabajo ${job.job_id} encolado`);
 
-            // 4. Parse response
-            setBatchStatus('Mapeando campos...');
-            const result = await response.json();
+            // 4. Polling del estado (tolera cortes de red: el trabajo sigue en el servidor)
+            const result = await pollBatchJob(CONFIG.BACKEND_HTTP + job.status_url);
             const { transcript: batchTranscript, filled_fields, stats } = result;
 
             // Show transcript